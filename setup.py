@@ -27,7 +27,11 @@ setuptools.setup(
     package_dir={"":"src"},
     packages=setuptools.find_packages(where="src"),
     python_requires=">=3.8",
-    install_requires=['liftover==1.1.6'],
-    entry_points={'console_scripts': {'sumstatsToVCF=scripts.sumstatsToVCF:main'}}
+    install_requires=['numpy>=1.20', 'jsonschema'],
+    extras_require={'parquet': ['pyarrow>=10']},
+    entry_points={'console_scripts': {'sumstatsToVCF=scripts.sumstatsToVCF:main',
+                                     'batchSumstatsToVCF=scripts.batchSumstatsToVCF:main',
+                                     'buildRsidIndex=scripts.buildRsidIndex:main',
+                                     'liftoverVCF=scripts.liftoverVCF:main'}}
 )
 
@@ -0,0 +1,238 @@
+# File Name: batchSumstatsToVCF.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a script for converting many summary stats files to VCF in
+#  one run. a manifest lists (metadata, sumstats, output) entries; the
+#  metadata and chrom.sizes files are read once each and all files are
+#  scheduled over a single shared set of workers.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import time
+from functools import partial
+from multiprocessing import cpu_count
+from typing import Callable, Dict, List, Optional, TextIO
+from sumstatstools.core.chunking import RANGE_BYTES
+from sumstatstools.core.compress import COMPRESSED_SUFFIXES, open_output
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.executors import BACKEND_CHOICES, MapExecutor, estimate_row_cost, resolve_backend
+from sumstatstools.core.io import DELIMITER_CHOICES, read_sample_lines
+from sumstatstools.core.manifest import ContigCache, ManifestEntry, UnitText
+from sumstatstools.core.manifest import read_manifest, read_sumstats_header, load_manifest_metadata
+from sumstatstools.core.manifest import share_manifest_state, parse_unit, generate_unit_reader
+from sumstatstools.core.manifest import unit_rows, unit_bytes, unit_lines
+from sumstatstools.core.pipeline import run_pipeline, format_stage_report, stage_report, plan_workers
+from sumstatstools.core.plan import compile_column_plan
+from sumstatstools.core.stats import STAT_KEYS
+from sumstatstools.core.vcf import INFO_PRECISION, write_vcf_header, format_vcf_batch
+from scripts.sumstatsToVCF import validate_metadata
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+BATCH_SIZE = 5000  # number of sumstats records parsed at a time
+MAX_INFLIGHT = 2 * cpu_count()  # default number of work units read but not yet written
+PROGRESS_INTERVAL = 1.0  # seconds between --progress updates
+SAMPLE_ROWS = 1000  # number of rows parsed to pick the backend with --backend auto
+
+
+# define functions
+# -----------------------------------------------------------------------------
+
+# define a function that parses the --chrom-sizes options, each either a
+# path used for every genome build or BUILD=PATH for one build
+def parse_chrom_sizes_options(options: List[str]) -> Dict[Optional[str],str]:
+    paths: Dict[Optional[str],str] = {}
+    for option in options:
+        build, sep, path = option.rpartition('=')
+        paths[build if sep else None] = path
+    return paths
+
+# define a function that returns the chrom.sizes file for a manifest entry:
+# its own, else the one given for its genome build, else the default
+def chrom_sizes_for(entry: ManifestEntry, genome_build: str,
+                    paths: Dict[Optional[str],str]) -> Optional[str]:
+    if entry.chrom_sizes is not None: return entry.chrom_sizes
+    return paths.get(genome_build, paths.get(None))
+
+# define a function that opens the output vcf of a manifest entry and writes
+# its header
+def open_entry_output(entry: ManifestEntry, metadata: dict, contigs_dict: Dict[str,Contig],
+                      info_fields: List[str], index: Optional[str], threads: int) -> TextIO:
+    index = index if entry.output.endswith(COMPRESSED_SUFFIXES) else None
+    vcfobj = open_output(entry.output, threads, index)
+    write_vcf_header(vcfobj, metadata['study']['genome_build'], metadata['study']['doi'],
+                     tuple(contigs_dict.values()), info_fields)
+    return vcfobj
+
+# define a function that writes a parsed work unit to the output of its
+# file, opening the output on the file's first unit and closing it (and
+# reporting the file) on its end of file unit
+def write_unit_text(open_f: List[Callable[[], TextIO]], opened: Dict[int,TextIO],
+                    rows: Dict[int,int], report: Callable[[int,int], None], result: UnitText) -> None:
+    index, text, nrows, end = result
+    if index not in opened:
+        opened[index] = open_f[index]()
+        rows[index] = 0
+    if text != '': opened[index].write(text)
+    rows[index] += nrows
+    if end:
+        opened.pop(index).close()
+        report(index, rows[index])
+
+
+# define main() execution routine for script entrypoint
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+
+    # start timer for program runtime
+    start = time.time()
+
+    # build command line parser
+    # -------------------------------------------------------------------------
+
+    # program description
+    desc = """
+            batchSumstatsToVCF converts every summary stats file listed in a
+            manifest to VCF, sharing one set of workers across all of
+            them. the manifest is a tab separated file with one
+            'metadata sumstats output [chrom_sizes]' entry per line.
+        """
+
+    # configure command line parser
+    parser = argparse.ArgumentParser(prog="batchSumstatsToVCF", description=desc)
+    parser.add_argument("manifest", type=str, help="tab separated manifest of files to convert")
+    parser.add_argument("--chrom-sizes", type=str, action='append', default=[],
+                        help='chrom sizes file for entries without one, as PATH for every genome '
+                             'build or BUILD=PATH for one build (repeatable)')
+    parser.add_argument("--chr-convert", type=str, default='none', choices=['none','ucsc','simple'],
+                        help='convert chroms to ucsc style [chr1], or simple style [1]')
+    parser.add_argument("--delimiter", type=str, default='whitespace', choices=DELIMITER_CHOICES,
+                        help='field separator of the sumstats files; tab and comma keep spaces inside '
+                             'fields, and auto sniffs it from the header line of each file (default: runs of whitespace)')
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE,
+                        help='number of sumstats records parsed per chunk')
+    parser.add_argument("--range-mb", type=int, default=RANGE_BYTES // (1024 * 1024),
+                        help='size in MB of the byte ranges that files are split into')
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                        help='maximum number of work units held in memory at once')
+    parser.add_argument("--workers", "--threads", type=int, default=None,
+                        help='number of worker processes, 0 to parse in the main process '
+                             '(default: one per 8 MB of input, up to one per core)')
+    parser.add_argument("--backend", type=str, default='processes', choices=BACKEND_CHOICES,
+                        help='how workers run: in the main process, on threads (parallel on free-threaded '
+                             'python), in worker processes, or chosen from a timed sample of the input')
+    parser.add_argument("--index", type=str, default='tbi', choices=['tbi','csi','none'],
+                        help='index to build while writing bgzf (.gz) outputs')
+    parser.add_argument("--info-fields", type=str, default=','.join(STAT_KEYS),
+                        help=f'comma separated INFO fields to write, from {",".join(STAT_KEYS)}')
+    parser.add_argument("--info-precision", type=int, default=INFO_PRECISION,
+                        help='digits after the point for INFO values')
+    parser.add_argument("--progress", action='store_true',
+                        help='print rows written, rows/s and MB read/written to stderr while running')
+    parser.add_argument("--stats-json", type=str, default=None,
+                        help='write per-stage and per-file statistics to this json file')
+
+    # parse user arguments
+    args = parser.parse_args()
+    info_fields = tuple(f for f in args.info_fields.split(',') if f != '')
+    if any(f not in STAT_KEYS for f in info_fields):
+        parser.error(f"--info-fields must be taken from {','.join(STAT_KEYS)}")
+    chrom_sizes_paths = parse_chrom_sizes_options(args.chrom_sizes)
+
+
+    # read the manifest, validate each metadata file once and load each
+    # chrom.sizes file once per genome build
+    # -------------------------------------------------------------------------
+
+    entries = read_manifest(args.manifest)
+    metadata = load_manifest_metadata(entries, validate_metadata)
+    cache = ContigCache()
+    contigs: List[Dict[str,Contig]] = []
+    for entry, md in zip(entries, metadata):
+        genome_build = md["study"]["genome_build"]
+        path = chrom_sizes_for(entry, genome_build, chrom_sizes_paths)
+        if path is None:
+            parser.error(f"no chrom sizes file for {entry.sumstats} (genome build {genome_build})")
+        contigs.append(cache.get(path, genome_build))
+
+
+    # compile the column plan of every file from its header
+    # -------------------------------------------------------------------------
+
+    plans = {}
+    starts = []
+    for i, (entry, md) in enumerate(zip(entries, metadata)):
+        header, offset, delim = read_sumstats_header(entry.sumstats, args.delimiter)
+        plans[i] = compile_column_plan(header, md['columns'], contigs[i], args.chr_convert, delim)
+        starts.append(offset)
+    paths = [e.sumstats for e in entries]
+
+
+    # schedule every file over one shared set of workers. files are split into work
+    # units in manifest order, so small files run side by side on separate
+    # workers and large files are spread over all of them, while the writer
+    # still writes each output in input order
+    # -------------------------------------------------------------------------
+
+    nbytes = [os.path.getsize(p) for p in paths]
+    workers = plan_workers(args.workers, sum(nbytes))
+    format_batch = partial(format_vcf_batch, precision=args.info_precision, info_fields=info_fields)
+    state = (plans, format_batch, dict(enumerate(paths)), args.chunk_size)
+    share_manifest_state(*state)
+
+    # with --backend auto a sample of the largest file is parsed here, and
+    # the rows in all files and their cost decide between parsing serially
+    # and in parallel
+    nunits, unit_seconds = 0, 0.0
+    if args.backend == 'auto' and workers > 1:
+        i = nbytes.index(max(nbytes))
+        sample = read_sample_lines(paths[i], SAMPLE_ROWS)
+        rows, row_seconds = estimate_row_cost(lambda lines: parse_unit((i, lines)), sample, sum(nbytes))
+        nunits = max(len(paths), rows // args.chunk_size)
+        unit_seconds = rows * row_seconds / nunits
+    backend = resolve_backend(args.backend, workers, nunits, unit_seconds)
+    executor = MapExecutor(backend, workers, share_manifest_state, state)
+    setup_seconds = time.time() - start
+
+    index = args.index if args.index != 'none' else None
+    open_f = [partial(open_entry_output, e, md, c, info_fields, index, max(1, workers))
+              for e, md, c in zip(entries, metadata, contigs)]
+    file_stats: List[dict] = []
+
+    def report(i: int, rows: int) -> None:
+        file_stats.append({"sumstats": entries[i].sumstats, "output": entries[i].output,
+                           "rows": rows, "finished_seconds": round(time.time() - start, 6)})
+        print(f"{entries[i].sumstats} -> {entries[i].output}: {rows} records")
+
+    unit_reader_f = generate_unit_reader(paths, starts, args.range_mb * 1024 * 1024, args.chunk_size)
+    stage_stats = run_pipeline(unit_reader_f, parse_unit,
+                               partial(write_unit_text, open_f, {}, {}, report),
+                               executor.imap, args.max_inflight,
+                               chunk_rows=unit_lines, result_rows=unit_rows,
+                               chunk_bytes=unit_bytes, result_bytes=lambda r: len(r[1]),
+                               progress=PROGRESS_INTERVAL if args.progress else None)
+    executor.close()
+
+
+    # print success message to user
+    # -------------------------------------------------------------------------
+
+    # stop timer on runtime
+    end = time.time()
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as jobj:
+            json.dump(stage_report(stage_stats, end-start, tool="batchSumstatsToVCF",
+                                   manifest=args.manifest, workers=executor.workers, backend=backend,
+                                   chrom_sizes_loaded=len(cache), setup_seconds=round(setup_seconds, 6),
+                                   files=file_stats), jobj, indent=2)
+    print(format_stage_report(stage_stats, end-start))
+    print(f"startup: {setup_seconds:.3f}s to start the pipeline with {executor.workers} workers ({backend})")
+    print(f"{len(entries)} Summary Stats Files Converted to VCF: Minutes Elapsed: {(end-start)/60.0}")
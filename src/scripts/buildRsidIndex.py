@@ -0,0 +1,129 @@
+# File Name: buildRsidIndex.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: commandline script that builds an rsID index from a dbSNP style
+#  VCF file, for placing summary stats that give rsIDs but no chromosome or
+#  position with sumstatsToVCF --rsid-index. required arguments are (1) the
+#  input VCF and (2) the directory to write the index to. contig names of the
+#  VCF (e.g. the RefSeq accessions of dbSNP) may be renamed with a two column
+#  file given to --rename-chrs, and --no-alleles leaves out the REF/ALT
+#  alleles for a smaller index.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import time
+from functools import partial
+from multiprocessing import cpu_count
+from sumstatstools.core.executors import MapExecutor
+from sumstatstools.core.pipeline import run_pipeline, format_stage_report, stage_report, plan_workers
+from sumstatstools.core.rsindex import RsidIndexWriter, parse_vcf_records, parsed_rows, read_contig_renames
+from sumstatstools.core.vcf import VcfReader
+
+
+# define constants
+# -----------------------------------------------------------------------------
+
+BATCH_SIZE = 50000
+MAX_INFLIGHT = 2 * cpu_count()  # default number of batches read but not yet written
+PROGRESS_INTERVAL = 1.0  # seconds between --progress updates
+
+
+# define main() execution routine for script entrypoint
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+    # start timer for program runtime
+    start = time.time()
+
+    # build command line parser
+    # -------------------------------------------------------------------------
+
+    # program description
+    desc = """
+            buildRsidIndex builds a memory-mapped index from rsIDs to the contig,
+            position and alleles of each variant of a dbSNP style VCF file, used
+            by sumstatsToVCF --rsid-index to place summary stats without
+            chromosome and position columns.
+        """
+
+    # configure command line parser
+    parser = argparse.ArgumentParser(prog="buildRsidIndex", description=desc)
+    parser.add_argument("input_vcf", type=str, help="dbSNP style vcf file (.gz for bgzf)")
+    parser.add_argument("output", type=str, help="directory to write the index to")
+    parser.add_argument("--rename-chrs", type=str, default=None,
+                        help='two column file renaming the contigs of the vcf (old new)')
+    parser.add_argument("--no-alleles", action='store_true',
+                        help='leave the REF/ALT alleles out of the index')
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE,
+                        help='number of vcf records parsed per chunk')
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                        help='maximum number of chunks held in memory at once')
+    parser.add_argument("--workers", "--threads", type=int, default=None,
+                        help='number of worker processes, 0 to parse in the main process '
+                             '(default: one per 8 MB of input, up to one per core)')
+    parser.add_argument("--tmp-dir", type=str, default=None,
+                        help='directory for the bucket files sorted into the index (default: system temp)')
+    parser.add_argument("--progress", action='store_true',
+                        help='print rows parsed, rows/s and MB read to stderr while running')
+    parser.add_argument("--stats-json", type=str, default=None,
+                        help='write per-stage timings, rows, bytes and queue waits to this json file')
+
+    # parse user arguments
+    args = parser.parse_args()
+    if os.path.exists(args.output):
+        parser.error(f"{args.output} already exists")
+    if not os.path.isfile(args.input_vcf):
+        parser.error(f"{args.input_vcf} does not exist")
+    workers = plan_workers(args.workers, os.path.getsize(args.input_vcf))
+    threads = max(1, workers)
+    renames = read_contig_renames(args.rename_chrs) if args.rename_chrs is not None else None
+
+
+    # parse the vcf records in the workers and append them to the index
+    # -------------------------------------------------------------------------
+
+    # a reader thread reads chunks of vcf lines, each worker parses a whole
+    # chunk to arrays of rsids, contig codes, positions and allele codes, and
+    # the writer thread appends them to the bucket files of the index, which
+    # are sorted into the index once the input is exhausted
+    executor = MapExecutor('processes' if workers > 1 else 'serial', workers)
+    vcfreader = VcfReader(args.input_vcf, args.chunk_size, threads)
+    writer = RsidIndexWriter(args.output, not args.no_alleles, renames, args.tmp_dir)
+    parse = partial(parse_vcf_records, alleles=not args.no_alleles)
+    try:
+        stage_stats = run_pipeline(vcfreader.read_lines, parse, writer.append, executor.imap,
+                                   args.max_inflight, result_rows=parsed_rows,
+                                   result_bytes=lambda parsed: 0,
+                                   progress=PROGRESS_INTERVAL if args.progress else None)
+        sort_start = time.time()
+        writer.close(args.input_vcf)
+    except BaseException:
+        writer.abort()
+        raise
+    finally:
+        executor.close()
+        vcfreader.close()
+    sort_seconds = time.time() - sort_start
+
+
+    # print success message to user
+    # -------------------------------------------------------------------------
+
+    # stop timer on runtime
+    end = time.time()
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as jobj:
+            json.dump(stage_report(stage_stats, end-start, tool="buildRsidIndex",
+                                   input=args.input_vcf, output=args.output,
+                                   workers=executor.workers, chunk_size=args.chunk_size,
+                                   rows=writer.rows, duplicates=writer.duplicates,
+                                   sort_seconds=round(sort_seconds, 6)), jobj, indent=2)
+    print(format_stage_report(stage_stats, end-start))
+    print(f"index: {writer.rows} rsids in {sort_seconds:.3f}s to sort "
+          f"({writer.duplicates} duplicate rsids kept their first record)")
+    print(f"rsID Index Built: Minutes Elapsed: {(end-start)/60.0}")
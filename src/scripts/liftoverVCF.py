@@ -15,37 +15,92 @@
 # -----------------------------------------------------------------------------
 
 import argparse
+import cProfile
+import json
+import os
 import time
 import sys
 import sumstatstools.core.io as io
-from liftover import ChainFile
-from multiprocessing import Pool
-from typing import List,Tuple, TextIO, Union
+from functools import partial
+from sumstatstools.core.checkpoint import CHECKPOINT_SECONDS, Checkpointer, checkpoint_path
+from sumstatstools.core.checkpoint import checkpoint_settings, read_checkpoint
+from sumstatstools.core.compress import COMPRESSED_SUFFIXES, open_output, open_text_output
+from multiprocessing import cpu_count, get_all_start_methods
+from typing import Any, List, Tuple, TextIO, Union
 from sumstatstools.core.contig import Contig
-from sumstatstools.core.custom_types import BinLines, Tokens
+from sumstatstools.core.custom_types import BinLines, MapF, Tokens
+from sumstatstools.core.executors import BACKEND_CHOICES, MapExecutor, estimate_row_cost, resolve_backend
+from sumstatstools.core.chain import load_chain_index
+from sumstatstools.core.liftover import LiftedText, share_liftover_state, init_liftover_worker
+from sumstatstools.core.liftover import liftover_vcf_lines, lifted_rows, lifted_bytes
+from sumstatstools.core.instrument import init_profiled_worker
+from sumstatstools.core.pipeline import run_pipeline, format_stage_report, stage_report, plan_workers
+from sumstatstools.core.sort import SORT_MEMORY_BYTES, ExternalSorter, contig_order, keyed_parse
+from sumstatstools.core.vcf import VcfReader, write_lifted_vcf_header
 
 
 # define constants
 # -----------------------------------------------------------------------------
 
-POOL = Pool()
 BATCH_SIZE = 5000
+MAX_INFLIGHT = 2 * cpu_count()  # default number of batches read but not yet written
+PROGRESS_INTERVAL = 1.0  # seconds between --progress updates
+SAMPLE_ROWS = 1000  # number of records lifted to pick the backend with --backend auto
+RUN_OPTIONS = ("chunk_size", "max_inflight", "workers", "backend", "sort_memory_mb", "tmp_dir",
+               "no_chain_cache", "progress", "stats_json", "profile", "resume",
+               "checkpoint_seconds")  # options a checkpoint may be resumed with changed
 
 # define functions
 # -----------------------------------------------------------------------------
 
 # define a function to preprocess a batch of binary lines
 # by decoding and tokenizing
-def preprocess_lines(binary_lines: BinLines) -> Tuple[Tokens,...]:
-    return tuple(POOL.map(io.dec_utf8_and_tokenize, binary_lines))
+def preprocess_lines(binary_lines: BinLines, mapf: MapF = map) -> Tuple[Tokens,...]:
+    return tuple(mapf(io.dec_utf8_and_tokenize, binary_lines))
 
 # define a function that takes text and writes to either a passed file
 # or stderr if the file is None
 def write_unmapped(fobj: Union[TextIO, None], text: str) -> None:
     if fobj is not None:
         fobj.write(text)
+    elif text != '':
+        print(text, end='', file=sys.stderr)
+
+# define a function that writes a lifted chunk, sending mapped records to the
+# output vcf and unmapped records to the unmapped file (or stderr), and
+# adding the number of multi-mapping records to the passed counter
+def write_lifted_text(outfobj: TextIO, unmappedfobj: Union[TextIO, None],
+                      multimapped: List[int], result: LiftedText) -> None:
+    outfobj.write(result[0])
+    write_unmapped(unmappedfobj, result[1])
+    multimapped[0] += result[3]
+
+# define a function that writes a lifted chunk with --sort, adding the
+# mapped records and their sort keys to the sorter and writing the unmapped
+# records in input order
+def sort_lifted_text(sorter: ExternalSorter, unmappedfobj: Union[TextIO, None],
+                     multimapped: List[int], result: Tuple[Any,...]) -> None:
+    sorter.add(result[0], result[-1])
+    write_unmapped(unmappedfobj, result[1])
+    multimapped[0] += result[3]
+
+# define a function that creates the executor for liftover. the serial and
+# thread backends use the chain already shared in this process. process
+# workers are forked after the chain is loaded where fork is available, so
+# that they share it copy-on-write; otherwise each worker loads the chain
+# itself. when profile is set every worker process is profiled to
+# <profile>.worker.<pid>.prof
+def make_liftover_executor(backend: str, workers: int, chain_path: str, contigs_dict,
+                           profile: Union[str,None] = None) -> MapExecutor:
+    if backend != 'processes':
+        return MapExecutor(backend, workers)
+    if 'fork' in get_all_start_methods():
+        initializer, initargs, context = None, (), 'fork'
     else:
-        print(text, file=sys.stderr)
+        initializer, initargs, context = init_liftover_worker, (chain_path, contigs_dict), None
+    if profile is not None:
+        initializer, initargs = init_profiled_worker, (profile, initializer, initargs)
+    return MapExecutor(backend, workers, initializer, initargs, context)
 
 
 # define main() execution routine for script entrypoint
@@ -66,23 +121,66 @@ def main() -> None:
         """
     
     # configure command line parser
-    parser = argparse.ArgumentParser(prog="sumstatsToVCF", description=desc)
+    parser = argparse.ArgumentParser(prog="liftoverVCF", description=desc)
     parser.add_argument("input_vcf", type=str, help="vcf file to liftover")
     parser.add_argument("chain_file", type=str, help="UCSC style chain file for genome liftover")
     parser.add_argument("target_chrom_sizes", type=str, help="ucsc style chrom sizes file for new assembly")
     parser.add_argument("-o", "--output", type=str, required=True, help="name of output vcf")
     parser.add_argument("-u", "--unmapped", type=str, help='file for variants to be reported if they cannot be lifted')
     parser.add_argument("-g", "--genome_build", type=str, help="Name or alias of target genome_build")
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE,
+                        help='number of vcf records lifted per chunk')
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                        help='maximum number of chunks held in memory at once')
+    parser.add_argument("--workers", "--threads", type=int, default=None,
+                        help='number of worker processes, 0 to lift in the main process '
+                             '(default: one per 8 MB of input, up to one per core)')
+    parser.add_argument("--backend", type=str, default='processes', choices=BACKEND_CHOICES,
+                        help='how workers run: in the main process, on threads (parallel on free-threaded '
+                             'python), in worker processes, or chosen from a timed sample of the input')
+    parser.add_argument("--drop-multimap", action='store_true',
+                        help='treat positions covered by more than one chain block as unmapped')
+    parser.add_argument("--sort", action='store_true',
+                        help='write mapped records sorted by target contig (in chrom sizes order) and position')
+    parser.add_argument("--index", type=str, default='tbi', choices=['tbi','csi','none'],
+                        help='index to build while writing bgzf (.gz) output, written when the '
+                             'output is coordinate sorted (e.g. with --sort)')
+    parser.add_argument("--sort-memory-mb", type=int, default=SORT_MEMORY_BYTES // (1024 * 1024),
+                        help='memory in MB for sorting before spilling sorted runs to disk')
+    parser.add_argument("--tmp-dir", type=str, default=None,
+                        help='directory for the sorted runs spilled by --sort (default: system temp)')
+    parser.add_argument("--no-chain-cache", action='store_true',
+                        help='do not read or write the .npz chain index cache')
+    parser.add_argument("--resume", action='store_true',
+                        help='checkpoint the run to <output>.ckpt, and resume an interrupted run '
+                             'from its last checkpoint')
+    parser.add_argument("--checkpoint-seconds", type=float, default=CHECKPOINT_SECONDS,
+                        help='seconds between checkpoints with --resume')
+    parser.add_argument("--progress", action='store_true',
+                        help='print rows written, rows/s and MB read/written to stderr while running')
+    parser.add_argument("--stats-json", type=str, default=None,
+                        help='write per-stage timings, rows, bytes and queue waits to this json file')
+    parser.add_argument("--profile", type=str, default=None,
+                        help='write cProfile stats of the main process and each worker to <PROFILE>.*.prof')
 
     # parse user arguments
     args = parser.parse_args()
+    if args.resume and args.sort:
+        parser.error("--resume does not apply with --sort")
+    if not os.path.isfile(args.input_vcf):
+        parser.error(f"{args.input_vcf} does not exist")
+    workers = plan_workers(args.workers, os.path.getsize(args.input_vcf))
+    threads = max(1, workers)
+    if args.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
 
     
     # open target_chrom_sizes file and build contig dict
     # -------------------------------------------------------------------------
     contigs: List[Contig] = []
     genome_build = args.genome_build if args.genome_build is not None else "UNKOWN"
-    with open(args.chrom_sizes, 'rb') as chrobj:
+    with open(args.target_chrom_sizes, 'rb') as chrobj:
         contig_reader_f = io.generate_file_reader(chrobj, BATCH_SIZE)
         linesbatch = contig_reader_f()
         contigspreproc = preprocess_lines(linesbatch)
@@ -97,37 +195,146 @@ def main() -> None:
     contigs_dict = {c.get_id() : c for c in contigs}
 
 
-    # build liftover chain file 
+    # build liftover chain index, reusing the .npz cache of an earlier run
+    # -------------------------------------------------------------------------
+
+    chainindex = load_chain_index(args.chain_file, cache=not args.no_chain_cache)
+    share_liftover_state(chainindex, contigs_dict)
+
+    # start the workers before any reader threads, so process workers can be
+    # forked safely. with --backend auto a sample of the records is lifted
+    # here first, and the records in the file and their cost decide between
+    # lifting serially and in parallel
+    nitems, item_seconds = 0, 0.0
+    if args.backend == 'auto' and workers > 1:
+        with VcfReader(args.input_vcf, SAMPLE_ROWS) as samplereader:
+            sample = samplereader.read_lines()
+            lift_sample = partial(liftover_vcf_lines, source_contigs_dict=samplereader.get_contigs_dict(),
+                                  drop_multimap=args.drop_multimap)
+        rows, row_seconds = estimate_row_cost(lift_sample, sample, os.path.getsize(args.input_vcf))
+        nitems = max(1, rows // args.chunk_size)
+        item_seconds = rows * row_seconds / nitems
+    backend = resolve_backend(args.backend, workers, nitems, item_seconds)
+    executor = make_liftover_executor(backend, workers, args.chain_file, contigs_dict, args.profile)
+
+
+    # open input VCF file for batch processing
     # -------------------------------------------------------------------------
 
-    chainfileobj = ChainFile(args.chain_file)
+    vcfreader = VcfReader(args.input_vcf, args.chunk_size, threads)
+    header_lines = vcfreader.get_header_lines()
+    source_contigs_dict = vcfreader.get_contigs_dict()
 
 
     # open output VCF file for writing and unmapped text file if applicable
     # -------------------------------------------------------------------------
 
-    outvcfobj = open(args.output, 'w')
-    if args.unmapped is not None:
-        unmappedfobj = open(args.unmapped, 'w')
-    else:
+    # with --resume, a checkpoint left by an interrupted run with the same
+    # input and options is resumed: both outputs are cut back to their
+    # committed sizes and the input is skipped up to the chunk they were
+    # committed after
+    checkpointer, resumed_at = None, None
+    if args.resume:
+        settings = checkpoint_settings(args.input_vcf, vars(args), RUN_OPTIONS)
+        try:
+            state = read_checkpoint(checkpoint_path(args.output), settings)
+        except ValueError as e:
+            parser.error(str(e))
+        checkpointer = Checkpointer(checkpoint_path(args.output), settings, args.checkpoint_seconds, state)
+        if checkpointer.resumed:
+            resumed_at = (checkpointer.rows, checkpointer.input_offset)
+    resume = checkpointer is not None and checkpointer.resumed
+    index = None
+    if args.output.endswith(COMPRESSED_SUFFIXES) and args.index != 'none':
+        index = args.index
+    try:
+        outvcfobj = open_output(args.output, threads, index,
+                                checkpointer.resume_offset("output") if resume else None)
         unmappedfobj = None
+        if args.unmapped is not None:
+            unmappedfobj = open_text_output(args.unmapped, checkpointer.resume_offset("unmapped") if resume else None)
+    except (FileNotFoundError, ValueError) as e:
+        parser.error(f"cannot resume {args.output}: {e}")
+    if not resume:
+        write_lifted_vcf_header(outvcfobj, header_lines, tuple(contigs_dict.values()), genome_build)
+        if unmappedfobj is not None:
+            unmappedfobj.write('\n'.join(header_lines) + '\n')
     
 
-    # open input VCF file for batch processing
-    # -------------------------------------------------------------------------
-
     # liftover variants and write to VCF
     # -------------------------------------------------------------------------
 
+    # a reader thread reads chunks of vcf lines, each worker lifts a whole
+    # chunk using the chain shared at fork, and a writer thread writes mapped
+    # and unmapped records in input order
+    multimapped = [checkpointer.counters.get("multimapped", 0) if resume else 0]
+    lift_lines = partial(liftover_vcf_lines, source_contigs_dict=source_contigs_dict,
+                         drop_multimap=args.drop_multimap)
+
+    write = partial(write_lifted_text, outvcfobj, unmappedfobj, multimapped)
+
+    # lifted positions are not monotonic, so with --sort the workers also
+    # return the sort key of each mapped record and the mapped records are
+    # written in target coordinate order once the input is exhausted
+    if args.sort:
+        lift_lines = partial(keyed_parse, lift_lines, contig_order(contigs_dict.values()))
+        sorter = ExternalSorter(outvcfobj.write, args.sort_memory_mb * 1024 * 1024, args.tmp_dir)
+        write = partial(sort_lifted_text, sorter, unmappedfobj, multimapped)
+    read_lines = vcfreader.read_lines
+    if checkpointer is not None:
+        checkpointer.track("output", outvcfobj)
+        if unmappedfobj is not None: checkpointer.track("unmapped", unmappedfobj)
+        checkpointer.count_with(lambda: {"multimapped": multimapped[0]})
+        if resume:
+            vcfreader.skip(checkpointer.input_offset)
+        else:
+            checkpointer.commit()
+        read_lines, write = checkpointer.reader(read_lines), checkpointer.writer(write, lifted_rows)
+    setup_seconds = time.time() - start
+    stage_stats = run_pipeline(read_lines, lift_lines, write, executor.imap,
+                               args.max_inflight, result_rows=lifted_rows,
+                               result_bytes=lifted_bytes,
+                               progress=PROGRESS_INTERVAL if args.progress else None,
+                               profile=args.profile)
+    executor.close()
+    sort_report = {}
+    if args.sort:
+        sorter.close()
+        sort_report = {"sort_seconds": round(sorter.seconds, 6), "sort_runs": sorter.runs}
+
     # close the file connections which are opened during the run
     # -------------------------------------------------------------------------
 
+    vcfreader.close()
     outvcfobj.close()
     unmappedfobj.close() if unmappedfobj is not None else None
+    if checkpointer is not None: checkpointer.finish()
 
     # print success message to user
     # -------------------------------------------------------------------------
     
     # stop timer on runtime
     end = time.time()
+    if args.profile is not None:
+        profiler.disable()
+        profiler.dump_stats(f"{args.profile}.main.prof")
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as jobj:
+            json.dump(stage_report(stage_stats, end-start, tool="liftoverVCF",
+                                   input=args.input_vcf, output=args.output,
+                                   workers=executor.workers, backend=backend,
+                                   chunk_size=args.chunk_size, multimapped=multimapped[0],
+                                   setup_seconds=round(setup_seconds, 6),
+                                   checkpoints=checkpointer.commits if checkpointer is not None else None,
+                                   resumed_rows=resumed_at[0] if resumed_at is not None else None,
+                                   **sort_report), jobj, indent=2)
+    print(format_stage_report(stage_stats, end-start))
+    if args.sort:
+        print(f"sort: {sorter.rows} records in {sorter.seconds:.3f}s ({sorter.runs} runs spilled to disk)")
+    if checkpointer is not None:
+        print(f"resume: {checkpointer.commits} checkpoints written"
+              f"{f', resumed after {resumed_at[0]} rows at input byte {resumed_at[1]}' if resumed_at else ''}")
+    print(f"startup: {setup_seconds:.3f}s to start the pipeline with {executor.workers} workers ({backend})")
+    print(f"multi-mapping records: {multimapped[0]}"
+          f"{' (written as unmapped)' if args.drop_multimap else ''}")
     print(f"VCF file lifted over: Minutes Elapsed: {(end-start)/60.0}")
\ No newline at end of file
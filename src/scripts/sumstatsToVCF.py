@@ -9,27 +9,58 @@
 # -----------------------------------------------------------------------------
 
 import argparse
+import cProfile
+import json
+import os
 import time
 import sumstatstools.core.io as io
 from functools import partial
 from json import load
-from jsonschema import validate
-from multiprocessing import Pool
-from typing import Union, List, Tuple, Literal
-from sumstatstools.core.custom_types import BinLines, Tokens
+from multiprocessing import cpu_count
+from typing import List, Tuple
+from sumstatstools.core.cache import CacheWriter, cache_key, evict_cache, generate_row_range_reader
+from sumstatstools.core.cache import open_cache, parse_cached_range, parse_lines_to_cached
+from sumstatstools.core.cache import share_cache_state, source_fingerprint, write_cached_text
+from sumstatstools.core.checkpoint import CHECKPOINT_SECONDS, Checkpointer, checkpoint_path
+from sumstatstools.core.checkpoint import checkpoint_settings, read_checkpoint
+from sumstatstools.core.chunking import RANGE_BYTES, generate_range_reader
+from sumstatstools.core.chunking import parse_byte_range, parse_lines_to_text, range_rows, range_size
+from sumstatstools.core.chunking import write_range_text
+from sumstatstools.core.custom_types import BinLines, MapF, Tokens
+from sumstatstools.core.compress import COMPRESSED_SUFFIXES, open_input, open_output
+from sumstatstools.core.compress import is_compressed_file, open_bgzf_at, skip_input
+from sumstatstools.core.batch import contig_codes_dict
 from sumstatstools.core.contig import Contig
-from sumstatstools.core.vcf import write_vcf_header, write_vcf_record
-from sumstatstools.core.variant import variant_from_tokens
+from sumstatstools.core.dedup import DEDUP_POLICIES, MAX_DEDUP_CONTIGS, Deduplicator, add_dedup_text, dedup_parse
+from sumstatstools.core.executors import BACKEND_CHOICES, MapExecutor, estimate_row_cost, measure_item_cost
+from sumstatstools.core.executors import resolve_backend
+from sumstatstools.core.fasta import Harmonizer, ReferenceGenome, fai_path, match_reference_contigs
+from sumstatstools.core.filters import compile_row_filter, merge_regions, parse_region, read_bed
+from sumstatstools.core.filters import resolve_region_contigs
+from sumstatstools.core.instrument import init_profiled_worker
+from sumstatstools.core.rsindex import RsidIndex
+from sumstatstools.core.plan import compile_column_plan, share_column_plan, batch_from_shared_plan
+from sumstatstools.core.pipeline import run_pipeline, format_stage_report, stage_report, plan_workers
+from sumstatstools.core.pipeline import lines_bytes, text_bytes
+from sumstatstools.core.seek import generate_region_reader, open_at_offset, sorted_region_seeks
+from sumstatstools.core.seek import tabix_region_seeks
+from sumstatstools.core.sort import SORT_MEMORY_BYTES, ExternalSorter, add_keyed_text, contig_order, keyed_parse
+from sumstatstools.core.stats import STAT_KEYS
+from sumstatstools.core.tabix import read_tabix_index
+from sumstatstools.core.vcf import INFO_PRECISION, write_vcf_header, format_vcf_batch
 
 
 # constants
 # -----------------------------------------------------------------------------
 
 BATCH_SIZE = 5000  # number of sumstats records to read in at a time
-VARIANT_CORE_ATTRS = ['chrom','pos', 'id', 'other_allele', 'eff_allele']
-VARIANT_STAT_ATTRS = ['beta', 'beta_se', 'zscore', 'pval', 'logp']
+MAX_INFLIGHT = 2 * cpu_count()  # default number of batches read but not yet written
+PROGRESS_INTERVAL = 1.0  # seconds between --progress updates
+SAMPLE_ROWS = 1000  # number of rows parsed to pick the backend with --backend auto
+RUN_OPTIONS = ("chunk_size", "max_inflight", "workers", "backend", "range_mb", "sort_memory_mb",
+               "tmp_dir", "cache_max_mb", "cache_max_age_days", "progress", "stats_json", "profile",
+               "resume", "checkpoint_seconds")  # options a checkpoint may be resumed with changed
 
-POOL = Pool()
 METADATA_SCH = {
     "type" : "object",
     "properties" : {
@@ -65,19 +96,20 @@ METADATA_SCH = {
 }
 
 
-# define type aliases
-# -----------------------------------------------------------------------------
-
-Indices = List[Union[int,Literal['.']]]
-
-
 # define functions 
 # -----------------------------------------------------------------------------
 
 # define a function to preprocess a batch of binary lines
 # by decoding and tokenizing
-def preprocess_lines(binary_lines: BinLines) -> Tuple[Tokens,...]:
-    return tuple(POOL.map(io.dec_utf8_and_tokenize, binary_lines))
+def preprocess_lines(binary_lines: BinLines, mapf: MapF = map) -> Tuple[Tokens,...]:
+    return tuple(mapf(io.dec_utf8_and_tokenize, binary_lines))
+
+# define a function that validates the metadata against the schema.
+# jsonschema is imported here since it is slow to import and only
+# needed once per run
+def validate_metadata(metadata: dict) -> None:
+    from jsonschema import validate
+    validate(instance=metadata, schema=METADATA_SCH)
 
 
 # define main() execution routine for script entrypoint
@@ -104,20 +136,155 @@ def main() -> None:
     parser.add_argument("metadata", type=str, help="metadata JSON file")
     parser.add_argument("chrom_sizes", type=str, help="ucsc style chrom sizes file")
     parser.add_argument("sumstats_file", type=str, help="summary stats file to convert")
-    parser.add_argument("-o", "--output", type=str, help="name of output vcf", default="out.vcf")
+    parser.add_argument("-o", "--output", type=str, help="name of output vcf (.gz for bgzf)", default="out.vcf")
+    parser.add_argument("--output-format", type=str, default='vcf', choices=['vcf','parquet'],
+                        help='write a vcf, or a parquet dataset of the derived table partitioned by '
+                             'chromosome into the --output directory (needs pyarrow)')
     parser.add_argument("--chr-convert", type=str, default='none', choices=['none','ucsc','simple'],
                         help='convert chroms to ucsc style [chr1], or simple style [1]')
+    parser.add_argument("--delimiter", type=str, default='whitespace', choices=io.DELIMITER_CHOICES,
+                        help='field separator of the sumstats file; tab and comma keep spaces inside '
+                             'fields, and auto sniffs it from the header line (default: runs of whitespace)')
+    parser.add_argument("--chunk-size", type=int, default=BATCH_SIZE,
+                        help='number of sumstats records parsed per chunk')
+    parser.add_argument("--max-inflight", type=int, default=MAX_INFLIGHT,
+                        help='maximum number of chunks held in memory at once')
+    parser.add_argument("--workers", "--threads", type=int, default=None,
+                        help='number of worker processes, 0 to parse in the main process '
+                             '(default: one per 8 MB of input, up to one per core)')
+    parser.add_argument("--backend", type=str, default='processes', choices=BACKEND_CHOICES,
+                        help='how workers run: in the main process, on threads (parallel on free-threaded '
+                             'python), in worker processes, or chosen from a timed sample of the input')
+    parser.add_argument("--byte-ranges", action='store_true',
+                        help='have workers read newline-aligned byte ranges of the file directly')
+    parser.add_argument("--range-mb", type=int, default=RANGE_BYTES // (1024 * 1024),
+                        help='size in MB of each byte range when using --byte-ranges')
+    parser.add_argument("--index", type=str, default='tbi', choices=['tbi','csi','none'],
+                        help='index to build while writing bgzf (.gz) output')
+    parser.add_argument("--sort", action='store_true',
+                        help='write records sorted by contig (in chrom sizes order) and position')
+    parser.add_argument("--sort-memory-mb", type=int, default=SORT_MEMORY_BYTES // (1024 * 1024),
+                        help='memory in MB for sorting before spilling sorted runs to disk')
+    parser.add_argument("--tmp-dir", type=str, default=None,
+                        help='directory for the sorted runs spilled by --sort (default: system temp)')
+    parser.add_argument("--region", type=str, action='append', default=[],
+                        help='only convert records in this region, written chrom, chrom:start or '
+                             'chrom:start-end with one based inclusive positions (repeatable)')
+    parser.add_argument("--bed", type=str, default=None,
+                        help='only convert records in the regions of this bed file')
+    parser.add_argument("--max-pval", type=float, default=None,
+                        help='only convert records with a P value at or below this')
+    parser.add_argument("--min-logp", type=float, default=None,
+                        help='only convert records with a -log10 P value at or above this')
+    parser.add_argument("--sorted-input", action='store_true',
+                        help='the sumstats file is sorted by position within contiguous chromosome blocks, '
+                             'so an uncompressed file is only read around the --region/--bed regions '
+                             '(bgzf files with a .tbi index always are)')
+    parser.add_argument("--reference", type=str, default=None,
+                        help='uncompressed reference fasta, indexed with samtools faidx, to harmonize '
+                             'alleles against: REF/ALT are swapped (negating BETA and Z) or strand flipped '
+                             'to match it')
+    parser.add_argument("--drop-unharmonized", action='store_true',
+                        help='with --reference, drop palindromic (A/T, C/G) SNPs and records whose '
+                             'alleles match neither strand of the reference')
+    parser.add_argument("--rsid-index", type=str, default=None,
+                        help='rsid index built with buildRsidIndex, placing records by their rsIDs '
+                             'for files without chrom and pos columns')
+    parser.add_argument("--dedup", type=str, default=None, choices=DEDUP_POLICIES,
+                        help='write each variant (chrom, pos, REF, ALT) once, keeping its first record, '
+                             'the record with the smallest P, or dropping duplicated variants entirely. '
+                             'keep-min-p and drop-all need --sort or --sorted-input')
+    parser.add_argument("--merge-multiallelic", action='store_true',
+                        help='merge records at one position sharing REF into multi-allelic lines, '
+                             'deduplicating with keep-first unless --dedup is given. '
+                             'needs --sort or --sorted-input')
+    parser.add_argument("--info-fields", type=str, default=','.join(STAT_KEYS),
+                        help=f'comma separated INFO fields to write, from {",".join(STAT_KEYS)}')
+    parser.add_argument("--info-precision", type=int, default=INFO_PRECISION,
+                        help='digits after the point for INFO values')
+    parser.add_argument("--cache-dir", type=str, default=None,
+                        help='directory of parsed column caches: the first run on a file writes its '
+                             'columns here and later runs read them instead of parsing the text')
+    parser.add_argument("--cache-max-mb", type=int, default=None,
+                        help='after the run, evict least recently used cache entries beyond this size')
+    parser.add_argument("--cache-max-age-days", type=float, default=None,
+                        help='after the run, evict cache entries unused for this many days')
+    parser.add_argument("--resume", action='store_true',
+                        help='checkpoint the run to <output>.ckpt, and resume an interrupted run '
+                             'from its last checkpoint')
+    parser.add_argument("--checkpoint-seconds", type=float, default=CHECKPOINT_SECONDS,
+                        help='seconds between checkpoints with --resume')
+    parser.add_argument("--progress", action='store_true',
+                        help='print rows written, rows/s and MB read/written to stderr while running')
+    parser.add_argument("--stats-json", type=str, default=None,
+                        help='write per-stage timings, rows, bytes and queue waits to this json file')
+    parser.add_argument("--profile", type=str, default=None,
+                        help='write cProfile stats of the main process and each worker to <PROFILE>.*.prof')
 
     # parse user arguments
     args = parser.parse_args()
+    if not os.path.isfile(args.sumstats_file):
+        parser.error(f"{args.sumstats_file} does not exist")
+    if args.profile is not None:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    workers = plan_workers(args.workers, os.path.getsize(args.sumstats_file))
+    threads = max(1, workers)
+    if args.byte_ranges and is_compressed_file(args.sumstats_file):
+        parser.error("--byte-ranges requires an uncompressed sumstats file")
+    parquet_in = io.is_parquet_file(args.sumstats_file)
+    parquet_out = args.output_format == 'parquet'
+    if parquet_in and (args.byte_ranges or args.cache_dir is not None):
+        parser.error("--byte-ranges and --cache-dir only apply to text sumstats files")
+    if parquet_out and args.sort:
+        parser.error("--sort only applies to vcf output")
+    info_fields = tuple(f for f in args.info_fields.split(',') if f != '')
+    if any(f not in STAT_KEYS for f in info_fields):
+        parser.error(f"--info-fields must be taken from {','.join(STAT_KEYS)}")
+    if args.reference is not None and is_compressed_file(args.reference):
+        parser.error("--reference must be an uncompressed fasta file")
+    if args.drop_unharmonized and args.reference is None:
+        parser.error("--drop-unharmonized requires --reference")
+    if args.rsid_index is not None and args.cache_dir is not None:
+        parser.error("--cache-dir does not apply with --rsid-index")
+    if args.resume and (parquet_in or parquet_out or args.sort or args.byte_ranges
+                        or args.cache_dir is not None):
+        parser.error("--resume only applies to text input and vcf output, "
+                     "without --sort, --byte-ranges or --cache-dir")
+    dedup_policy = args.dedup if args.dedup is not None else ('keep-first' if args.merge_multiallelic else None)
+    grouped = args.sort or args.sorted_input
+    if dedup_policy is not None and (parquet_out or args.resume):
+        parser.error("--dedup and --merge-multiallelic only apply to vcf output, without --resume")
+    if dedup_policy is not None and not grouped and (dedup_policy != 'keep-first' or args.merge_multiallelic):
+        parser.error(f"--dedup {dedup_policy}{' with --merge-multiallelic' if args.merge_multiallelic else ''} "
+                     f"needs --sort or --sorted-input, so the records of a position arrive together")
+    if dedup_policy == 'keep-min-p' and 'P' not in info_fields and 'LOGP' not in info_fields:
+        parser.error("--dedup keep-min-p needs P or LOGP in --info-fields")
+    try:
+        regions = [parse_region(r) for r in args.region]
+        bed_regions = read_bed(args.bed) if args.bed is not None else []
+    except ValueError as e:
+        parser.error(str(e))
+    region_filter = bool(args.region) or args.bed is not None
     
 
     # open sumstats file to read, grab header of the file, and prepare batch reader
     # -------------------------------------------------------------------------
 
-    sstobj = open(args.sumstats_file, 'rb')
-    sstheader = io.dec_utf8_and_tokenize(sstobj.readline())
-    sst_reader_f = io.generate_file_reader(sstobj, BATCH_SIZE)
+    # pyarrow is optional, so the parquet module is only imported for
+    # parquet input or output. the column names of a parquet file stand in
+    # for the header and its row groups are read by the workers
+    if parquet_in or parquet_out:
+        import sumstatstools.core.parquet as parquet
+    sstobj, sst_reader_f, delim = None, None, None
+    if parquet_in:
+        sstheader = parquet.read_parquet_header(args.sumstats_file)
+    else:
+        sstobj = open_input(args.sumstats_file, threads)
+        sstheaderline = sstobj.readline()
+        delim = io.resolve_delimiter(args.delimiter, sstheaderline)
+        sstheader = io.dec_utf8_and_tokenize(sstheaderline, delim)
+        sst_reader_f = io.generate_file_reader(sstobj, args.chunk_size)
 
     
     # read metadata file and parse json to dict the validate
@@ -125,7 +292,17 @@ def main() -> None:
 
     with open(args.metadata, 'r') as jobj:
         metadata = load(jobj)
-        validate(instance=metadata, schema=METADATA_SCH)
+        validate_metadata(metadata)
+
+    # a file without chrom and pos columns is placed by the rsIDs of its
+    # id column through an rsid index
+    located = metadata['columns']['chrom'] is None or metadata['columns']['pos'] is None
+    if located and args.rsid_index is None:
+        parser.error("the metadata maps no chrom or pos column; place the records with --rsid-index")
+    if not located and args.rsid_index is not None:
+        parser.error("--rsid-index only applies when the metadata maps no chrom or pos column")
+    if located and metadata['columns']['id'] is None:
+        parser.error("--rsid-index requires an id column of rsIDs")
 
 
     # load contigs from chrom.sizes file and generate contigs dict
@@ -145,67 +322,270 @@ def main() -> None:
             contigspreproc = preprocess_lines(linesbatch)
 
     contigs_dict = {c.get_id() : c for c in contigs}
-
-
-    # initialize the vcf file object and prepare to write the file
-    # -------------------------------------------------------------------------
-    vcfobj = open(args.output, 'w')
-    write_vcf_header(vcfobj, metadata['study']['genome_build'],
-                      metadata['study']['doi'],tuple(contigs_dict.values()))
-
+    if dedup_policy is not None and len(contigs_dict) > MAX_DEDUP_CONTIGS:
+        parser.error(f"--dedup supports up to {MAX_DEDUP_CONTIGS} contigs in {args.chrom_sizes}")
 
 
     # generate variants from summary stats file input and write to vcf
     # -------------------------------------------------------------------------
 
-    # get indices for the core variant attributes
-    ind_core: Indices = []
-    for attr in VARIANT_CORE_ATTRS:
+    # compile the column plan once from the header and the metadata: the
+    # column getters, the chromosome -> contig table and the stats to derive.
+    # the regions and p-value thresholds become the plan's row filter
+    row_filter = None
+    if region_filter or args.max_pval is not None or args.min_logp is not None:
         try:
-            ind=sstheader.index(metadata['columns'][attr])
-            ind_core.append(ind)
-        
-        except ValueError:
-            ind_core.append('.') 
-
-    # get indices for the stats attributes that will be converted to an info dict
-    ind_stat: Indices = []
-    for attr in VARIANT_STAT_ATTRS:
+            regions = merge_regions(resolve_region_contigs(regions, contigs_dict)
+                                    + resolve_region_contigs(bed_regions, contigs_dict, strict=False))
+        except KeyError as e:
+            parser.error(f"region on {e.args[0]}, which is not in {args.chrom_sizes}")
+        row_filter = compile_row_filter(regions if region_filter else None,
+                                        contig_codes_dict(tuple(contigs_dict.values())),
+                                        args.max_pval, args.min_logp)
+    rsid_index = None
+    if args.rsid_index is not None:
         try:
-            ind=sstheader.index(metadata['columns'][attr])
-            ind_stat.append(ind)
-        
-        except ValueError:
-            ind_stat.append('.')
-
-
-    # iterate through batches of lines from the sumstats file. preprocess,tokenize 
-    # and convert to variant objects. then write them out to the vcf file.
-    
-    kwargs = {"core_ind" : ind_core,
-              "stat_ind" : ind_stat,
-              "contig_convert" : args.chr_convert, 
-              "contigs_dict" : contigs_dict}
-    
-    sumstats_preproc = preprocess_lines(sst_reader_f())
-    while sumstats_preproc != ():
-
-        # generate variant objects
-        vars = POOL.map(partial(variant_from_tokens, **kwargs),sumstats_preproc)
-
-        # write to VCF
-        [write_vcf_record(vcfobj,v) for v in vars]
-
-        # get next batch
-        sumstats_preproc = preprocess_lines(sst_reader_f())
-
+            rsid_index = RsidIndex(args.rsid_index)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(f"cannot open rsid index {args.rsid_index}: {e}")
+    plan = compile_column_plan(sstheader, metadata['columns'], contigs_dict, args.chr_convert, delim,
+                               row_filter, rsid_index=rsid_index)
+
+    # with --reference the plan also harmonizes the alleles of each batch.
+    # the fasta sequence names are matched to the contigs with the plan's
+    # chromosome lookup, so the plan is compiled again with the harmonizer
+    if args.reference is not None:
+        try:
+            reference = ReferenceGenome(args.reference)
+        except FileNotFoundError:
+            parser.error(f"{fai_path(args.reference)} not found, index the reference with samtools faidx")
+        names = match_reference_contigs(reference.names, contigs_dict, plan.chrom_id)
+        if not names:
+            parser.error(f"no sequence of {args.reference} matches a contig of {args.chrom_sizes}")
+        lengths = reference.lengths
+        wrong = [cid for cid, name in names.items() if lengths[name] != contigs_dict[cid].get_length()]
+        if wrong:
+            parser.error(f"{args.reference} does not match the lengths of {args.chrom_sizes} "
+                         f"for {','.join(wrong)}; is it the same build?")
+        plan = compile_column_plan(sstheader, metadata['columns'], contigs_dict, args.chr_convert, delim,
+                                   row_filter, Harmonizer(reference, names, args.drop_unharmonized),
+                                   rsid_index)
+    share_column_plan(plan)
+    if parquet_in:
+        parquet.share_parquet_state(plan, args.sumstats_file)
+
+
+    # initialize the vcf file object and prepare to write the file, once
+    # every input has been checked so that a usage error leaves an existing
+    # output alone. parquet output is a directory of per chromosome files,
+    # with the study metadata kept in the schema of each file
+    # -------------------------------------------------------------------------
 
+    # with --resume, a checkpoint left by an interrupted run with the same
+    # input and options is resumed: the output is cut back to its committed
+    # size and the input is skipped up to the chunk it was committed after
+    checkpointer, resumed_at = None, None
+    if args.resume:
+        settings = checkpoint_settings(args.sumstats_file, vars(args), RUN_OPTIONS)
+        try:
+            state = read_checkpoint(checkpoint_path(args.output), settings)
+        except ValueError as e:
+            parser.error(str(e))
+        checkpointer = Checkpointer(checkpoint_path(args.output), settings, args.checkpoint_seconds, state)
+        resumed_at = (checkpointer.rows, checkpointer.input_offset) if checkpointer.resumed else None
+    if parquet_out:
+        outobj = parquet.ParquetDatasetWriter(args.output, {"study": json.dumps(metadata['study'])})
+    else:
+        index = None
+        if args.output.endswith(COMPRESSED_SUFFIXES) and args.index != 'none':
+            index = args.index
+        try:
+            outobj = open_output(args.output, threads, index,
+                                 checkpointer.resume_offset("output") if checkpointer is not None else None)
+        except (FileNotFoundError, ValueError) as e:
+            parser.error(f"cannot resume {args.output}: {e}")
+        if checkpointer is None or not checkpointer.resumed:
+            write_vcf_header(outobj, metadata['study']['genome_build'],
+                              metadata['study']['doi'],tuple(contigs_dict.values()), info_fields,
+                              per_allele=args.merge_multiallelic)
+    if checkpointer is not None:
+        checkpointer.track("output", outobj)
+        if checkpointer.resumed:
+            skip_input(sstobj, checkpointer.input_offset)
+        else:
+            checkpointer.commit()
+
+
+    # stream batches of lines from the sumstats file through the pipeline. a
+    # reader thread reads chunks, each worker decodes, tokenizes and
+    # converts a whole chunk to a VariantBatch and formats it as vcf text, and
+    # a writer thread writes each chunk of text to the vcf file in input order
+    # with a single write.
+
+    # with regions, a bgzf file with a tabix index or an uncompressed file
+    # given as sorted is only read around them, unless its records are
+    # placed through an rsid index or the run is checkpointed
+    seek_mode, index_path = None, f"{args.sumstats_file}.tbi"
+    if region_filter and not parquet_in and not args.byte_ranges and rsid_index is None and not args.resume:
+        if is_compressed_file(args.sumstats_file) and os.path.exists(index_path):
+            seek_mode = "tabix"
+        elif args.sorted_input and not is_compressed_file(args.sumstats_file):
+            seek_mode = "sorted"
+
+    # with --cache-dir, a cache entry matching the file, its column mapping
+    # and delimiter is read instead of the text. otherwise the parse writes
+    # one, except in byte range mode where the chunks are parsed out of order
+    # and when seeking regions, which reads only part of the file
+    cache, cache_writer, cache_state = None, None, None
+    if args.cache_dir is not None:
+        os.makedirs(args.cache_dir, exist_ok=True)
+        fingerprint = source_fingerprint(args.sumstats_file)
+        key = cache_key(fingerprint, metadata['columns'], delim)
+        cache = open_cache(args.cache_dir, key)
+        if cache is not None:
+            cache_state = "read"
+        elif not args.byte_ranges and seek_mode is None:
+            cache_writer = CacheWriter(args.cache_dir, key, {
+                "source": fingerprint, "header": list(sstheader),
+                "columns": metadata['columns'], "delimiter": delim, "metadata": metadata})
+            cache_state = "written"
+
+    # the workers are only started once the inputs have been checked, and
+    # small inputs are parsed in the main process without them. the plan is
+    # sent to each worker once by the initializer rather than with every chunk
+    progress = PROGRESS_INTERVAL if args.progress else None
+    parse_lines = batch_from_shared_plan
+    format_batch = partial(format_vcf_batch, precision=args.info_precision, info_fields=info_fields)
+    join, result_bytes = ''.join, text_bytes
+    if parquet_out:
+        format_batch = partial(parquet.format_arrow_batch, info_fields=info_fields)
+        join, result_bytes = parquet.concat_arrow_tables, parquet.formatted_bytes
+    parse_text = partial(parse_lines_to_text, parse_lines=parse_lines, format_batch=format_batch)
+
+    # with --backend auto a sample of the file is parsed here, and the rows in
+    # the file and their cost decide between parsing serially and in parallel
+    nitems, item_seconds = 0, 0.0
+    if args.backend == 'auto' and workers > 1 and parquet_in:
+        groups = parquet.parquet_row_groups(args.sumstats_file)
+        sample = parquet.read_parquet_sample(args.sumstats_file, SAMPLE_ROWS)
+        sample_seconds = measure_item_cost(partial(parquet.parse_record_batch, format_batch=format_batch), [sample])
+        nitems = max(1, len(groups))
+        item_seconds = sum(g.rows for g in groups) * sample_seconds / max(1, sample.num_rows) / nitems
+    elif args.backend == 'auto' and workers > 1:
+        sample = io.read_sample_lines(args.sumstats_file, SAMPLE_ROWS)
+        rows, row_seconds = estimate_row_cost(parse_text, sample, os.path.getsize(args.sumstats_file))
+        nitems = max(1, rows // args.chunk_size)
+        if args.byte_ranges:
+            nitems = max(1, os.path.getsize(args.sumstats_file) // (args.range_mb * 1024 * 1024))
+        item_seconds = rows * row_seconds / nitems
+    backend = resolve_backend(args.backend, workers, nitems, item_seconds)
+    if parquet_in:
+        initializer, initargs = parquet.share_parquet_state, (plan, args.sumstats_file)
+    elif args.cache_dir is not None:
+        initializer, initargs = share_cache_state, (plan, cache.path if cache is not None else None)
+    else:
+        initializer, initargs = share_column_plan, (plan,)
+    if args.profile is not None and backend == 'processes':
+        initializer, initargs = init_profiled_worker, (args.profile, initializer, initargs)
+    executor = MapExecutor(backend, workers, initializer, initargs)
+    setup_seconds = time.time() - start
+
+    # pick the chunks to read and the parse. in byte range mode the workers
+    # memory-map the file and parse their own ranges straight to vcf text, so
+    # only the output crosses processes. from a cache the workers map the
+    # cached columns and build each chunk of rows without tokenizing, and
+    # from parquet each worker reads the mapped columns of whole row groups,
+    # skipping those whose statistics rule out the row filter
+    reader_f, parse, chunk_rows, chunk_bytes = sst_reader_f, parse_text, len, lines_bytes
+    seeks, groups, read_groups = None, None, None
+    if parquet_in:
+        groups = read_groups = parquet.parquet_row_groups(args.sumstats_file)
+        if row_filter is not None:
+            read_groups = parquet.prune_row_groups(args.sumstats_file, groups, plan)
+        reader_f = parquet.generate_row_group_reader(read_groups)
+        parse = partial(parquet.parse_row_group, chunk_size=args.chunk_size, format_batch=format_batch,
+                        join=join)
+        chunk_rows, chunk_bytes = parquet.row_group_rows, parquet.row_group_bytes
+    elif cache is not None:
+        reader_f = generate_row_range_reader(cache.rows, args.chunk_size)
+        parse = partial(parse_cached_range, format_batch=format_batch)
+        chunk_rows, chunk_bytes = (lambda r: r[1] - r[0]), (lambda r: 0)
+    elif seek_mode is not None:
+        if seek_mode == "tabix":
+            seeks = tabix_region_seeks(read_tabix_index(index_path), regions, plan.chrom_id)
+            open_at = partial(open_bgzf_at, args.sumstats_file, threads=threads)
+        else:
+            seeks = sorted_region_seeks(args.sumstats_file, sstobj.tell(), regions, plan.locus)
+            open_at = partial(open_at_offset, args.sumstats_file)
+        reader_f = generate_region_reader(open_at, seeks, plan.locus, args.chunk_size)
+    elif args.byte_ranges:
+        reader_f = generate_range_reader(args.sumstats_file, sstobj.tell(), args.range_mb * 1024 * 1024)
+        parse = partial(parse_byte_range, path=args.sumstats_file, parse_lines=parse_lines,
+                        chunk_size=args.chunk_size, format_batch=format_batch, join=join)
+        chunk_rows, chunk_bytes = (lambda r: 0), range_size
+    elif cache_writer is not None:
+        parse = partial(parse_lines_to_cached, format_batch=format_batch)
+
+    # with --sort the workers also return the sort key of each record, and
+    # the writer collects the records in a sorter which writes them in
+    # coordinate order once the input is exhausted
+    write = partial(write_range_text, outobj)
+    order = contig_order(contigs_dict.values())
+    dedup = None
+    if dedup_policy is not None:
+        dedup = Deduplicator(outobj.write, order, dedup_policy, args.merge_multiallelic, grouped)
+    if args.sort:
+        parse = partial(keyed_parse, parse, order)
+        sorter = ExternalSorter(outobj.write if dedup is None else dedup.add,
+                                args.sort_memory_mb * 1024 * 1024, args.tmp_dir)
+        write = partial(add_keyed_text, sorter)
+
+    # with --dedup the workers also return the variant key of each record,
+    # and the writer drops repeated variants before writing. after --sort
+    # the sorted text is deduplicated as it is written instead
+    elif dedup is not None:
+        parse = partial(dedup_parse, parse, order, dedup_policy == 'keep-min-p')
+        write = partial(add_dedup_text, dedup)
+    if cache_writer is not None:
+        write = partial(write_cached_text, cache_writer, write)
+    if checkpointer is not None:
+        reader_f, write = checkpointer.reader(reader_f), checkpointer.writer(write, range_rows)
+
+    try:
+        stage_stats = run_pipeline(reader_f, parse, write, executor.imap, args.max_inflight,
+                                   chunk_rows=chunk_rows, result_rows=range_rows,
+                                   chunk_bytes=chunk_bytes, result_bytes=result_bytes,
+                                   progress=progress, profile=args.profile)
+    except BaseException:
+        if cache_writer is not None: cache_writer.abort()
+        raise
+    if cache_writer is not None:
+        cache_writer.close()
+    sort_report = {}
+    if args.sort:
+        sorter.close()
+        sort_report = {"sort_seconds": round(sorter.seconds, 6), "sort_runs": sorter.runs}
+    dedup_report = {}
+    if dedup is not None:
+        dedup.close()
+        dedup_report = {"dedup_dropped": dedup.dropped, "dedup_merged": dedup.merged,
+                        "dedup_collisions": dedup.collisions}
+
+    # evict old or excess cache entries, keeping the one this run used
+    evicted = []
+    if args.cache_dir is not None and (args.cache_max_mb is not None or args.cache_max_age_days is not None):
+        evicted = evict_cache(args.cache_dir,
+                              args.cache_max_mb * 1024 * 1024 if args.cache_max_mb is not None else None,
+                              args.cache_max_age_days * 86400 if args.cache_max_age_days is not None else None,
+                              keep=(os.path.join(args.cache_dir, key),))
 
 
     # close persistent file connections
     # -------------------------------------------------------------------------
-    sstobj.close()
-    vcfobj.close()
+    if sstobj is not None: sstobj.close()
+    outobj.close()
+    executor.close()
+    if checkpointer is not None: checkpointer.finish()
 
 
     # print success message to user
@@ -213,4 +593,38 @@ def main() -> None:
     
     # stop timer on runtime
     end = time.time()
-    print(f"Summary Stats File Converted to VCF: Minutes Elapsed: {(end-start)/60.0}")
+    if args.profile is not None:
+        profiler.disable()
+        profiler.dump_stats(f"{args.profile}.main.prof")
+    if args.stats_json is not None:
+        with open(args.stats_json, 'w') as jobj:
+            json.dump(stage_report(stage_stats, end-start, tool="sumstatsToVCF",
+                                   input=args.sumstats_file, output=args.output,
+                                   workers=executor.workers, backend=backend,
+                                   chunk_size=args.chunk_size,
+                                   setup_seconds=round(setup_seconds, 6), cache=cache_state,
+                                   cache_evicted=evicted, regions=len(regions) if region_filter else None,
+                                   region_seek=seek_mode, rsid_index=args.rsid_index,
+                                   checkpoints=checkpointer.commits if checkpointer is not None else None,
+                                   resumed_rows=resumed_at[0] if resumed_at is not None else None,
+                                   **sort_report, **dedup_report), jobj, indent=2)
+    print(format_stage_report(stage_stats, end-start))
+    if cache_state is not None:
+        print(f"cache: {cache_state} {os.path.join(args.cache_dir, key)}"
+              f"{f', evicted {len(evicted)} entries' if evicted else ''}")
+    if seek_mode is not None:
+        print(f"regions: {len(seeks)} of {len(regions)} regions read with {seek_mode} seeks")
+    elif parquet_in and row_filter is not None:
+        print(f"row groups: {len(read_groups)} of {len(groups)} parquet row groups read after pruning")
+    if args.sort:
+        print(f"sort: {sorter.rows} records in {sorter.seconds:.3f}s ({sorter.runs} runs spilled to disk)")
+    if dedup is not None:
+        print(f"dedup: {dedup.dropped} duplicate records dropped ({dedup.policy})"
+              f"{f', {dedup.merged} records merged into {dedup.merged_lines} multi-allelic lines' if args.merge_multiallelic else ''}"
+              f"{f', {dedup.collisions} variants kept apart from others sharing their key' if dedup.collisions else ''}")
+    if checkpointer is not None:
+        print(f"resume: {checkpointer.commits} checkpoints written"
+              f"{f', resumed after {resumed_at[0]} rows at input byte {resumed_at[1]}' if resumed_at else ''}")
+    print(f"startup: {setup_seconds:.3f}s to start the pipeline with {executor.workers} workers ({backend})")
+    print(f"Summary Stats File Converted to {'Parquet' if parquet_out else 'VCF'}: "
+          f"Minutes Elapsed: {(end-start)/60.0}")
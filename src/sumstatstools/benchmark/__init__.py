@@ -0,0 +1,4 @@
+# File Name: __init__.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: enable loading of modules contained inside the benchmark package
@@ -0,0 +1,162 @@
+# File Name: records.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: micro-benchmark comparing the slotted, immutable Variant and
+#  Contig records against the original __dict__ based classes with
+#  getter/setter properties. reports per-object memory, construction cost,
+#  copy cost (replace() vs copy.deepcopy) and pickled size.
+#  run with: python -m sumstatstools.benchmark.records [-n N]
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import argparse
+import pickle
+import timeit
+import tracemalloc
+from copy import deepcopy
+from typing import Any, Callable, Dict, List, Tuple
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.variant import Variant
+
+
+# legacy object definitions, kept verbatim apart from naming so that the
+# benchmark always measures against the pre-slots representation
+# -----------------------------------------------------------------------------
+
+class LegacyContig:
+    def __init__(self,id: str, length: int, genome_build: str) -> None:
+        self._id = id
+        self._length = length
+        self._genome_build = genome_build
+
+    def get_id(self) -> str:
+        return self._id
+
+    def set_id(self, new_id: str) -> None:
+        self._id = new_id
+
+    def get_length(self) -> int:
+        return self._length
+
+    def set_length(self, new_length: int) -> None:
+        self._length = new_length
+
+    def get_genome_build(self) -> str:
+        return self._genome_build
+
+    def set_genome_build(self, new_genome_build: str) -> None:
+        self._genome_build = new_genome_build
+
+    id = property(get_id, set_id)
+    length = property(get_length, set_length)
+    genome_build = property(get_genome_build, set_genome_build)
+
+
+class LegacyVariant:
+    def __init__(self, contig: Any, pos: int, ref: str, name: str,
+                  alt: str, filt: str, qual: str, info: Dict[str,Any]) -> None:
+        self._contig = contig
+        self._pos = pos
+        self._name = name
+        self._ref = ref
+        self._alt = alt
+        self._filt = filt
+        self._qual = qual
+        self._info = info
+
+    def get_contig(self) -> Any:
+        return self._contig
+
+    def set_contig(self, new_contig: Any) -> None:
+        self._contig = new_contig
+
+    def get_pos(self) -> int:
+        return self._pos
+
+    def set_pos(self, new_pos: int) -> None:
+        self._pos = new_pos
+
+    contig = property(get_contig, set_contig)
+    pos = property(get_pos, set_pos)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that builds the keyword arguments for the ith test variant
+def variant_kwargs(contig: Any, i: int) -> Dict[str,Any]:
+    return {"contig": contig, "pos": 1000000 + i, "ref": "A", "name": f"rs{i}",
+            "alt": "G", "filt": ".", "qual": ".",
+            "info": {"BETA": (0.1,), "SE": (0.02,), "Z": (5.0,), "P": (5.7e-7,), "LOGP": (6.24,)}}
+
+# define a function that measures the traced memory per object allocated by
+# calling make() n times. the shared kwargs are built beforehand so that only
+# the record objects themselves are counted
+def memory_per_object(make: Callable[[Dict[str,Any]],Any], kwargs: List[Dict[str,Any]]) -> float:
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    objs = [make(kw) for kw in kwargs]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del objs
+    return (after - before) / len(kwargs)
+
+# define a function that returns the mean time in microseconds of calling f
+def time_us(f: Callable[[],Any], number: int) -> float:
+    return min(timeit.repeat(f, number=number, repeat=5)) / number * 1e6
+
+
+# define a function that runs the benchmark and returns rows of
+# (measurement, legacy value, slotted value)
+def run(n: int) -> List[Tuple[str,float,float]]:
+    legacy_contig = LegacyContig("chr1", 249250621, "GRCh37")
+    contig = Contig("chr1", 249250621, "GRCh37")
+    target = Contig("chr1", 248956422, "GRCh38")
+    kwargs_legacy = [variant_kwargs(legacy_contig, i) for i in range(n)]
+    kwargs_new = [variant_kwargs(contig, i) for i in range(n)]
+    lv = LegacyVariant(**kwargs_legacy[0])
+    nv = Variant(**kwargs_new[0])
+
+    # copy the way liftover_variant did before and after the change
+    def legacy_copy() -> Any:
+        c = deepcopy(lv)
+        c.set_contig(target)
+        c.set_pos(1)
+        return c
+
+    def new_copy() -> Any:
+        return nv.replace(contig=target, pos=1)
+
+    number = max(1, n // 10)
+    return [
+        ("bytes per variant", memory_per_object(lambda kw: LegacyVariant(**kw), kwargs_legacy),
+                              memory_per_object(lambda kw: Variant(**kw), kwargs_new)),
+        ("construct (us)", time_us(lambda: LegacyVariant(**kwargs_legacy[0]), number),
+                           time_us(lambda: Variant(**kwargs_new[0]), number)),
+        ("copy for liftover (us)", time_us(legacy_copy, number), time_us(new_copy, number)),
+        ("pickled bytes (1k variants)", len(pickle.dumps([LegacyVariant(**kw) for kw in kwargs_legacy[:1000]])) / 1.0,
+                                        len(pickle.dumps([Variant(**kw) for kw in kwargs_new[:1000]])) / 1.0),
+        ("pickle round trip (us)",
+            time_us(lambda: pickle.loads(pickle.dumps(lv)), number),
+            time_us(lambda: pickle.loads(pickle.dumps(nv)), number)),
+    ]
+
+
+# define main() execution routine for module entrypoint
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sumstatstools.benchmark.records",
+                                     description="benchmark slotted Variant/Contig records")
+    parser.add_argument("-n", type=int, default=100000, help="number of variants to allocate")
+    args = parser.parse_args()
+
+    print(f"{'measurement':<30}{'legacy':>14}{'slotted':>14}{'ratio':>10}")
+    for name, legacy, new in run(args.n):
+        print(f"{name:<30}{legacy:>14.2f}{new:>14.2f}{legacy / new:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
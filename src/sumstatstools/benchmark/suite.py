@@ -0,0 +1,294 @@
+# File Name: suite.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: benchmark suite for the sumstats -> VCF and liftover paths. for
+#  each input size a synthetic dataset is generated and every stage is timed
+#  on its own (file reading, decoding and tokenizing, variant building, the
+#  stats functions, vcf writing and liftover, both per record and per batch)
+#  and then end to end through the command line tools. rows/sec and peak RSS
+#  are reported and the results are saved as JSON, so that runs of different
+#  versions can be compared with --compare.
+#  run with: python -m sumstatstools.benchmark.suite --sizes 10000,1000000
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+from multiprocessing import get_context
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+import numpy as np
+import sumstatstools.core.io as io
+from sumstatstools.core.batch import batch_from_lines
+from sumstatstools.core.chain import load_chain_index
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.liftover import liftover_batch, liftover_variant
+from sumstatstools.core.plan import ColumnPlan
+from sumstatstools.core.stats import compute_zscore, compute_pvalue, compute_logpvalue
+from sumstatstools.core.stats import derive_stat_columns, missing_column, to_float_column
+from sumstatstools.core.variant import variant_from_tokens
+from sumstatstools.core.vcf import write_vcf_record, write_vcf_batch
+from .synthetic import SUMSTATS_HEADER, Dataset, make_dataset
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+Result = Dict[str, Any]
+
+class Case(NamedTuple):
+    name: str
+    per_record: bool  # limited to --record-rows rows per size
+    prepare: Callable[[io.BinLines], Any]  # untimed, builds the input of work
+    work: Callable[[Any], None]  # timed
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+SIZES = (10000, 100000, 1000000)  # default sizes; up to 50M rows are supported
+CHUNK_ROWS = 5000
+RECORD_ROWS = 1000000  # default cap on rows run through the per-record functions
+CORE_IND = [0, 1, 2, 4, 3]  # chrom, pos, id, other_allele, eff_allele
+STAT_IND = [5, 6, '.', '.', '.']  # beta, beta_se, zscore, pval, logp
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that converts a ru_maxrss value to megabytes (linux
+# reports kilobytes, macos bytes)
+def maxrss_mb(maxrss: int) -> float:
+    return maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxrss / 1024.0
+
+# define a function that returns the peak resident set size of this process
+def peak_rss_mb() -> float:
+    return maxrss_mb(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+
+# define a function that builds one result record
+def result(rows: int, stage: str, mode: str, rows_processed: int, seconds: float, rss: float) -> Result:
+    return {"rows": rows, "stage": stage, "mode": mode, "rows_processed": rows_processed,
+            "seconds": round(seconds, 6),
+            "rows_per_sec": round(rows_processed / seconds, 1) if seconds > 0 else None,
+            "peak_rss_mb": round(rss, 1)}
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that builds the shared state of the function benchmarks
+# for a dataset: the source and target contigs and the chain index
+def make_context(ds: Dataset) -> Dict[str, Any]:
+    def contigs(path: str, build: str) -> Dict[str,Contig]:
+        with open(path) as fobj:
+            return {c: Contig(c, int(s), build) for c, s in (l.split() for l in fobj)}
+    return {"contigs": contigs(ds.chrom_sizes, "GRCh37"),
+            "target_contigs": contigs(ds.target_chrom_sizes, "TARGET"),
+            "chain": load_chain_index(ds.chain)}
+
+
+# define a function that returns the function benchmark cases. each case
+# prepares its input from a chunk of raw lines outside the timer, so that
+# only the function under test is timed
+def make_cases(ctx: Dict[str, Any]) -> List[Case]:
+    contigs, target, chain = ctx["contigs"], ctx["target_contigs"], ctx["chain"]
+    plan = ColumnPlan(CORE_IND, STAT_IND, contigs, 'ucsc', len(SUMSTATS_HEADER), '\t')
+    devnull = open(os.devnull, 'w')
+
+    def tokens(lines: io.BinLines) -> List[io.Tokens]:
+        return [io.dec_utf8_and_tokenize(l) for l in lines]
+
+    def variants(lines: io.BinLines) -> List[Any]:
+        return [variant_from_tokens(t, CORE_IND, STAT_IND, contigs, 'ucsc') for t in tokens(lines)]
+
+    def effects(lines: io.BinLines) -> List[Tuple[Any,Any]]:
+        return [((float(t[5]),), (float(t[6]),)) for t in tokens(lines)]
+
+    def scalar_stats(effs: List[Tuple[Any,Any]]) -> None:
+        for eff in effs:
+            compute_logpvalue(compute_pvalue(compute_zscore(eff)))
+
+    def stat_columns(lines: io.BinLines) -> Tuple[np.ndarray,...]:
+        toks = tokens(lines)
+        n = len(toks)
+        return (to_float_column([t[5] for t in toks]), to_float_column([t[6] for t in toks]),
+                missing_column(n), missing_column(n), missing_column(n))
+
+    def batch(lines: io.BinLines) -> Any:
+        return batch_from_lines(lines, CORE_IND, STAT_IND, contigs, 'ucsc')
+
+    return [
+        Case("generate_file_reader", False, lambda lines: None, lambda _: None),
+        Case("dec_utf8_and_tokenize", True, lambda lines: lines, tokens),
+        Case("split_chunk", False, lambda lines: lines,
+             lambda lines: io.split_chunk(lines, len(SUMSTATS_HEADER), '\t')),
+        Case("variant_from_tokens", True, tokens,
+             lambda toks: [variant_from_tokens(t, CORE_IND, STAT_IND, contigs, 'ucsc') for t in toks]),
+        Case("ColumnPlan.variant", True, tokens, lambda toks: [plan.variant(t) for t in toks]),
+        Case("stats (compute_zscore/pvalue/logpvalue)", True, effects, scalar_stats),
+        Case("write_vcf_record", True, variants, lambda vs: [write_vcf_record(devnull, v) for v in vs]),
+        Case("liftover_variant", True, variants, lambda vs: [liftover_variant(v, chain, target) for v in vs]),
+        Case("batch_from_lines", False, lambda lines: lines, batch),
+        Case("ColumnPlan.batch_from_lines", False, lambda lines: lines, plan.batch_from_lines),
+        Case("stats (derive_stat_columns)", False, stat_columns, lambda cols: derive_stat_columns(*cols)),
+        Case("write_vcf_batch", False, batch, lambda b: write_vcf_batch(devnull, b)),
+        Case("liftover_batch", False, batch, lambda b: liftover_batch(b, chain, target)),
+    ]
+
+
+# define a function that streams the sumstats file of a dataset through one
+# case in chunks, returning the rows processed and the seconds spent. the
+# generate_file_reader case times the reads themselves
+def time_case(ds: Dataset, case: Case, record_rows: int) -> Tuple[int, float]:
+    limit = record_rows if case.per_record else ds.rows
+    with open(ds.sumstats, 'rb') as fobj:
+        fobj.readline()
+        reader_f = io.generate_file_reader(fobj, CHUNK_ROWS)
+        rows = 0
+        seconds = 0.0
+        while rows < limit:
+            start = time.perf_counter()
+            lines = reader_f()
+            if case.name == "generate_file_reader": seconds += time.perf_counter() - start
+            if lines == (): break
+            lines = lines[:limit - rows]
+            items = case.prepare(lines)
+            start = time.perf_counter()
+            case.work(items)
+            seconds += time.perf_counter() - start
+            rows += len(lines)
+    return rows, seconds
+
+
+# define a function that runs one case in a forked child process, so that
+# its peak RSS is measured on its own, and sends back the measurements
+def run_case_isolated(ds: Dataset, ctx: Dict[str, Any], index: int, record_rows: int) -> Tuple[int, float, float]:
+    def child(conn) -> None:
+        rows, seconds = time_case(ds, make_cases(ctx)[index], record_rows)
+        conn.send((rows, seconds, peak_rss_mb()))
+        conn.close()
+
+    mp = get_context('fork')
+    parent_conn, child_conn = mp.Pipe(duplex=False)
+    proc = mp.Process(target=child, args=(child_conn,))
+    proc.start()
+    measured = parent_conn.recv()
+    proc.join()
+    return measured
+
+
+# define a function that runs a command line tool in a subprocess and returns
+# the wall time and the peak RSS of its main process
+def run_tool(module: str, argv: List[str]) -> Tuple[float, float]:
+    code = f"import sys; sys.argv[0] = '{module}'; from scripts.{module} import main; main()"
+    start = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, '-c', code] + argv, stdout=subprocess.DEVNULL)
+    _, status, usage = os.wait4(proc.pid, 0)
+    seconds = time.perf_counter() - start
+    proc.returncode = os.waitstatus_to_exitcode(status) if hasattr(os, 'waitstatus_to_exitcode') else status
+    if proc.returncode != 0:
+        raise RuntimeError(f"{module} {' '.join(argv)} exited with status {proc.returncode}")
+    return seconds, maxrss_mb(usage.ru_maxrss)
+
+
+# define a function that runs the end to end benchmarks for a dataset:
+# sumstatsToVCF on the synthetic file, then liftoverVCF on its output
+def run_end_to_end(ds: Dataset, workdir: str, workers: List[str]) -> List[Result]:
+    vcf = os.path.join(workdir, f"synthetic.{ds.rows}.vcf")
+    lifted = os.path.join(workdir, f"synthetic.{ds.rows}.lifted.vcf")
+    unmapped = os.path.join(workdir, f"synthetic.{ds.rows}.unmapped.vcf")
+    out = []
+    seconds, rss = run_tool("sumstatsToVCF", ["-o", vcf, "--chr-convert", "ucsc"] + workers
+                            + [ds.metadata, ds.chrom_sizes, ds.sumstats])
+    out.append(result(ds.rows, "sumstatsToVCF", "end to end", ds.rows, seconds, rss))
+    seconds, rss = run_tool("liftoverVCF", ["-o", lifted, "-u", unmapped, "-g", "TARGET"] + workers
+                            + [vcf, ds.chain, ds.target_chrom_sizes])
+    out.append(result(ds.rows, "liftoverVCF", "end to end", ds.rows, seconds, rss))
+    for path in (vcf, lifted, unmapped):
+        os.remove(path)
+    return out
+
+
+# define a function that runs the whole suite and returns the report
+def run_suite(sizes: List[int], workdir: str, record_rows: int, workers: List[str],
+              end_to_end: bool = True) -> Dict[str, Any]:
+    results: List[Result] = []
+    for n in sizes:
+        ds = make_dataset(workdir, n)
+        ctx = make_context(ds)
+        for i, case in enumerate(make_cases(ctx)):
+            rows, seconds, rss = run_case_isolated(ds, ctx, i, record_rows)
+            results.append(result(n, case.name, "per record" if case.per_record else "per batch",
+                                  rows, seconds, rss))
+            print(format_result(results[-1]), flush=True)
+        if end_to_end:
+            for r in run_end_to_end(ds, workdir, workers):
+                results.append(r)
+                print(format_result(r), flush=True)
+    return {"created": datetime.now().isoformat(timespec='seconds'),
+            "python": platform.python_version(), "numpy": np.__version__,
+            "platform": platform.platform(), "cpu_count": os.cpu_count(),
+            "chunk_rows": CHUNK_ROWS, "record_rows": record_rows, "results": results}
+
+
+# define a function that formats one result for the console
+def format_result(r: Result) -> str:
+    rate = f"{r['rows_per_sec']:>14,.0f}" if r['rows_per_sec'] is not None else f"{'-':>14}"
+    return (f"{r['rows']:>10} {r['stage']:<42}{r['mode']:<12}{r['rows_processed']:>10} "
+            f"{r['seconds']:>10.3f}s {rate} rows/s {r['peak_rss_mb']:>9.1f} MB")
+
+
+# define a function that compares a report against a baseline report and
+# formats the rows/sec ratio of every stage measured in both
+def format_comparison(report: Dict[str, Any], baseline: Dict[str, Any]) -> str:
+    base = {(r["rows"], r["stage"]): r for r in baseline["results"]}
+    lines = [f"{'rows':>10} {'stage':<42}{'baseline':>14}{'current':>14}{'ratio':>8}"]
+    for r in report["results"]:
+        b = base.get((r["rows"], r["stage"]))
+        if b is None or not b["rows_per_sec"] or not r["rows_per_sec"]: continue
+        lines.append(f"{r['rows']:>10} {r['stage']:<42}{b['rows_per_sec']:>14,.0f}"
+                     f"{r['rows_per_sec']:>14,.0f}{r['rows_per_sec'] / b['rows_per_sec']:>8.2f}")
+    return '\n'.join(lines)
+
+
+# define main() execution routine for module entrypoint
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sumstatstools.benchmark.suite",
+                                     description="benchmark the sumstatsToVCF and liftoverVCF paths")
+    parser.add_argument("--sizes", type=str, default=','.join(map(str, SIZES)),
+                        help="comma separated numbers of rows, e.g. 10000,1000000,50000000")
+    parser.add_argument("--workdir", type=str, default="bench_data",
+                        help="directory for the synthetic inputs (reused between runs)")
+    parser.add_argument("--record-rows", type=int, default=RECORD_ROWS,
+                        help="maximum rows run through each per-record function")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="worker processes for the end to end runs")
+    parser.add_argument("--no-end-to-end", action='store_true', help="only time the functions")
+    parser.add_argument("-o", "--output", type=str, default="benchmark.json", help="JSON report path")
+    parser.add_argument("--compare", type=str, default=None, help="baseline JSON report to compare with")
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',') if s != '']
+    workers = ["--workers", str(args.workers)] if args.workers is not None else []
+    report = run_suite(sizes, args.workdir, args.record_rows, workers, not args.no_end_to_end)
+    with open(args.output, 'w') as fobj:
+        json.dump(report, fobj, indent=2)
+    print(f"results written to {args.output}")
+
+    if args.compare is not None:
+        with open(args.compare) as fobj:
+            print(format_comparison(report, json.load(fobj)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+# File Name: synthetic.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: generates synthetic benchmark inputs: a GWAS summary stats file in
+#  the layout of test/test.sumstats.txt, a metadata .json following the
+#  sumstatsToVCF schema, the GRCh37 chrom.sizes, and a UCSC chain file with
+#  the matching target chrom.sizes for liftover. rows are spread over the
+#  autosomes and X in proportion to their length, in position order, and are
+#  written in blocks so that files of tens of millions of rows can be made.
+#  run with: python -m sumstatstools.benchmark.synthetic -n N -o DIR
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import argparse
+import json
+import os
+import numpy as np
+from typing import Dict, NamedTuple
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class Dataset(NamedTuple):
+    rows: int
+    sumstats: str
+    metadata: str
+    chrom_sizes: str
+    chain: str
+    target_chrom_sizes: str
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+GRCH37_SIZES = {
+    "1": 249250621, "2": 243199373, "3": 198022430, "4": 191154276,
+    "5": 180915260, "6": 171115067, "7": 159138663, "8": 146364022,
+    "9": 141213431, "10": 135534747, "11": 135006516, "12": 133851895,
+    "13": 115169878, "14": 107349540, "15": 102531392, "16": 90354753,
+    "17": 81195210, "18": 78077248, "19": 59128983, "20": 63025520,
+    "21": 48129895, "22": 51304566, "X": 155270560}
+
+SUMSTATS_HEADER = ("chromosome", "position", "rsids", "effect_allele",
+                   "other_allele", "beta", "standard_error")
+
+METADATA = {
+    "study" : {
+        "doi" : "https://fakedoi.org/10.34.1/natgen/23123",
+        "genome_build" : "GRCh37",
+        "phenotype" : "Synthetic Benchmark Trait"
+    },
+    "columns" : {
+        "chrom" : "chromosome",
+        "pos" : "position",
+        "id" : "rsids",
+        "eff_allele" : "effect_allele",
+        "other_allele" : "other_allele",
+        "beta": "beta",
+        "beta_se" : "standard_error",
+        "zscore" : None,
+        "pval" : None,
+        "logp" : None
+    }
+}
+
+ALLELES = np.array(["A", "C", "G", "T"])
+BLOCK_ROWS = 1000000  # rows generated and written at a time
+CHAIN_BLOCK = 10000000  # size of each ungapped block of the synthetic chain
+CHAIN_GAP = (1000, 500)  # source and target gap between chain blocks
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the number of rows to place on each
+# chromosome, proportional to its length and summing to n
+def rows_per_chrom(n: int) -> Dict[str,int]:
+    sizes = np.array(list(GRCH37_SIZES.values()), dtype=np.float64)
+    counts = np.floor(sizes / sizes.sum() * n).astype(np.int64)
+    counts[:n - counts.sum()] += 1
+    return dict(zip(GRCH37_SIZES.keys(), counts.tolist()))
+
+
+# define a function that writes n synthetic summary stats rows to path. the
+# positions on each chromosome are jittered around an even spacing so they
+# are sorted and unique, alleles are distinct, and the effect sizes and
+# standard errors are drawn so that a small share of rows are significant
+def write_sumstats(path: str, n: int, seed: int = 0) -> None:
+    rng = np.random.default_rng(seed)
+    rsid = 1
+    with open(path, 'w') as fobj:
+        fobj.write('\t'.join(SUMSTATS_HEADER) + '\n')
+        for chrom, count in rows_per_chrom(n).items():
+            if count == 0: continue
+            size = GRCH37_SIZES[chrom]
+            step = (size - 20000) / count
+            pos = 10000 + np.floor((np.arange(count) + rng.uniform(0.0, 1.0, count)) * step).astype(np.int64)
+            for start in range(0, count, BLOCK_ROWS):
+                m = min(BLOCK_ROWS, count - start)
+                a1 = rng.integers(0, 4, m)
+                a2 = (a1 + rng.integers(1, 4, m)) % 4
+                se = rng.uniform(0.01, 0.1, m)
+                beta = rng.normal(0.0, 1.0, m) * se + rng.normal(0.0, 0.002, m)
+                cols = (np.full(m, chrom), pos[start:start + m].astype(str),
+                        np.char.add("rs", np.arange(rsid, rsid + m).astype(str)),
+                        ALLELES[a1], ALLELES[a2],
+                        np.char.mod("%.7f", beta), np.char.mod("%.7f", se))
+                fobj.write('\n'.join(map('\t'.join, zip(*(c.tolist() for c in cols)))) + '\n')
+                rsid += m
+
+
+# define a function that writes the metadata .json for a synthetic file
+def write_metadata(path: str) -> None:
+    with open(path, 'w') as fobj:
+        json.dump(METADATA, fobj, indent=4)
+
+
+# define a function that writes ucsc style chrom.sizes for the source build
+def write_chrom_sizes(path: str) -> None:
+    with open(path, 'w') as fobj:
+        fobj.write(''.join(f"chr{c}\t{s}\n" for c, s in GRCH37_SIZES.items()))
+
+
+# define a function that writes a synthetic chain file from the ucsc named
+# source contigs to a target build and the target chrom.sizes. each contig
+# maps onto itself in blocks of CHAIN_BLOCK bases, with the gaps between
+# blocks shifting the target coordinates. chrX maps to the minus strand so
+# that strand flips are exercised
+def write_chain(path: str, target_sizes_path: str) -> None:
+    chains = []
+    targets = []
+    for i, (chrom, size) in enumerate(GRCH37_SIZES.items()):
+        blocks = []
+        t = q = 0
+        while t + CHAIN_BLOCK + CHAIN_GAP[0] < size:
+            blocks.append(f"{CHAIN_BLOCK}\t{CHAIN_GAP[0]}\t{CHAIN_GAP[1]}")
+            t += CHAIN_BLOCK + CHAIN_GAP[0]
+            q += CHAIN_BLOCK + CHAIN_GAP[1]
+        last = size - t
+        blocks.append(str(last))
+        qsize = q + last
+        strand = '-' if chrom == 'X' else '+'
+        chains.append(f"chain {size} chr{chrom} {size} + 0 {size} chr{chrom} {qsize} {strand} 0 {qsize} {i + 1}\n"
+                      + '\n'.join(blocks) + '\n\n')
+        targets.append(f"chr{chrom}\t{qsize}\n")
+    with open(path, 'w') as fobj:
+        fobj.write(''.join(chains))
+    with open(target_sizes_path, 'w') as fobj:
+        fobj.write(''.join(targets))
+
+
+# define a function that writes (or reuses) the complete synthetic dataset
+# for n rows under directory and returns the paths
+def make_dataset(directory: str, n: int, seed: int = 0) -> Dataset:
+    os.makedirs(directory, exist_ok=True)
+    ds = Dataset(rows=n,
+                 sumstats=os.path.join(directory, f"synthetic.{n}.sumstats.txt"),
+                 metadata=os.path.join(directory, "synthetic.metadata.json"),
+                 chrom_sizes=os.path.join(directory, "synthetic.hg19.chrom.sizes"),
+                 chain=os.path.join(directory, "synthetic.hg19ToTarget.chain"),
+                 target_chrom_sizes=os.path.join(directory, "synthetic.target.chrom.sizes"))
+    if not os.path.exists(ds.sumstats): write_sumstats(ds.sumstats, n, seed)
+    if not os.path.exists(ds.metadata): write_metadata(ds.metadata)
+    if not os.path.exists(ds.chrom_sizes): write_chrom_sizes(ds.chrom_sizes)
+    if not os.path.exists(ds.chain): write_chain(ds.chain, ds.target_chrom_sizes)
+    return ds
+
+
+# define main() execution routine for module entrypoint
+# -----------------------------------------------------------------------------
+
+def main() -> None:
+    parser = argparse.ArgumentParser(prog="sumstatstools.benchmark.synthetic",
+                                     description="generate synthetic summary stats benchmark inputs")
+    parser.add_argument("-n", type=int, default=100000, help="number of summary stats rows")
+    parser.add_argument("-o", "--output-dir", type=str, default="bench_data", help="output directory")
+    parser.add_argument("--seed", type=int, default=0, help="random seed")
+    args = parser.parse_args()
+    print(make_dataset(args.output_dir, args.n, args.seed))
+
+
+if __name__ == "__main__":
+    main()
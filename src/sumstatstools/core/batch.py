@@ -0,0 +1,289 @@
+# File Name: batch.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines the VariantBatch object, a struct-of-arrays container
+#  holding a chunk of variants as parallel columns (contig codes, positions,
+#  interned alleles and float64 stat columns) rather than one Variant object
+#  per record. Variant objects are only built on demand as views of a row.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from sys import intern, getsizeof
+from typing import Callable, Dict, Iterator, List, Sequence, Tuple, Union
+from .contig import Contig
+from .custom_types import BinLines
+from .instrument import stage_timer
+from .io import dec_utf8_and_tokenize
+from .stats import StatColumns, STAT_KEYS, missing_column
+from .variant import Variant, TokensBatch, Indices, ConvertChoices
+from .variant import extract_stat_columns, info_from_stat_columns, LazyInfo
+from .variant import make_ucsc_chrom, make_simple_chrom
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+IntArray = np.ndarray
+StrArray = np.ndarray
+BoolArray = np.ndarray
+ContigsT = Tuple[Contig,...]
+BatchKey = Union[int, slice, Sequence[int], IntArray, BoolArray]
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+MISSING = intern('.')
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that builds an object array of strings from a sequence,
+# interning each string so that repeated values (alleles, filters) share
+# a single object in memory
+def interned_column(values: Sequence[str]) -> StrArray:
+    col = np.empty(len(values), dtype=object)
+    col[:] = [intern(v) for v in values]
+    return col
+
+# define a function that builds an object array of strings without interning,
+# used for columns like rsids where nearly every value is unique
+def string_column(values: Sequence[str]) -> StrArray:
+    col = np.empty(len(values), dtype=object)
+    col[:] = list(values)
+    return col
+
+# define a function that builds an object array repeating the missing token
+def missing_string_column(n: int) -> StrArray:
+    col = np.empty(n, dtype=object)
+    col[:] = MISSING
+    return col
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+class VariantBatch:
+    # define initial configuration. contigs is the table the contig codes
+    # index into; every other column must have the same length
+    def __init__(self, contigs: ContigsT, contig_codes: IntArray, pos: IntArray,
+                 names: StrArray, refs: StrArray, alts: StrArray, stats: StatColumns,
+                 filts: Union[StrArray,None] = None, quals: Union[StrArray,None] = None,
+                 infos: Union[StrArray,None] = None) -> None:
+        n = len(pos)
+        self._contigs = tuple(contigs)
+        self._contig_codes = np.asarray(contig_codes, dtype=np.int32)
+        self._pos = np.asarray(pos, dtype=np.int64)
+        self._names = names
+        self._refs = refs
+        self._alts = alts
+        self._stats = {k: np.asarray(stats[k], dtype=np.float64) if k in stats else missing_column(n)
+                       for k in STAT_KEYS}
+        self._filts = filts if filts is not None else missing_string_column(n)
+        self._quals = quals if quals is not None else missing_string_column(n)
+        self._infos = infos
+
+
+    # define getters
+    def get_contigs(self) -> ContigsT:
+        return self._contigs
+
+    def get_contig_codes(self) -> IntArray:
+        return self._contig_codes
+
+    def get_pos(self) -> IntArray:
+        return self._pos
+
+    def get_names(self) -> StrArray:
+        return self._names
+
+    def get_refs(self) -> StrArray:
+        return self._refs
+
+    def get_alts(self) -> StrArray:
+        return self._alts
+
+    def get_stats(self) -> StatColumns:
+        return self._stats
+
+    def get_filts(self) -> StrArray:
+        return self._filts
+
+    def get_quals(self) -> StrArray:
+        return self._quals
+
+    # raw INFO text of records read from a vcf, or None for batches whose
+    # INFO is built from the stat columns
+    def get_infos(self) -> Union[StrArray,None]:
+        return self._infos
+
+
+    # define container protocol methods. integer indexing returns a Variant
+    # view of a single row, any other key returns a new VariantBatch
+    def __len__(self) -> int:
+        return len(self._pos)
+
+    def __getitem__(self, key: BatchKey) -> Union[Variant, 'VariantBatch']:
+        if isinstance(key, (int, np.integer)):
+            return self.variant_at(int(key))
+        return self.take(key)
+
+    def __iter__(self) -> Iterator[Variant]:
+        for i in range(len(self)):
+            yield self.variant_at(i)
+
+    # define a representation of the batch on print readouts
+    def __repr__(self) -> str:
+        return f"VariantBatch(n={len(self)}, contigs={len(self._contigs)})"
+
+
+    # define a function that builds a lightweight Variant view of one row
+    def variant_at(self, i: int) -> Variant:
+        return Variant(
+            contig = self._contigs[self._contig_codes[i]],
+            pos = int(self._pos[i]),
+            name = self._names[i],
+            ref = self._refs[i],
+            alt = self._alts[i],
+            filt = self._filts[i],
+            qual = self._quals[i],
+            info = (LazyInfo(self._infos[i]) if self._infos is not None
+                    else info_from_stat_columns(self._stats, i))
+        )
+
+    # define a function that selects rows by index array, slice or boolean mask
+    def take(self, key: BatchKey) -> 'VariantBatch':
+        return VariantBatch(
+            contigs = self._contigs,
+            contig_codes = self._contig_codes[key],
+            pos = self._pos[key],
+            names = self._names[key],
+            refs = self._refs[key],
+            alts = self._alts[key],
+            stats = {k: v[key] for k,v in self._stats.items()},
+            filts = self._filts[key],
+            quals = self._quals[key],
+            infos = self._infos[key] if self._infos is not None else None
+        )
+
+    # define a function that keeps only the rows where mask is True
+    def filter(self, mask: BoolArray) -> 'VariantBatch':
+        return self.take(np.asarray(mask, dtype=bool))
+
+    # define a function that returns the row order sorting the batch by
+    # contig code (i.e. contig table order) and then by position
+    def argsort(self) -> IntArray:
+        return np.lexsort((self._pos, self._contig_codes))
+
+    # define a function that returns a coordinate sorted copy of the batch
+    def sort(self) -> 'VariantBatch':
+        return self.take(self.argsort())
+
+    # define a function that returns the approximate memory used by the batch
+    # in bytes, counting the arrays and the unique string objects they hold
+    def nbytes(self) -> int:
+        strcols = [self._names, self._refs, self._alts, self._filts, self._quals]
+        strcols += [self._infos] if self._infos is not None else []
+        cols = (self._contig_codes, self._pos, *strcols, *self._stats.values())
+        strs = {id(s): s for c in strcols for s in c}
+        return sum(c.nbytes for c in cols) + sum(getsizeof(s) for s in strs.values())
+
+
+    # define property objects to enforce getters
+    contigs = property(get_contigs)
+    contig_codes = property(get_contig_codes)
+    pos = property(get_pos)
+    names = property(get_names)
+    refs = property(get_refs)
+    alts = property(get_alts)
+    stats = property(get_stats)
+    filts = property(get_filts)
+    quals = property(get_quals)
+    infos = property(get_infos)
+
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns an empty batch over the given contig table
+def empty_batch(contigs: ContigsT) -> VariantBatch:
+    empty = np.empty(0, dtype=object)
+    return VariantBatch(contigs, np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int64),
+                        empty, empty, empty, {})
+
+# define a function that concatenates batches sharing the same contig table
+def concat_batches(batches: Sequence[VariantBatch]) -> VariantBatch:
+    if len(batches) == 1: return batches[0]
+    contigs = batches[0].contigs
+    return VariantBatch(
+        contigs = contigs,
+        contig_codes = np.concatenate([b.contig_codes for b in batches]),
+        pos = np.concatenate([b.pos for b in batches]),
+        names = np.concatenate([b.names for b in batches]),
+        refs = np.concatenate([b.refs for b in batches]),
+        alts = np.concatenate([b.alts for b in batches]),
+        stats = {k: np.concatenate([b.stats[k] for b in batches]) for k in STAT_KEYS},
+        filts = np.concatenate([b.filts for b in batches]),
+        quals = np.concatenate([b.quals for b in batches]),
+        infos = (np.concatenate([b.infos for b in batches])
+                 if all(b.infos is not None for b in batches) else None)
+    )
+
+# define a function that returns a lookup table from contig id to its code in
+# the contig table, optionally keyed by the converted chromosome name
+def contig_codes_dict(contigs: ContigsT) -> Dict[str,int]:
+    return {c.get_id() : i for i,c in enumerate(contigs)}
+
+
+# define function to generate a variant batch from a batch of token rows.
+# this is the batch-level counterpart of variant.variant_from_tokens
+def batch_from_tokens(tokens_batch: TokensBatch, core_ind: Indices, stat_ind: Indices,
+                      contigs_dict: Dict[str, Contig], contig_convert: ConvertChoices) -> VariantBatch:
+    contigs = tuple(contigs_dict.values())
+    codes = contig_codes_dict(contigs)
+    n = len(tokens_batch)
+
+    # pick the chromosome renaming function once for the whole batch
+    if contig_convert == 'ucsc': convert = make_ucsc_chrom
+    elif contig_convert == 'simple': convert = make_simple_chrom
+    else:
+        convert = str
+
+    # gather the core columns, substituting '.' for any column not in the file
+    def column(i: Union[int,str]) -> List[str]:
+        return [t[i] for t in tokens_batch] if i != '.' else [MISSING] * n
+
+    with stage_timer("build"):
+        chrom_col, pos_col, name_col, ref_col, alt_col = (column(i) for i in core_ind)
+        converted = {c: codes[convert(c)] for c in set(chrom_col)}
+        contig_codes = np.array([converted[c] for c in chrom_col], dtype=np.int32)
+        pos = np.array(pos_col, dtype=np.int64)
+        names, refs, alts = string_column(name_col), interned_column(ref_col), interned_column(alt_col)
+    with stage_timer("stats"):
+        stats = extract_stat_columns(tokens_batch, stat_ind)
+
+    return VariantBatch(
+        contigs = contigs,
+        contig_codes = contig_codes,
+        pos = pos,
+        names = names,
+        refs = refs,
+        alts = alts,
+        stats = stats
+    )
+
+
+# define a function to convert a batch of binary sumstats lines straight to a
+# VariantBatch. intended to run inside pool workers so that only the columnar
+# batch is sent back to the main process
+def batch_from_lines(binary_lines: BinLines, core_ind: Indices, stat_ind: Indices,
+                     contigs_dict: Dict[str, Contig], contig_convert: ConvertChoices,
+                     dec_and_tokenize: Callable[[bytes],Tuple[str,...]] = dec_utf8_and_tokenize) -> VariantBatch:
+    with stage_timer("decode"):
+        tokens_batch = tuple(map(dec_and_tokenize, binary_lines))
+    return batch_from_tokens(tokens_batch, core_ind, stat_ind, contigs_dict, contig_convert)
@@ -0,0 +1,342 @@
+# File Name: cache.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a binary columnar cache of parsed summary stats. the first
+#  conversion of a file writes each parsed column to a raw binary file next to
+#  a json manifest holding the metadata, header and the size, mtime and a
+#  sampled hash of the source. later runs on the same file memory-map the
+#  columns and build their batches straight from the mapped arrays, skipping
+#  reading and tokenizing. chromosome names are cached as written in the file
+#  so that runs with another --chr-convert or chrom.sizes can share an entry.
+#  entries can be evicted across a cache directory by total size and by age.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import hashlib
+import json
+import os
+import shutil
+import time
+import numpy as np
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Sequence, Tuple, Union
+from .batch import VariantBatch, interned_column, string_column
+from .chunking import RangeText
+from .custom_types import BinLines
+from .instrument import stage_timer
+from .plan import ColumnPlan
+from .stats import STAT_KEYS
+from .vcf import format_vcf_batch
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+# the columns of a parsed chunk as bytes to append to each cache file, plus
+# the chunk's table of chromosome names that its 'chrom' codes index into
+EncodedBatch = Dict[str, Any]
+CachedText = Tuple[str, int, EncodedBatch]  # vcf text, records, encoded batch
+RowRange = Tuple[int, int]  # first and one past the last row of a chunk
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+CACHE_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+HASH_SAMPLE_BYTES = 1024 * 1024  # bytes hashed from each end of the source
+NUMERIC_COLUMNS: Dict[str, Any] = {"chrom": np.int32, "pos": np.int64,
+                                   **{f"stat.{k}": np.float64 for k in STAT_KEYS}}
+STRING_COLUMNS = ("name", "ref", "alt")  # newline separated utf-8, with row offsets
+
+# the plan and cache entry used by parse_lines_to_cached and
+# parse_cached_range in this process, set in the parent and by the pool
+# initializer in each worker
+_SHARED: Dict[str, Any] = {}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that fingerprints a source file by its size, mtime and a
+# hash of its first and last HASH_SAMPLE_BYTES. hashing the whole file would
+# cost as much as parsing it, and size plus mtime catch ordinary rewrites
+def source_fingerprint(path: str) -> Dict[str, Any]:
+    stat = os.stat(path)
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as fobj:
+        digest.update(fobj.read(HASH_SAMPLE_BYTES))
+        if stat.st_size > HASH_SAMPLE_BYTES:
+            fobj.seek(max(HASH_SAMPLE_BYTES, stat.st_size - HASH_SAMPLE_BYTES))
+            digest.update(fobj.read())
+    return {"path": os.path.abspath(path), "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns, "hash": digest.hexdigest()}
+
+# define a function that returns the key of the cache entry for a source
+# fingerprint parsed with a column mapping and delimiter
+def cache_key(fingerprint: Dict[str, Any], columns: Dict[str, Any], delim: Optional[str]) -> str:
+    ident = json.dumps({"source": fingerprint, "columns": columns, "delimiter": delim,
+                        "version": CACHE_VERSION}, sort_keys=True)
+    return hashlib.blake2b(ident.encode('utf-8'), digest_size=16).hexdigest()
+
+# define a function that encodes a column of strings as newline terminated
+# utf-8; no field can contain a newline
+def encode_strings(values: Sequence[str]) -> bytes:
+    return ('\n'.join(values) + '\n').encode('utf-8') if len(values) > 0 else b''
+
+# define a function that returns the offset of each row in a block of
+# newline terminated strings, shifted by base
+def string_offsets(block: bytes, base: int) -> np.ndarray:
+    ends = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10) + 1
+    return base + np.concatenate(([0], ends[:-1])).astype(np.int64)
+
+# define a function that returns the size in bytes of a directory tree
+def tree_bytes(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, f)) for root, _, files in os.walk(path) for f in files)
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the CacheWriter object, which appends the encoded chunks of a parse
+# to the column files of a new entry. the entry is built in a hidden
+# directory and renamed into place by close(), so readers never see a
+# partial entry
+class CacheWriter:
+    def __init__(self, cache_dir: str, key: str, manifest: Dict[str, Any]) -> None:
+        self._path = os.path.join(cache_dir, key)
+        self._tmp = os.path.join(cache_dir, f".{key}.{os.getpid()}.tmp")
+        self._manifest = dict(manifest)
+        os.makedirs(self._tmp, exist_ok=True)
+        names = list(NUMERIC_COLUMNS) + list(STRING_COLUMNS) + [f"{s}.off" for s in STRING_COLUMNS]
+        self._files: Dict[str, BinaryIO] = {n: open(os.path.join(self._tmp, f"{n}.bin"), 'wb') for n in names}
+        self._string_bytes = {s: 0 for s in STRING_COLUMNS}
+        self._chroms: Dict[str, int] = {}
+        self._rows = 0
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    # define a function that appends an encoded chunk to the column files,
+    # renumbering its chromosome codes into the entry's table of names
+    def append(self, encoded: EncodedBatch) -> None:
+        remap = np.array([self._chroms.setdefault(c, len(self._chroms)) for c in encoded["chroms"]],
+                         dtype=np.int32)
+        self._files["chrom"].write(remap[encoded["chrom"]].tobytes() if len(remap) else b'')
+        for name in NUMERIC_COLUMNS:
+            if name != "chrom": self._files[name].write(encoded[name].tobytes())
+        for name in STRING_COLUMNS:
+            block = encoded[name]
+            self._files[f"{name}.off"].write(string_offsets(block, self._string_bytes[name]).tobytes()
+                                             if block else b'')
+            self._files[name].write(block)
+            self._string_bytes[name] += len(block)
+        self._rows += len(encoded["pos"])
+
+    # define a function that finishes the entry, writing its manifest and
+    # moving it into place. an entry written meanwhile by another run wins
+    def close(self) -> None:
+        for fobj in self._files.values(): fobj.close()
+        self._manifest.update(version=CACHE_VERSION, rows=self._rows, chroms=list(self._chroms),
+                              string_bytes=self._string_bytes, created=time.time())
+        with open(os.path.join(self._tmp, MANIFEST_NAME), 'w') as jobj:
+            json.dump(self._manifest, jobj, indent=2)
+        try:
+            os.rename(self._tmp, self._path)
+        except OSError:
+            shutil.rmtree(self._tmp, ignore_errors=True)
+
+    # define a function that discards a partly written entry
+    def abort(self) -> None:
+        for fobj in self._files.values(): fobj.close()
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    rows = property(get_rows)
+
+
+# define the ColumnCache object, which memory-maps the columns of a cache
+# entry. numeric columns are sliced without copying; string columns are
+# decoded with one decode per chunk and column
+class ColumnCache:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as jobj:
+            self._manifest = json.load(jobj)
+        rows = self._manifest["rows"]
+        self._columns = {name: self.map_column(name, dtype, rows) for name, dtype in NUMERIC_COLUMNS.items()}
+        self._strings = {name: self.map_column(name, np.uint8, self._manifest["string_bytes"][name])
+                         for name in STRING_COLUMNS}
+        self._offsets = {name: self.map_column(f"{name}.off", np.int64, rows) for name in STRING_COLUMNS}
+        self._code_maps: Dict[int, np.ndarray] = {}
+
+    # define a function that memory-maps one column file of the entry
+    def map_column(self, name: str, dtype: Any, length: int) -> np.ndarray:
+        if length == 0: return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self._path, f"{name}.bin"), dtype=dtype, mode='r', shape=(length,))
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_manifest(self) -> Dict[str, Any]:
+        return self._manifest
+
+    def get_rows(self) -> int:
+        return self._manifest["rows"]
+
+    # define a representation of the cache on print readouts
+    def __repr__(self) -> str:
+        return f"ColumnCache({self._path}, {self.get_rows()} rows)"
+
+
+    # define a function that returns the strings of rows start to end of a
+    # string column
+    def strings(self, name: str, start: int, end: int) -> List[str]:
+        if end <= start: return []
+        offsets = self._offsets[name]
+        stop = int(offsets[end]) if end < len(offsets) else len(self._strings[name])
+        return bytes(self._strings[name][int(offsets[start]):stop]).decode('utf-8')[:-1].split('\n')
+
+    # define a function that builds the VariantBatch of rows start to end
+    # with the contigs of a plan, mapping the cached chromosome names onto the
+    # plan's contigs once per plan, and finishes it with the plan (its row
+    # filter and harmonizer)
+    def batch(self, start: int, end: int, plan: ColumnPlan) -> VariantBatch:
+        if id(plan) not in self._code_maps:
+            self._code_maps[id(plan)] = plan.contig_codes(self._manifest["chroms"])
+        return plan.finish_batch(VariantBatch(
+            contigs = plan.contigs,
+            contig_codes = self._code_maps[id(plan)][self._columns["chrom"][start:end]],
+            pos = self._columns["pos"][start:end],
+            names = string_column(self.strings("name", start, end)),
+            refs = interned_column(self.strings("ref", start, end)),
+            alts = interned_column(self.strings("alt", start, end)),
+            stats = {k: self._columns[f"stat.{k}"][start:end] for k in STAT_KEYS}
+        ))
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    manifest = property(get_manifest)
+    rows = property(get_rows)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that encodes a parsed batch for the cache, with the
+# chromosome names as written in the file
+def encode_batch(batch: VariantBatch, chroms: Sequence[str]) -> EncodedBatch:
+    table: Dict[str, int] = {}
+    codes = np.array([table.setdefault(c, len(table)) for c in chroms], dtype=np.int32)
+    encoded: EncodedBatch = {"chroms": list(table), "chrom": codes,
+                             "pos": np.ascontiguousarray(batch.get_pos(), dtype=np.int64),
+                             "name": encode_strings(batch.get_names()),
+                             "ref": encode_strings(batch.get_refs()),
+                             "alt": encode_strings(batch.get_alts())}
+    for k in STAT_KEYS:
+        encoded[f"stat.{k}"] = np.ascontiguousarray(batch.get_stats()[k], dtype=np.float64)
+    return encoded
+
+
+# define a function that parses a chunk of sumstats lines to vcf text with
+# the shared plan like chunking.parse_lines_to_text, also returning the chunk
+# encoded for the cache. the cache holds every row as parsed, so the plan's
+# row filter and harmonizer are only applied to the text
+def parse_lines_to_cached(binary_lines: BinLines,
+                          format_batch: Callable[[VariantBatch],str] = format_vcf_batch) -> CachedText:
+    plan = _SHARED["plan"]
+    n, column = plan.columns_from_lines(binary_lines)
+    batch = plan.batch_from_columns(n, column, finished=False)
+    kept = plan.finish_batch(batch)
+    with stage_timer("format"):
+        text = format_batch(kept)
+    with stage_timer("encode"):
+        encoded = encode_batch(batch, plan.chrom_column(n, column))
+    return (text, len(kept), encoded)
+
+
+# define a function that appends the encoded chunk of a parsed result to a
+# cache writer and then hands the result on to write
+def write_cached_text(writer: CacheWriter, write: Callable[[Any], None], result: Tuple[Any,...]) -> None:
+    writer.append(result[2])
+    write(result)
+
+
+# define a function that opens the cache entry of key, returning None when
+# there is none. the entry's manifest mtime is touched to mark it used
+def open_cache(cache_dir: str, key: str) -> Optional[ColumnCache]:
+    path = os.path.join(cache_dir, key)
+    manifest = os.path.join(path, MANIFEST_NAME)
+    if not os.path.exists(manifest): return None
+    cache = ColumnCache(path)
+    if cache.get_manifest().get("version") != CACHE_VERSION: return None
+    os.utime(manifest)
+    return cache
+
+
+# define a function that sets the plan used by parse_lines_to_cached and
+# parse_cached_range in this process, and opens the cache entry at path for
+# reading. it is also the pool initializer, so each worker maps the entry
+# itself rather than receiving columns
+def share_cache_state(plan: ColumnPlan, path: Optional[str] = None) -> None:
+    _SHARED["plan"] = plan
+    if path is not None: _SHARED["cache"] = ColumnCache(path)
+
+
+# define a function that builds the batch of a range of cached rows with the
+# shared plan and formats it as vcf text
+def parse_cached_range(row_range: RowRange,
+                       format_batch: Callable[[VariantBatch],str] = format_vcf_batch) -> RangeText:
+    with stage_timer("build"):
+        batch = _SHARED["cache"].batch(row_range[0], row_range[1], _SHARED["plan"])
+    with stage_timer("format"):
+        text = format_batch(batch)
+    return (text, len(batch))
+
+
+# define a function that returns an anonymous callable object producing the
+# row ranges of chunk_size rows of a cache of rows rows, with an empty tuple
+# at the end, as expected by the pipeline reader
+def generate_row_range_reader(rows: int, chunk_size: int) -> Callable[[], Union[RowRange, Tuple[()]]]:
+    ranges = iter([(s, min(s + chunk_size, rows)) for s in range(0, rows, chunk_size)])
+    return lambda: next(ranges, ())
+
+
+# define a function that lists the entries of a cache directory as (path,
+# bytes, last used time), least recently used first
+def cache_entries(cache_dir: str) -> List[Tuple[str, int, float]]:
+    if not os.path.isdir(cache_dir): return []
+    entries = []
+    for name in os.listdir(cache_dir):
+        manifest = os.path.join(cache_dir, name, MANIFEST_NAME)
+        if not name.startswith('.') and os.path.exists(manifest):
+            path = os.path.join(cache_dir, name)
+            entries.append((path, tree_bytes(path), os.path.getmtime(manifest)))
+    return sorted(entries, key=lambda e: e[2])
+
+
+# define a function that evicts cache entries unused for longer than
+# max_age_seconds, then the least recently used entries until the directory
+# holds at most max_bytes. entries in keep are never evicted. returns the
+# paths removed
+def evict_cache(cache_dir: str, max_bytes: Optional[int] = None, max_age_seconds: Optional[float] = None,
+                keep: Sequence[str] = ()) -> List[str]:
+    entries = [e for e in cache_entries(cache_dir) if e[0] not in keep]
+    total = sum(e[1] for e in cache_entries(cache_dir))
+    removed = []
+    now = time.time()
+    for path, nbytes, used in entries:
+        too_old = max_age_seconds is not None and now - used > max_age_seconds
+        too_big = max_bytes is not None and total > max_bytes
+        if too_old or too_big:
+            shutil.rmtree(path, ignore_errors=True)
+            total -= nbytes
+            removed.append(path)
+    return removed
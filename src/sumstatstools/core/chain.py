@@ -0,0 +1,285 @@
+# File Name: chain.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a sorted-array interval index over UCSC chain files. the
+#  ungapped blocks of every chain are stored per source contig as NumPy
+#  arrays sorted by source start, so a whole array of positions is lifted
+#  with a single searchsorted. the index records the strand of each block
+#  for strand flips, reports positions covered by more than one block
+#  (multi-mapping) and can be cached to a .npz file next to the chain.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import os
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+from .compress import open_input
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+IntArray = np.ndarray
+BoolArray = np.ndarray
+ContigBlocks = Dict[str, np.ndarray]
+# per row: mapped, target contig code, zero-based target start, minus strand,
+# number of blocks covering the row
+LiftedPositions = Tuple[BoolArray, IntArray, IntArray, BoolArray, IntArray]
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+CACHE_VERSION = 2  # 2: chains ranked by score rather than file order
+BLOCK_FIELDS = ("start", "end", "maxend", "target", "qstart", "minus", "rank")
+COMPLEMENT = str.maketrans("ACGTNacgtn", "TGCANtgcan")
+NUCLEOTIDES = frozenset("ACGTNacgtn")
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the reverse complement of an allele. multi-
+# allelic alts are complemented allele by allele, and symbolic or missing
+# alleles (e.g. '<DEL>', '.', '*') are returned unchanged
+def reverse_complement(allele: str) -> str:
+    return ','.join(a[::-1].translate(COMPLEMENT) if NUCLEOTIDES.issuperset(a) else a
+                    for a in allele.split(','))
+
+# define a function that reverse complements a column of alleles, working
+# over the distinct values so that each allele string is converted once
+def reverse_complement_column(alleles: np.ndarray) -> np.ndarray:
+    table = {a: reverse_complement(a) for a in set(alleles.tolist())}
+    col = np.empty(len(alleles), dtype=object)
+    col[:] = [table[a] for a in alleles.tolist()]
+    return col
+
+# define a function that returns the .npz cache path for a chain file
+def chain_cache_path(chain_path: str) -> str:
+    return f"{chain_path}.npz"
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ChainIndex object. for each source contig it holds the blocks'
+# zero-based, half-open source intervals [start, end), the running maximum of
+# end (used to find earlier blocks overlapping a position), the target
+# contig code and target start of the block, its strand and the rank of the
+# chain it came from (chains with higher scores, then chains earlier in the
+# file, win when a position maps more than once)
+class ChainIndex:
+    def __init__(self, blocks: Dict[str,ContigBlocks], target_names: Tuple[str,...],
+                 target_sizes: IntArray) -> None:
+        self._blocks = blocks
+        self._target_names = tuple(target_names)
+        self._target_sizes = np.asarray(target_sizes, dtype=np.int64)
+
+    # define getters
+    def get_source_names(self) -> Tuple[str,...]:
+        return tuple(self._blocks.keys())
+
+    def get_target_names(self) -> Tuple[str,...]:
+        return self._target_names
+
+    def get_target_sizes(self) -> IntArray:
+        return self._target_sizes
+
+    def __len__(self) -> int:
+        return sum(len(b["start"]) for b in self._blocks.values())
+
+    # define a representation of the index on print readouts
+    def __repr__(self) -> str:
+        return (f"ChainIndex({len(self._blocks)} source contigs, "
+                f"{len(self._target_names)} target contigs, {len(self)} blocks)")
+
+
+    # define a function that lifts an array of zero-based positions on the
+    # passed source contig. lengths gives the number of reference bases at
+    # each position; a row is mapped only if all of them fall in one block.
+    # minus strand rows are returned with the target start of the whole
+    # interval, i.e. the position of the last base on the forward strand
+    def lift(self, contig_id: str, pos: IntArray, lengths: IntArray) -> LiftedPositions:
+        n = len(pos)
+        pos = np.asarray(pos, dtype=np.int64)
+        stop = pos + np.asarray(lengths, dtype=np.int64)
+        b = self._blocks.get(contig_id)
+        if b is None or n == 0:
+            return (np.zeros(n, dtype=bool), np.zeros(n, dtype=np.int32), np.zeros(n, dtype=np.int64),
+                    np.zeros(n, dtype=bool), np.zeros(n, dtype=np.int32))
+
+        # the last block starting at or before each position is the only
+        # candidate unless an earlier block extends past the position
+        idx = np.searchsorted(b["start"], pos, side='right') - 1
+        j = np.maximum(idx, 0)
+        contains = (idx >= 0) & (stop <= b["end"][j])
+        best = np.where(contains, j, -1)
+        nhits = contains.astype(np.int32)
+        overlapped = (idx >= 1) & (b["maxend"][np.maximum(idx - 1, 0)] > pos)
+
+        # rows where blocks overlap are resolved by scanning back through the
+        # overlapping blocks, which is rare in practice
+        for i in np.flatnonzero(overlapped).tolist():
+            cands = [best[i]] if contains[i] else []
+            k = idx[i] - 1
+            while k >= 0 and b["maxend"][k] > pos[i]:
+                if b["start"][k] <= pos[i] and stop[i] <= b["end"][k]: cands.append(k)
+                k -= 1
+            nhits[i] = len(cands)
+            best[i] = min(cands, key=lambda c: b["rank"][c]) if cands else -1
+
+        mapped = best >= 0
+        k = np.maximum(best, 0)
+        target = b["target"][k]
+        minus = b["minus"][k] & mapped
+        qpos = b["qstart"][k] + (pos - b["start"][k])
+        qpos = np.where(minus, self._target_sizes[target] - qpos - (stop - pos), qpos)
+        return mapped, target, qpos, minus, nhits
+
+    # define a function returning the mappings of one zero-based position in
+    # the form of liftover.ChainFile, i.e. a list of (contig, pos, strand)
+    # with the primary mapping first
+    def query(self, contig_id: str, pos: int) -> List[Tuple[str,int,str]]:
+        b = self._blocks.get(contig_id)
+        if b is None: return []
+        hits = np.flatnonzero((b["start"] <= pos) & (pos < b["end"]))
+        hits = sorted(hits.tolist(), key=lambda c: b["rank"][c])
+        out = []
+        for c in hits:
+            q = int(b["qstart"][c] + pos - b["start"][c])
+            t = int(b["target"][c])
+            if b["minus"][c]:
+                out.append((self._target_names[t], int(self._target_sizes[t]) - q - 1, '-'))
+            else:
+                out.append((self._target_names[t], q, '+'))
+        return out
+
+
+    # define a function that saves the index to a .npz file. the size and
+    # modification time of the source chain are stored so that a stale cache
+    # is detected on load. the file is written under a temporary name and
+    # renamed so that concurrent readers never see a partial cache
+    def save(self, path: str, chain_path: str) -> None:
+        st = os.stat(chain_path)
+        names = list(self._blocks.keys())
+        counts = [len(self._blocks[c]["start"]) for c in names]
+        arrays = {f: (np.concatenate([self._blocks[c][f] for c in names]) if names
+                      else np.zeros(0, dtype=np.int64)) for f in BLOCK_FIELDS}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as fobj:
+            np.savez(fobj, version=np.array(CACHE_VERSION),
+                     chain_size=np.array(st.st_size), chain_mtime=np.array(st.st_mtime_ns),
+                     source_names=np.array(names, dtype=str), source_counts=np.array(counts, dtype=np.int64),
+                     target_names=np.array(self._target_names, dtype=str),
+                     target_sizes=self._target_sizes, **arrays)
+        os.replace(tmp_path, path)
+
+    # define a function that loads an index saved with save(). returns None
+    # if the cache is from an older version or the chain file has changed
+    @staticmethod
+    def load(path: str, chain_path: str) -> Optional['ChainIndex']:
+        st = os.stat(chain_path)
+        with np.load(path, allow_pickle=False) as npz:
+            if (int(npz["version"]) != CACHE_VERSION or int(npz["chain_size"]) != st.st_size
+                    or int(npz["chain_mtime"]) != st.st_mtime_ns):
+                return None
+            arrays = {f: npz[f] for f in BLOCK_FIELDS}
+            bounds = np.concatenate([[0], np.cumsum(npz["source_counts"])]).tolist()
+            blocks = {c: {f: arrays[f][bounds[i]:bounds[i+1]] for f in BLOCK_FIELDS}
+                      for i, c in enumerate(npz["source_names"].tolist())}
+            return ChainIndex(blocks, tuple(npz["target_names"].tolist()), npz["target_sizes"])
+
+    # define property objects to enforce getters
+    source_names = property(get_source_names)
+    target_names = property(get_target_names)
+    target_sizes = property(get_target_sizes)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that parses a UCSC chain file (plain or gzip compressed)
+# into a ChainIndex. each chain header is followed by lines of 'size dt dq'
+# giving an ungapped block and the gaps to the next one, ending with a line
+# holding only the size of the last block. chains are ranked by the score of
+# their header, ties broken by file order, as the file need not be sorted
+def parse_chain_file(chain_path: str) -> ChainIndex:
+    target_codes: Dict[str,int] = {}
+    target_sizes: List[int] = []
+    cols: Dict[str,Dict[str,List[int]]] = {}
+    scores: List[float] = []
+    rank = 0
+    t = q = tcode = 0
+    minus = False
+    block = None
+
+    with open_input(chain_path) as fobj:
+        for line in fobj:
+            fields = line.split()
+            if not fields: continue
+            if fields[0] == b'chain':
+                # chain score tName tSize tStrand tStart tEnd qName qSize qStrand qStart qEnd id
+                tname, qname = fields[2].decode(), fields[7].decode()
+                if qname not in target_codes:
+                    target_codes[qname] = len(target_sizes)
+                    target_sizes.append(int(fields[8]))
+                tcode = target_codes[qname]
+                minus = fields[9] == b'-'
+                t, q = int(fields[5]), int(fields[10])
+                block = cols.setdefault(tname, {f: [] for f in ("start", "end", "target", "qstart", "minus", "rank")})
+                rank = len(scores)
+                scores.append(float(fields[1]))
+                continue
+            size = int(fields[0])
+            block["start"].append(t)
+            block["end"].append(t + size)
+            block["target"].append(tcode)
+            block["qstart"].append(q)
+            block["minus"].append(minus)
+            block["rank"].append(rank)
+            if len(fields) == 3:
+                t += size + int(fields[1])
+                q += size + int(fields[2])
+
+    # the rank of each chain in file order, 0 for the highest score
+    ranks = np.empty(len(scores), dtype=np.int32)
+    ranks[np.argsort(-np.array(scores, dtype=np.float64), kind='stable')] = np.arange(len(scores))
+    blocks = {}
+    for contig, c in cols.items():
+        order = np.argsort(np.array(c["start"], dtype=np.int64), kind='stable')
+        end = np.array(c["end"], dtype=np.int64)[order]
+        blocks[contig] = {
+            "start": np.array(c["start"], dtype=np.int64)[order],
+            "end": end,
+            "maxend": np.maximum.accumulate(end),
+            "target": np.array(c["target"], dtype=np.int32)[order],
+            "qstart": np.array(c["qstart"], dtype=np.int64)[order],
+            "minus": np.array(c["minus"], dtype=bool)[order],
+            "rank": ranks[np.array(c["rank"], dtype=np.int64)][order],
+        }
+    return ChainIndex(blocks, tuple(target_codes.keys()), np.array(target_sizes, dtype=np.int64))
+
+
+# define a function that loads the ChainIndex of a chain file, reading the
+# .npz cache next to it when it is up to date and otherwise parsing the chain
+# and (if cache is set) writing the cache for the next run. a cache that
+# cannot be written, e.g. in a read-only directory, is silently skipped
+def load_chain_index(chain_path: str, cache: bool = True) -> ChainIndex:
+    cache_path = chain_cache_path(chain_path)
+    if cache and os.path.exists(cache_path):
+        try:
+            index = ChainIndex.load(cache_path, chain_path)
+        except (OSError, ValueError, KeyError):
+            index = None
+        if index is not None:
+            return index
+
+    index = parse_chain_file(chain_path)
+    if cache:
+        try:
+            index.save(cache_path, chain_path)
+        except OSError:
+            pass
+    return index
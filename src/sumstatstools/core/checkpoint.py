@@ -0,0 +1,207 @@
+# File Name: checkpoint.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines checkpoints letting an interrupted conversion resume
+#  rather than start over. as chunks are written in input order, the input
+#  offset each chunk ends at is known when it is written; every interval the
+#  outputs are committed to disk and a sidecar json file records that input
+#  offset, the committed size of each output and the running counters. a
+#  restarted run cuts the outputs back to their committed sizes, skips the
+#  input up to the recorded offset and carries on from there. the sidecar is
+#  replaced atomically, so it always describes a consistent point.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Mapping, Optional, Sequence
+from .cache import source_fingerprint
+from .compress import commit_output
+from .pipeline import ChunkReader, lines_bytes
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+CheckpointState = Dict[str, Any]
+Counters = Dict[str, int]
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+CHECKPOINT_VERSION = 1
+CHECKPOINT_SUFFIX = ".ckpt"
+CHECKPOINT_SECONDS = 30.0  # default seconds between checkpoints
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the path of the checkpoint of an output
+def checkpoint_path(output: str) -> str:
+    return f"{output}{CHECKPOINT_SUFFIX}"
+
+# define a function that returns the settings a checkpoint must match to be
+# resumed: a fingerprint of the input and the options shaping the output,
+# i.e. every option but those passed in ignore
+def checkpoint_settings(input_path: str, options: Mapping[str, Any],
+                        ignore: Sequence[str] = ()) -> Dict[str, Any]:
+    return {"input": source_fingerprint(input_path),
+            "options": {k: v for k, v in sorted(options.items()) if k not in ignore}}
+
+# define a function that writes a checkpoint atomically, through a
+# temporary file synced to disk and renamed over the old checkpoint
+def write_checkpoint(path: str, state: CheckpointState) -> None:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as jobj:
+        json.dump(state, jobj, indent=2)
+        jobj.flush()
+        os.fsync(jobj.fileno())
+    os.replace(tmp, path)
+
+# define a function that reads the checkpoint at path, returning None if
+# there is none. a checkpoint of another version or written with other
+# settings raises a ValueError
+def read_checkpoint(path: str, settings: Mapping[str, Any]) -> Optional[CheckpointState]:
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as jobj:
+        state = json.load(jobj)
+    if state.get("version") != CHECKPOINT_VERSION:
+        raise ValueError(f"{path} is a version {state.get('version')} checkpoint, "
+                         f"expected version {CHECKPOINT_VERSION}")
+    if state.get("settings") != json.loads(json.dumps(settings)):
+        raise ValueError(f"{path} was written for another input or other options; "
+                         f"remove it to start over")
+    return state
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the Checkpointer object, which wraps the reader and writer of a
+# pipeline to follow the input offset of each chunk, and commits the tracked
+# outputs and writes a checkpoint after the first chunk written once every
+# interval seconds. input offsets count the data bytes read after the
+# header, and a run resumed from state starts counting at its offset
+class Checkpointer:
+    def __init__(self, path: str, settings: Mapping[str, Any], interval: float = CHECKPOINT_SECONDS,
+                 state: Optional[CheckpointState] = None) -> None:
+        self._path = path
+        self._settings = dict(settings)
+        self._interval = interval
+        self._state = state
+        self._input_offset = state["input_offset"] if state is not None else 0
+        self._chunks = state["chunks"] if state is not None else 0
+        self._rows = state["rows"] if state is not None else 0
+        self._counters: Counters = dict(state["counters"]) if state is not None else {}
+        self._counters_f: Optional[Callable[[], Counters]] = None
+        self._outputs: Dict[str, Any] = {}
+        self._read = self._input_offset
+        self._ends: Deque[int] = deque()
+        self._commits = 0
+        self._last = time.perf_counter()
+        self._lock = threading.Lock()
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_resumed(self) -> bool:
+        return self._state is not None
+
+    def get_input_offset(self) -> int:
+        return self._input_offset
+
+    def get_chunks(self) -> int:
+        return self._chunks
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_counters(self) -> Counters:
+        return dict(self._counters)
+
+    def get_commits(self) -> int:
+        return self._commits
+
+    # define a function that returns the committed offset of a tracked output
+    # in the checkpoint resumed from, or None for a fresh run
+    def resume_offset(self, name: str) -> Optional[int]:
+        return self._state["outputs"][name] if self._state is not None else None
+
+    # define a representation of the checkpointer on print readouts
+    def __repr__(self) -> str:
+        return (f"Checkpointer({self._path}, input_offset={self._input_offset}, "
+                f"chunks={self._chunks}, rows={self._rows})")
+
+
+    # define a function that adds an output, opened with open_output or
+    # open_text_output, to the outputs committed at each checkpoint
+    def track(self, name: str, fobj: Any) -> None:
+        self._outputs[name] = fobj
+
+    # define a function that sets a function returning the running counters
+    # of the caller, saved with each checkpoint
+    def count_with(self, counters_f: Callable[[], Counters]) -> None:
+        self._counters_f = counters_f
+
+    # define a function that wraps a chunk reader of binary lines, noting
+    # the input offset each chunk ends at
+    def reader(self, read_f: ChunkReader) -> ChunkReader:
+        def read_chunk() -> Any:
+            chunk = read_f()
+            if chunk != ():
+                self._read += lines_bytes(chunk)
+                self._ends.append(self._read)
+            return chunk
+        return read_chunk
+
+    # define a function that wraps the writer of parsed chunks, advancing the
+    # input offset past each chunk written and committing once the interval
+    # has passed
+    def writer(self, write: Callable[[Any], None],
+               result_rows: Callable[[Any], int] = len) -> Callable[[Any], None]:
+        def write_chunk(result: Any) -> None:
+            write(result)
+            self._input_offset = self._ends.popleft()
+            self._chunks += 1
+            self._rows += result_rows(result)
+            if time.perf_counter() - self._last >= self._interval:
+                self.commit()
+        return write_chunk
+
+    # define a function that commits the tracked outputs to disk and writes
+    # a checkpoint of the point reached
+    def commit(self) -> None:
+        with self._lock:
+            if self._counters_f is not None:
+                self._counters = dict(self._counters_f())
+            state = {"version": CHECKPOINT_VERSION, "settings": self._settings,
+                     "input_offset": self._input_offset,
+                     "outputs": {name: commit_output(fobj) for name, fobj in self._outputs.items()},
+                     "chunks": self._chunks, "rows": self._rows, "counters": self._counters,
+                     "saved": time.time()}
+            write_checkpoint(self._path, state)
+            self._commits += 1
+            self._last = time.perf_counter()
+
+    # define a function that removes the checkpoint once the run is complete
+    def finish(self) -> None:
+        if os.path.exists(self._path):
+            os.remove(self._path)
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    resumed = property(get_resumed)
+    input_offset = property(get_input_offset)
+    chunks = property(get_chunks)
+    rows = property(get_rows)
+    counters = property(get_counters)
+    commits = property(get_commits)
@@ -0,0 +1,132 @@
+# File Name: chunking.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines byte-range chunked parsing of sumstats files. the input is
+#  split into newline-aligned byte ranges and each worker memory-maps the file
+#  and parses its own range straight to VCF text, so raw lines never cross a
+#  process boundary; only the formatted output is sent back to be written in
+#  range order.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import mmap
+import os
+from typing import Any, Callable, List, NamedTuple, TextIO, Tuple, Union
+from .batch import VariantBatch
+from .custom_types import BinLines
+from .instrument import stage_timer
+from .vcf import format_vcf_batch
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class ByteRange(NamedTuple):
+    start: int
+    end: int
+
+MaybeByteRange = Union[ByteRange, Tuple[()]]
+ByteRangeReader = Callable[[], MaybeByteRange]
+RangeText = Tuple[str, int]  # formatted vcf text and the number of records
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+RANGE_BYTES = 32 * 1024 * 1024  # default size of the byte range a worker parses
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the offset of the first byte after the next
+# newline at or after offset, or the file size if there is none
+def align_to_newline(fobj, offset: int, size: int) -> int:
+    if offset >= size: return size
+    fobj.seek(offset)
+    fobj.readline()
+    return min(fobj.tell(), size)
+
+# define a function that splits lines in a block of bytes into chunks of at
+# most chunk_size lines
+def split_lines(block: bytes, chunk_size: int) -> Tuple[BinLines,...]:
+    lines = block.splitlines()
+    return tuple(tuple(lines[i:i+chunk_size]) for i in range(0, len(lines), chunk_size))
+
+# define a function that returns the number of records in a parsed range
+def range_rows(result: RangeText) -> int:
+    return result[1]
+
+# define a function that returns the number of bytes in a byte range
+def range_size(byte_range: ByteRange) -> int:
+    return byte_range.end - byte_range.start
+
+# define a function that writes the text of a parsed range to a vcf file object
+def write_range_text(vcfobj: TextIO, result: RangeText) -> None:
+    vcfobj.write(result[0])
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns an anonymous callable object producing the
+# newline-aligned byte ranges of a file one at a time, starting at the passed
+# offset (e.g. just after the header). an empty tuple marks the end of the file
+def generate_range_reader(path: str, start: int, range_bytes: int = RANGE_BYTES) -> ByteRangeReader:
+    size = os.path.getsize(path)
+    fobj = open(path, 'rb')
+    offset = [start]
+
+    def next_range() -> MaybeByteRange:
+        begin = offset[0]
+        if begin >= size:
+            fobj.close()
+            return ()
+        end = align_to_newline(fobj, begin + range_bytes - 1, size)
+        offset[0] = end
+        return ByteRange(begin, end)
+
+    return next_range
+
+
+# define a function that parses a chunk of lines into VCF text inside a
+# worker, so that only the formatted text is sent back to be written. lines
+# are parsed by parse_lines (e.g. a partial of batch.batch_from_lines) and
+# formatted by format_batch (e.g. a partial of vcf.format_vcf_batch)
+def parse_lines_to_text(binary_lines: BinLines,
+                        parse_lines: Callable[[BinLines],VariantBatch],
+                        format_batch: Callable[[VariantBatch],str] = format_vcf_batch) -> RangeText:
+    batch = parse_lines(binary_lines)
+    with stage_timer("format"):
+        text = format_batch(batch)
+    return (text, len(batch))
+
+
+# define a function that parses one byte range of a file into VCF text. the
+# file is memory-mapped so the worker only touches the pages in its own range.
+# lines are parsed in chunks of chunk_size records by parse_lines and
+# formatted by format_batch, as in parse_lines_to_text, and the formatted
+# chunks are joined by join (e.g. parquet.concat_arrow_tables for tables)
+def parse_byte_range(byte_range: ByteRange, path: str,
+                     parse_lines: Callable[[BinLines],VariantBatch],
+                     chunk_size: int = 5000,
+                     format_batch: Callable[[VariantBatch],Any] = format_vcf_batch,
+                     join: Callable[[List[Any]],Any] = ''.join) -> RangeText:
+    if byte_range.end <= byte_range.start: return (join([]), 0)
+    with stage_timer("range read"):
+        with open(path, 'rb') as fobj:
+            with mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                block = mm[byte_range.start:byte_range.end]
+
+    texts = []
+    rows = 0
+    for lines in split_lines(block, chunk_size):
+        lines = tuple(l for l in lines if l.strip())
+        if lines == (): continue
+        batch = parse_lines(lines)
+        with stage_timer("format"):
+            texts.append(format_batch(batch))
+        rows += len(batch)
+    return (join(texts), rows)
@@ -0,0 +1,340 @@
+# File Name: compress.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines transparent compressed input and BGZF (block gzip)
+#  output. gzip input is detected from its magic bytes; BGZF input is
+#  inflated block-parallel on a thread pool. BGZF output is compressed
+#  block-parallel and can build a tabix/csi index while it is written.
+#  outputs can be committed to disk at a point they are later taken up from,
+#  so an interrupted run can resume writing them.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import gzip
+import io
+import os
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Deque, List, Optional, Union
+from .tabix import TabixIndexer
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+GZIP_MAGIC = b'\x1f\x8b'
+BGZF_BLOCK_SIZE = 0xff00  # uncompressed bytes per block, as used by htslib
+BGZF_HEADER = struct.Struct('<4BI2BH2B2H')  # fixed 18 byte bgzf block header
+BGZF_EOF = bytes.fromhex("1f8b08040000000000ff0600424302001b0003000000000000000000")
+COMPRESSED_SUFFIXES = ('.gz', '.bgz', '.bgzf')
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns true if the leading bytes of a file are the
+# gzip magic number
+def is_gzip_bytes(head: bytes) -> bool:
+    return head[:2] == GZIP_MAGIC
+
+# define a function that returns true if the leading bytes of a file are a
+# bgzf block header, i.e. a gzip member with the 'BC' extra subfield
+def is_bgzf_bytes(head: bytes) -> bool:
+    return (len(head) >= 18 and is_gzip_bytes(head) and head[3] & 4 == 4
+            and head[12:14] == b'BC')
+
+# define a function that reads the leading bytes of a file without moving
+# its position
+def peek_head(fobj: BinaryIO, n: int = 18) -> bytes:
+    if hasattr(fobj, 'peek'):
+        return fobj.peek(n)[:n]
+    pos = fobj.tell()
+    head = fobj.read(n)
+    fobj.seek(pos)
+    return head
+
+# define a function that compresses one block of data to a complete bgzf block
+def compress_block(data: bytes, level: int = 6) -> bytes:
+    comp = zlib.compressobj(level, zlib.DEFLATED, -15)
+    cdata = comp.compress(data) + comp.flush()
+    header = BGZF_HEADER.pack(31, 139, 8, 4, 0, 0, 255, 6, 66, 67, 2, len(cdata) + 25)
+    return header + cdata + struct.pack('<2I', zlib.crc32(data), len(data))
+
+# define a function that writes a bytes object to a new bgzf file
+def write_bgzf_bytes(path: str, data: bytes, level: int = 6) -> None:
+    with open(path, 'wb') as fobj:
+        for i in range(0, len(data), BGZF_BLOCK_SIZE):
+            fobj.write(compress_block(data[i:i + BGZF_BLOCK_SIZE], level))
+        fobj.write(BGZF_EOF)
+
+# define a function that inflates the deflate payload of one bgzf block
+def inflate_block(block: bytes) -> bytes:
+    xlen = struct.unpack_from('<H', block, 10)[0]
+    return zlib.decompress(block[12 + xlen:-8], -15)
+
+# define a function that reads the next complete bgzf block from a file,
+# returning an empty bytes object at the end of the file
+def read_bgzf_block(fobj: BinaryIO) -> bytes:
+    head = fobj.read(12)
+    if len(head) < 12: return b''
+    xlen = struct.unpack_from('<H', head, 10)[0]
+    extra = fobj.read(xlen)
+    bsize = None
+    i = 0
+    while i < xlen:
+        si1, si2, slen = extra[i], extra[i+1], struct.unpack_from('<H', extra, i+2)[0]
+        if si1 == 66 and si2 == 67: bsize = struct.unpack_from('<H', extra, i+4)[0]
+        i += 4 + slen
+    if bsize is None:
+        raise ValueError("input is gzip but not bgzf: missing BC extra field")
+    return head + extra + fobj.read(bsize + 1 - 12 - xlen)
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the BgzfRawReader object, a raw binary stream over a bgzf file that
+# inflates upcoming blocks on a thread pool. zlib releases the GIL while
+# inflating, so blocks decompress in parallel while earlier ones are consumed
+class BgzfRawReader(io.RawIOBase):
+    def __init__(self, fobj: BinaryIO, threads: int = 4) -> None:
+        self._fobj = fobj
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+        self._pending: Deque[Future] = deque()
+        self._lookahead = 4 * threads
+        self._buf = b''
+        self._pos = 0
+        self._eof = False
+
+    # keep the queue of in-flight block inflations full
+    def _fill(self) -> None:
+        while not self._eof and len(self._pending) < self._lookahead:
+            block = read_bgzf_block(self._fobj)
+            if block == b'':
+                self._eof = True
+            else:
+                self._pending.append(self._pool.submit(inflate_block, block))
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        while self._pos >= len(self._buf):
+            self._fill()
+            if not self._pending: return 0
+            self._buf = self._pending.popleft().result()
+            self._pos = 0
+        n = min(len(b), len(self._buf) - self._pos)
+        b[:n] = self._buf[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def close(self) -> None:
+        if not self.closed:
+            self._pool.shutdown(wait=False)
+            self._fobj.close()
+        super().close()
+
+
+# define the BgzfWriter object, a text file object writing bgzf blocks. full
+# blocks are compressed on a thread pool and written in order; when an index
+# type is given, a TabixIndexer records every record written and the index
+# is saved next to the output on close. every write must hold whole lines.
+# with resume_at, a file committed at that compressed offset is written on
+# from there
+class BgzfWriter:
+    def __init__(self, path: str, threads: int = 4, level: int = 6,
+                 index: Optional[str] = None, resume_at: Optional[int] = None) -> None:
+        self._path = path
+        self._fobj = open(path, 'wb' if resume_at is None else 'r+b')
+        self._pool = ThreadPoolExecutor(max_workers=max(1, threads))
+        self._threads = max(1, threads)
+        self._level = level
+        self._pending: Deque[Future] = deque()
+        self._buf = bytearray()
+        self._block_ustarts: List[int] = []
+        self._block_offsets: List[int] = [0]
+        self._uoffset = 0
+        self._submitted = 0
+        self._indexer = TabixIndexer(index) if index is not None else None
+        self.closed = False
+        if resume_at is not None:
+            self.replay(resume_at)
+
+    # define a function that writes text to the file, handing every full
+    # block of data to the compression pool
+    def write(self, text: str) -> int:
+        data = text.encode('utf-8')
+        if self._indexer is not None:
+            self._indexer.add_bytes(data, self._uoffset)
+        self._uoffset += len(data)
+        self._buf += data
+        if len(self._buf) >= BGZF_BLOCK_SIZE:
+            nfull = len(self._buf) // BGZF_BLOCK_SIZE * BGZF_BLOCK_SIZE
+            for i in range(0, nfull, BGZF_BLOCK_SIZE):
+                self._submit(bytes(self._buf[i:i + BGZF_BLOCK_SIZE]))
+            del self._buf[:nfull]
+        return len(text)
+
+    # submit one block for compression, draining finished blocks in order
+    # so that at most a few blocks per thread are held in memory
+    def _submit(self, data: bytes) -> None:
+        self._block_ustarts.append(self._submitted)
+        self._submitted += len(data)
+        self._pending.append(self._pool.submit(compress_block, data, self._level))
+        while len(self._pending) > 4 * self._threads:
+            self._drain_one()
+
+    def _drain_one(self) -> None:
+        block = self._pending.popleft().result()
+        self._fobj.write(block)
+        self._block_offsets.append(self._block_offsets[-1] + len(block))
+
+    # define a function that takes up a file at compressed offset coffset,
+    # the end of a committed block: the blocks before it are read back to
+    # restore the block offsets and the index, and the rest is cut off
+    def replay(self, coffset: int) -> None:
+        self._fobj.seek(0)
+        carry, carry_at = b'', 0
+        while self._block_offsets[-1] < coffset:
+            block = read_bgzf_block(self._fobj)
+            if block == b'': break
+            data = inflate_block(block)
+            self._block_ustarts.append(self._submitted)
+            self._submitted += len(data)
+            self._block_offsets.append(self._block_offsets[-1] + len(block))
+            if self._indexer is not None:
+                carry += data
+                cut = carry.rfind(b'\n') + 1
+                self._indexer.add_bytes(carry[:cut], carry_at)
+                carry, carry_at = carry[cut:], carry_at + cut
+        if self._block_offsets[-1] != coffset:
+            raise ValueError(f"{self._path} has no block ending at offset {coffset}")
+        self._uoffset = self._submitted
+        self._fobj.truncate(coffset)
+        self._fobj.seek(coffset)
+
+    # define a function that returns the current uncompressed offset
+    def tell(self) -> int:
+        return self._uoffset
+
+    # define a function that flushes the pending data as a (possibly short)
+    # block so everything written so far is on disk in complete blocks
+    def flush(self) -> None:
+        if self._buf:
+            self._submit(bytes(self._buf))
+            self._buf = bytearray()
+        while self._pending:
+            self._drain_one()
+        self._fobj.flush()
+
+    # define a function that flushes the file to disk and returns its
+    # compressed size, an offset the file can be resumed from
+    def commit(self) -> int:
+        self.flush()
+        os.fsync(self._fobj.fileno())
+        return self._block_offsets[-1]
+
+    # define a function that writes the remaining data and the eof marker,
+    # then writes the index if one was requested
+    def close(self) -> None:
+        if self.closed: return
+        self.flush()
+        self._fobj.write(BGZF_EOF)
+        self._fobj.close()
+        self._pool.shutdown()
+        self.closed = True
+        if self._indexer is not None:
+            index = self._indexer.serialize(self._block_ustarts + [self._submitted],
+                                            self._block_offsets)
+            if index is not None:
+                write_bgzf_bytes(f"{self._path}.{self._indexer.kind}", index, self._level)
+
+    def __enter__(self) -> 'BgzfWriter':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that wraps an open binary file object so that gzip and
+# bgzf input is decompressed transparently. bgzf input is inflated on
+# threads when more than one is allowed; plain gzip streams are inflated
+# sequentially since a single deflate stream cannot be split
+def wrap_compressed(fobj: BinaryIO, threads: int = 1) -> BinaryIO:
+    head = peek_head(fobj)
+    if is_bgzf_bytes(head) and threads > 1:
+        return io.BufferedReader(BgzfRawReader(fobj, threads), buffer_size=BGZF_BLOCK_SIZE)
+    if is_gzip_bytes(head):
+        return gzip.GzipFile(fileobj=fobj, mode='rb')
+    return fobj
+
+# define a function that opens a file for binary reading, decompressing it
+# transparently if it is gzip or bgzf compressed
+def open_input(path: str, threads: int = 1) -> BinaryIO:
+    return wrap_compressed(open(path, 'rb'), threads)
+
+# define a function that skips the next nbytes of an input stream, seeking
+# where the stream allows it and reading through otherwise
+def skip_input(fobj: BinaryIO, nbytes: int) -> None:
+    if fobj.seekable():
+        fobj.seek(nbytes, 1)
+        return
+    while nbytes > 0:
+        skipped = len(fobj.read(min(nbytes, 1 << 20)))
+        if skipped == 0: return
+        nbytes -= skipped
+
+# define a function that opens a bgzf file for binary reading at a virtual
+# offset, i.e. the compressed offset of a block shifted left 16 bits plus an
+# offset into its inflated data, as stored in tabix indexes
+def open_bgzf_at(path: str, voffset: int, threads: int = 1) -> BinaryIO:
+    fobj = open(path, 'rb')
+    fobj.seek(voffset >> 16)
+    reader = io.BufferedReader(BgzfRawReader(fobj, max(1, threads)), buffer_size=BGZF_BLOCK_SIZE)
+    reader.read(voffset & 0xffff)
+    return reader
+
+# define a function that returns true if the file at path is compressed
+def is_compressed_file(path: str) -> bool:
+    with open(path, 'rb') as fobj:
+        return is_gzip_bytes(fobj.read(2))
+
+# define a function that opens a plain text output file for writing, or with
+# resume_at, cuts it to that many bytes and appends to it
+def open_text_output(path: str, resume_at: Optional[int] = None) -> io.TextIOWrapper:
+    if resume_at is None:
+        return open(path, 'w')
+    with open(path, 'r+b') as fobj:
+        if fobj.seek(0, 2) < resume_at:
+            raise ValueError(f"{path} is shorter than its committed size of {resume_at} bytes")
+        fobj.truncate(resume_at)
+    return open(path, 'a')
+
+# define a function that opens a vcf output file for writing text. names
+# ending in .gz/.bgz are written as bgzf with parallel block compression and
+# optionally indexed ('tbi' or 'csi') on the fly; others are plain text. with
+# resume_at, an output committed at that offset is written on from there
+def open_output(path: str, threads: int = 1, index: Optional[str] = None,
+                resume_at: Optional[int] = None) -> Union[BgzfWriter, io.TextIOWrapper]:
+    if path.endswith(COMPRESSED_SUFFIXES):
+        return BgzfWriter(path, threads=threads, index=index, resume_at=resume_at)
+    if index is not None:
+        raise ValueError(f"an index requires bgzf output, {path} does not end in .gz")
+    return open_text_output(path, resume_at)
+
+# define a function that commits an output opened with open_output to disk,
+# returning the offset it can be resumed from
+def commit_output(fobj: Union[BgzfWriter, io.TextIOWrapper]) -> int:
+    if isinstance(fobj, BgzfWriter):
+        return fobj.commit()
+    fobj.flush()
+    os.fsync(fobj.fileno())
+    return fobj.tell()
@@ -6,45 +6,86 @@
 #   an genome build 
 
 
+# library imports
+# -----------------------------------------------------------------------------
+
+from typing import Dict, Tuple
+from .compress import open_input
+
+
 # define objects 
 # -----------------------------------------------------------------------------
 
-# define the Contig object 
+# define the Contig object. contigs are immutable, hashable values keyed by
+# (id, length, genome_build) and interned, so constructing the same contig
+# twice returns the same object and every variant on a contig shares one
+# instance. the length is part of the key, as headers without an assembly
+# (or placeholders of length 0) may give one id and build different lengths
 class Contig:
+    __slots__ = ('_id', '_length', '_genome_build')
+    _interned: Dict[Tuple[str,int,str], 'Contig'] = {}
+
+    # define initial configuration requiring three core attributes to be passed.
+    # construction happens in __new__ so that interned instances are returned
+    # untouched rather than re-initialized
+    def __new__(cls, id: str, length: int, genome_build: str) -> 'Contig':
+        key = (id, length, genome_build)
+        interned = cls._interned.get(key)
+        if interned is not None:
+            return interned
 
-    # define initial configuration requiring three core attributes to be passed
-    def __init__(self,id: str, length: int, genome_build: str) -> None:
-        self._id = id
-        self._length = length
-        self._genome_build = genome_build
+        contig = object.__new__(cls)
+        contig._id = id
+        contig._length = length
+        contig._genome_build = genome_build
+        cls._interned[key] = contig
+        return contig
 
 
-    # define getters and setters
+    # define getters
     def get_id(self) -> str:
         return self._id
-    
-    def set_id(self, new_id: str) -> None:
-        self._id = new_id
 
     def get_length(self) -> int:
         return self._length
-    
-    def set_length(self, new_length: int) -> None:
-        self._length = new_length
 
     def get_genome_build(self) -> str:
         return self._genome_build
 
-    def set_genome_build(self, new_genome_build: str) -> None:
-        self._genome_build = new_genome_build
+
+    # define value semantics. equality and hashing use the (id, length, genome_build) key
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Contig): return NotImplemented
+        return ((self._id, self._length, self._genome_build)
+                == (other._id, other._length, other._genome_build))
+
+    def __hash__(self) -> int:
+        return hash((self._id, self._length, self._genome_build))
+
+    # define pickling so that unpickled contigs are re-interned in the
+    # receiving process rather than duplicated
+    def __reduce__(self) -> Tuple[type, Tuple[str,int,str]]:
+        return (Contig, (self._id, self._length, self._genome_build))
 
 
     # define representation of the contig on print readouts
     def __repr__(self) -> str:
-        return "Contig(id={self._id}, length={self._length}, genome_build={self._genome_build})"
+        return f"Contig(id={self._id}, length={self._length}, genome_build={self._genome_build})"
+
 
+    # define read-only property objects to enforce getters
+    id = property(get_id)
+    length = property(get_length)
+    genome_build = property(get_genome_build)
+
+
+# define functions
+# -----------------------------------------------------------------------------
 
-    # define property objects to enforce getters and setters
-    id = property(get_id, set_id)
-    length = property(get_length, set_length)
-    genome_build = property(get_genome_build, set_genome_build)
\ No newline at end of file
+# define a function that reads a ucsc style chrom.sizes file (plain or
+# compressed) into a dictionary of contigs keyed by id, in file order
+def read_chrom_sizes(path: str, genome_build: str) -> Dict[str,'Contig']:
+    with open_input(path) as fobj:
+        fields = (line.split() for line in fobj)
+        return {c.get_id(): c for c in (Contig(f[0].decode(), int(f[1]), genome_build)
+                                        for f in fields if f)}
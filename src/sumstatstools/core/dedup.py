@@ -0,0 +1,388 @@
+# File Name: dedup.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines the deduplication of vcf output. workers attach a packed
+#  key (contig rank, position and a hash of REF/ALT) to each record of the
+#  text they format, and the writer hands the keyed text to a Deduplicator,
+#  which writes each variant once under a policy (keep the first record,
+#  keep the one with the smallest P, or drop every duplicated variant). in
+#  input order the keys seen are kept in a compact hash index, beside a
+#  second, independent digest of REF/ALT that tells apart variants whose keys
+#  collide, and the first record is kept. when the records of a position
+#  arrive together (sorted input, or after --sort) only the current position
+#  is held, so memory does not grow with the input; its duplicates are
+#  resolved by their exact alleles under any policy, and records sharing REF
+#  can be merged into one multi-allelic line.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import hashlib
+import zlib
+import numpy as np
+from math import inf
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from .instrument import stage_timer
+from .sort import ContigOrder, text_lines
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+KeyArray = np.ndarray  # uint64 variant keys, contig rank | position | allele hash
+CheckArray = np.ndarray  # uint32 digests of REF/ALT, independent of the hash in the keys
+Variants = Tuple[KeyArray, CheckArray, np.ndarray]  # the keys, REF/ALT digests and P values of a chunk's records
+Fields = List[str]  # the tab separated fields of a vcf record
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+DEDUP_POLICIES = ('keep-first', 'keep-min-p', 'drop-all')
+ALLELE_BITS = 20  # bits of the REF/ALT hash, in the low bits of a key
+POS_BITS = 32  # positions are below 2**32, as for the sort keys
+CONTIG_BITS = 12  # contig ranks, in the high bits of a key
+MAX_DEDUP_CONTIGS = (1 << CONTIG_BITS) - 1  # contigs of a chrom.sizes file, plus one unknown rank
+VCF_COLUMNS = 8  # CHROM POS ID REF ALT QUAL FILTER INFO
+INDEX_BITS = 16  # log2 of the initial slots of a KeyIndex
+MAX_LOAD = 0.75  # fraction of KeyIndex slots filled before it doubles
+HASH_MULTIPLIER = np.uint64(0x9E3779B97F4A7C15)  # 2**64 over the golden ratio, odd
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the P value of a record from its INFO
+# text, taken from P or else from LOGP, and inf when it has neither
+def info_pvalue(info: str) -> float:
+    fields = info.split(';')
+    try:
+        p = next((float(f[2:]) for f in fields if f[:2] == 'P='), None)
+        if p is None:
+            p = next((10.0 ** -float(f[5:]) for f in fields if f[:5] == 'LOGP='), inf)
+    except ValueError:
+        return inf
+    return p if p == p else inf
+
+# define a function that returns the 32 bit digest of a REF/ALT pair that
+# confirms a key match, a blake2b digest rather than a second crc32, whose
+# collisions would follow those of the key's hash
+def allele_check(pair: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(pair, digest_size=4).digest(), 'little')
+
+# define a function that returns the variant key, REF/ALT digest and P value
+# of each record of vcf text with the 8 columns written by format_vcf_batch.
+# the text is split once into its fields rather than line by line, and the
+# REF/ALT hash of the key is crc32; both hashes are taken once per distinct
+# pair and agree across processes. P values are only read when pvalues is
+# true, and are inf otherwise
+def text_variants(text: str, order: ContigOrder, pvalues: bool = False) -> Variants:
+    cols = text[:-1].replace('\n', '\t').split('\t') if text != '' else []
+    n = len(cols) // VCF_COLUMNS
+    unknown = len(order)
+    ranks = np.array([order.get(c, unknown) for c in cols[0::VCF_COLUMNS]], dtype=np.uint64)
+    pos = np.array(cols[1::VCF_COLUMNS], dtype=np.uint64)
+    pairs = [f"{r}\t{a}" for r, a in zip(cols[3::VCF_COLUMNS], cols[4::VCF_COLUMNS])]
+    table = {pair: (zlib.crc32(b), allele_check(b)) for pair, b in
+             ((pair, pair.encode('utf-8')) for pair in set(pairs))}
+    hashes = np.array([table[pair][0] for pair in pairs], dtype=np.uint64)
+    checks = np.array([table[pair][1] for pair in pairs], dtype=np.uint32)
+    keys = ((ranks << np.uint64(POS_BITS + ALLELE_BITS)) | (pos << np.uint64(ALLELE_BITS))
+            | (hashes >> np.uint64(32 - ALLELE_BITS)))
+    pvals = np.array([info_pvalue(i) for i in cols[7::VCF_COLUMNS]] if pvalues else [inf] * n,
+                     dtype=np.float64)
+    return keys, checks, pvals
+
+# define a function that runs parse on a chunk and appends the variant keys,
+# REF/ALT digests and P values of the text in the first element of its result. this wraps
+# the parse function handed to the workers, so the keys are computed in
+# parallel
+def dedup_parse(parse: Callable[[Any],Tuple[Any,...]], order: ContigOrder, pvalues: bool,
+                chunk: Any) -> Tuple[Any,...]:
+    result = parse(chunk)
+    with stage_timer("dedup"):
+        return result + (text_variants(result[0], order, pvalues),)
+
+# define a function that merges vcf records at one position sharing REF into
+# one multi-allelic record. ALT and the INFO values are joined per allele in
+# record order, IDs are joined with ';' and QUAL/FILTER are taken from the
+# first record
+def merge_records(records: List[Fields]) -> Fields:
+    first = records[0]
+    ids = [i for i in dict.fromkeys(r[2] for r in records) if i != '.']
+    infos = [dict(f.split('=', 1) for f in r[7].split(';') if '=' in f) for r in records]
+    keys = [f.split('=', 1)[0] for f in first[7].split(';') if '=' in f]
+    info = ';'.join(f"{k}={','.join(i.get(k, '.') for i in infos)}" for k in keys) or '.'
+    return first[:2] + [';'.join(ids) or '.', first[3], ','.join(r[4] for r in records)] + first[5:7] + [info]
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the KeyIndex object, an open addressing hash set of uint64 keys in
+# one flat table probed linearly, vectorized over an array of keys at a time,
+# with the REF/ALT digest of each key's variant in a parallel table. empty
+# slots hold 0, which is never a key as positions start at 1. the tables
+# double once they are MAX_LOAD full, so each key costs 16 to 32 bytes
+class KeyIndex:
+    def __init__(self, bits: int = INDEX_BITS) -> None:
+        self._bits = bits
+        self._table = np.zeros(1 << bits, dtype=np.uint64)
+        self._checks = np.zeros(1 << bits, dtype=np.uint32)
+        self._size = 0
+
+    # define the number of keys in the index
+    def __len__(self) -> int:
+        return self._size
+
+    # define a representation of the index on print readouts
+    def __repr__(self) -> str:
+        return f"KeyIndex({self._size} keys in {len(self._table)} slots)"
+
+
+    # define a function that returns the home slot of each of an array of keys,
+    # the high bits of the key times a 64 bit odd constant
+    def slots(self, keys: KeyArray) -> np.ndarray:
+        return ((keys * HASH_MULTIPLIER) >> np.uint64(64 - self._bits)).astype(np.int64)
+
+    # define a function that returns the slot of each of an array of keys, or
+    # -1 for keys not in the index, probing all keys not yet found or ended by
+    # an empty slot
+    def find(self, keys: KeyArray) -> np.ndarray:
+        found = np.full(len(keys), -1, dtype=np.int64)
+        pending, slot = np.arange(len(keys)), self.slots(keys)
+        mask = len(self._table) - 1
+        while len(pending):
+            at = self._table[slot]
+            hit = at == keys[pending]
+            found[pending[hit]] = slot[hit]
+            probe = ~hit & (at != 0)
+            pending, slot = pending[probe], (slot[probe] + 1) & mask
+        return found
+
+    # define a function that returns the REF/ALT digests kept at slots
+    def checks(self, slots: np.ndarray) -> CheckArray:
+        return self._checks[slots]
+
+    # define a function that adds unique keys missing from the index, with
+    # the REF/ALT digests of their variants
+    def add(self, keys: KeyArray, checks: CheckArray) -> None:
+        while self._size + len(keys) > MAX_LOAD * len(self._table):
+            used = self._table != 0
+            old, old_checks = self._table[used], self._checks[used]
+            self._bits += 1
+            self._table = np.zeros(1 << self._bits, dtype=np.uint64)
+            self._checks = np.zeros(1 << self._bits, dtype=np.uint32)
+            self.insert(old, old_checks)
+        self.insert(keys, checks)
+        self._size += len(keys)
+
+    # define a function that places keys in the table. in each round the first
+    # key aimed at each empty slot takes it, and the others probe the next slot
+    def insert(self, keys: KeyArray, checks: CheckArray) -> None:
+        slot = self.slots(keys)
+        mask = len(self._table) - 1
+        while len(keys):
+            free = np.flatnonzero(self._table[slot] == 0)
+            won = free[np.unique(slot[free], return_index=True)[1]]
+            self._table[slot[won]] = keys[won]
+            self._checks[slot[won]] = checks[won]
+            rest = np.ones(len(keys), dtype=bool)
+            rest[won] = False
+            keys, checks, slot = keys[rest], checks[rest], (slot[rest] + 1) & mask
+
+
+# define the Deduplicator object, which writes keyed vcf text to write with
+# each variant (contig, position, REF, ALT) once. ungrouped, records are
+# checked against a KeyIndex of the keys written so far and the first record
+# of a variant is kept; a key match with another REF/ALT digest is a hash
+# collision rather than a duplicate, and the digests of such variants are
+# kept apart by key. grouped, the records of a position must arrive
+# together, in position order within contiguous contig blocks; the records
+# of the current position are held until the next begins and then resolved
+# under policy, merging records sharing REF into multi-allelic lines when
+# merge is true. a ValueError is raised when grouped records are out of order
+class Deduplicator:
+    def __init__(self, write: Callable[[str], Any], order: ContigOrder, policy: str = 'keep-first',
+                 merge: bool = False, grouped: bool = False) -> None:
+        if policy not in DEDUP_POLICIES:
+            raise ValueError(f"unknown dedup policy {policy}, expected one of {DEDUP_POLICIES}")
+        if not grouped and (policy != 'keep-first' or merge):
+            raise ValueError(f"{policy}{' with merging' if merge else ''} needs the records of a "
+                             f"position to arrive together")
+        self._write = write
+        self._order = order
+        self._policy = policy
+        self._merge = merge
+        self._grouped = grouped
+        self._index = KeyIndex() if not grouped else None
+        self._collided: Dict[int, Set[int]] = {}  # REF/ALT digests of keys shared by variants
+        self._pending: List[str] = []
+        self._pending_keys = np.empty(0, dtype=np.uint64)
+        self._pending_pvals = np.empty(0, dtype=np.float64)
+        self._finished: Set[int] = set()  # contig ranks whose block has ended
+        self._rows = 0
+        self._dropped = 0
+        self._merged = 0
+        self._merged_lines = 0
+        self._collisions = 0
+
+    # define getters
+    def get_policy(self) -> str:
+        return self._policy
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_dropped(self) -> int:
+        return self._dropped
+
+    def get_merged(self) -> int:
+        return self._merged
+
+    def get_merged_lines(self) -> int:
+        return self._merged_lines
+
+    def get_collisions(self) -> int:
+        return self._collisions
+
+    # define a representation of the deduplicator on print readouts
+    def __repr__(self) -> str:
+        return (f"Deduplicator({self._policy}, {self._rows} records, {self._dropped} dropped, "
+                f"{self._merged} merged)")
+
+
+    # define a function that adds a chunk of vcf text with the keys and P
+    # values of its records, reading them from the text when not given
+    def add(self, text: str, variants: Optional[Variants] = None) -> None:
+        if variants is None:
+            variants = text_variants(text, self._order, self._policy == 'keep-min-p')
+        lines = text_lines(text)
+        self._rows += len(lines)
+        if self._grouped:
+            self.add_grouped(lines, variants[0], variants[2])
+        else:
+            self.add_first(lines, variants[0], variants[1])
+
+    # define a function that writes the lines whose variants were not seen
+    # before, keeping the first of the duplicates within the chunk. a variant
+    # is seen when its key is in the index with the same REF/ALT digest, or
+    # when its digest is among those of other variants sharing the key
+    def add_first(self, lines: List[str], keys: KeyArray, checks: CheckArray) -> None:
+        order = np.lexsort((checks, keys))
+        keys, checks = keys[order], checks[order]
+        lead = np.concatenate(([True], keys[1:] != keys[:-1]))
+        new = lead | np.concatenate(([True], checks[1:] != checks[:-1]))
+        first, keys, checks, lead = order[new], keys[new], checks[new], lead[new]
+        slots = self._index.find(keys)
+        absent = slots < 0
+        keep = absent & lead
+        shared = ~keep
+        shared[~absent] = self._index.checks(slots[~absent]) != checks[~absent]
+        for i in np.flatnonzero(shared).tolist():
+            seen = self._collided.setdefault(int(keys[i]), set())
+            if int(checks[i]) not in seen:
+                seen.add(int(checks[i]))
+                keep[i] = True
+                self._collisions += 1
+        self._index.add(keys[absent & lead], checks[absent & lead])
+        keep = np.sort(first[keep]).tolist()
+        self._dropped += len(lines) - len(keep)
+        if keep:
+            self._write(''.join([lines[i] + '\n' for i in keep]))
+
+    # define a function that checks that the positions of grouped records
+    # follow on from those before, in order within contiguous contig blocks
+    def check_order(self, sites: np.ndarray) -> None:
+        ranks, pos = sites >> POS_BITS, sites & ((1 << POS_BITS) - 1)
+        same = ranks[1:] == ranks[:-1]
+        behind = np.flatnonzero(same & (pos[1:] < pos[:-1]))
+        if len(behind):
+            raise ValueError(f"records are not sorted by position (at position {int(pos[behind[0] + 1])}), the input is not sorted")
+        for i in np.flatnonzero(~same).tolist():
+            self._finished.add(int(ranks[i]))
+            if int(ranks[i + 1]) in self._finished:
+                raise ValueError("records of a contig are not contiguous, the input is not sorted")
+
+    # define a function that writes the complete positions of a chunk of
+    # grouped records, holding back the last position as it may go on in
+    # the next chunk. positions with one record are written as they are
+    def add_grouped(self, lines: List[str], keys: KeyArray, pvals: np.ndarray) -> None:
+        lines = self._pending + lines
+        keys = np.concatenate((self._pending_keys, keys))
+        pvals = np.concatenate((self._pending_pvals, pvals))
+        if len(lines) == 0: return
+        sites = (keys >> np.uint64(ALLELE_BITS)).astype(np.int64)
+        self.check_order(sites)
+        starts = np.flatnonzero(np.concatenate(([True], sites[1:] != sites[:-1])))
+        ends = np.append(starts[1:], len(lines))
+        last = int(starts[-1])
+        out: List[str] = []
+        done = 0
+        for s, e in zip(starts[:-1].tolist(), ends[:-1].tolist()):
+            if e - s == 1: continue
+            out.extend(lines[done:s])
+            out.extend(self.resolve(lines[s:e], pvals[s:e]))
+            done = e
+        out.extend(lines[done:last])
+        self._pending, self._pending_keys, self._pending_pvals = lines[last:], keys[last:], pvals[last:]
+        if out:
+            self._write(''.join([l + '\n' for l in out]))
+
+    # define a function that resolves the records of one position: records
+    # of the same variant are reduced under the policy, and the rest merged
+    # by REF when merging
+    def resolve(self, lines: List[str], pvals: np.ndarray) -> List[str]:
+        records = [l.split('\t') for l in lines]
+        variants: Dict[Tuple[str, str], List[int]] = {}
+        for i, r in enumerate(records):
+            variants.setdefault((r[3], r[4]), []).append(i)
+        kept = []
+        for rows in variants.values():
+            if len(rows) == 1:
+                kept.append(rows[0])
+                continue
+            if self._policy == 'keep-first':
+                kept.append(rows[0])
+            elif self._policy == 'keep-min-p':
+                kept.append(min(rows, key=lambda i: (pvals[i], i)))
+            self._dropped += len(rows) - (self._policy != 'drop-all')
+        records = [records[i] for i in sorted(kept)]
+        if self._merge and len(records) > 1:
+            refs: Dict[str, List[Fields]] = {}
+            for r in records:
+                refs.setdefault(r[3], []).append(r)
+            records = []
+            for group in refs.values():
+                if len(group) > 1:
+                    self._merged += len(group)
+                    self._merged_lines += 1
+                records.append(merge_records(group) if len(group) > 1 else group[0])
+        return ['\t'.join(r) for r in records]
+
+    # define a function that writes the records held back for the last
+    # position
+    def close(self) -> None:
+        if self._pending:
+            out = self.resolve(self._pending, self._pending_pvals) if len(self._pending) > 1 else self._pending
+            self._pending = []
+            self._write(''.join([l + '\n' for l in out]))
+
+    # define property objects to enforce getters
+    policy = property(get_policy)
+    rows = property(get_rows)
+    dropped = property(get_dropped)
+    merged = property(get_merged)
+    merged_lines = property(get_merged_lines)
+    collisions = property(get_collisions)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that adds the keyed text of a parsed chunk to a
+# deduplicator. the text is the first element of the result and its
+# variants the last
+def add_dedup_text(dedup: Deduplicator, result: Tuple[Any,...]) -> None:
+    dedup.add(result[0], result[-1])
@@ -0,0 +1,189 @@
+# File Name: executors.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines the execution backends behind the MapF abstraction. a
+#  MapExecutor runs map (a MapF, e.g. for io.decode_lines) and an ordered,
+#  lazy imap (for pipeline.run_pipeline) on one of: the calling thread
+#  (serial), a thread pool, or a process pool with a tuned chunksize. on
+#  free-threaded builds the thread backend runs in parallel without pickling
+#  anything, and choose_backend picks it automatically. there is no
+#  subinterpreter backend: numpy, which every parse function here uses, does
+#  not support being imported into several subinterpreters.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import concurrent.futures as cf
+import sys
+import threading
+import time
+from multiprocessing import get_context
+from queue import Queue
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple
+from .custom_types import BinLines, Container
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+BACKENDS = ('serial', 'threads', 'processes')
+BACKEND_CHOICES = ('auto',) + BACKENDS
+PROCESS_STARTUP_SECONDS = 0.05  # approximate cost of starting one worker process
+THREAD_STARTUP_SECONDS = 1e-4  # approximate cost of starting one worker thread
+IPC_SECONDS_PER_ITEM = 5e-4  # approximate ipc round trip of a chunk of a few thousand rows
+CHUNKS_PER_WORKER = 4  # map() hands each process worker about this many chunks
+_DONE = object()  # sentinel marking the end of the submitted futures
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns true when running on a free-threaded build
+# of python with the GIL disabled
+def is_free_threaded() -> bool:
+    return not getattr(sys, '_is_gil_enabled', lambda: True)()
+
+# define a function that returns the chunksize handing each of workers
+# processes about CHUNKS_PER_WORKER chunks of an n item map
+def tuned_chunksize(n: int, workers: int) -> int:
+    return max(1, -(-n // (max(1, workers) * CHUNKS_PER_WORKER)))
+
+# define a function that measures the mean seconds f takes per item on a
+# sample of items
+def measure_item_cost(f: Callable[[Any],Any], sample: Sequence[Any]) -> float:
+    if len(sample) == 0: return 0.0
+    start = time.perf_counter()
+    for item in sample: f(item)
+    return (time.perf_counter() - start) / len(sample)
+
+# define a function that estimates the work in an input of nbytes from a
+# sample of its lines: f is run once on the whole sample, and the estimated
+# number of rows in the input and the seconds f takes per row are returned
+def estimate_row_cost(f: Callable[[BinLines],Any], sample: BinLines,
+                      nbytes: int) -> Tuple[int, float]:
+    if len(sample) == 0: return 0, 0.0
+    row_seconds = measure_item_cost(f, [sample]) / len(sample)
+    return int(nbytes * len(sample) / sum(map(len, sample))), row_seconds
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that picks a backend for n items costing item_seconds
+# each on up to workers workers. work whose parallel speedup would not repay
+# starting the workers (and, for processes, shipping each item and result
+# between processes) runs serially. free-threaded builds use threads, which
+# share memory and skip pickling; other builds use processes
+def choose_backend(n: int, item_seconds: float, workers: int) -> str:
+    saved = n * item_seconds * (1.0 - 1.0 / max(1, workers))
+    if workers <= 1 or saved <= 0:
+        return 'serial'
+    if is_free_threaded():
+        return 'threads' if saved > workers * THREAD_STARTUP_SECONDS else 'serial'
+    overhead = workers * PROCESS_STARTUP_SECONDS + n * IPC_SECONDS_PER_ITEM
+    return 'processes' if saved > overhead else 'serial'
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the MapExecutor object. initializer(*initargs) is run once in each
+# worker (and once in the calling process for the serial and thread
+# backends, whose workers share its state). mp_context selects the start
+# method of the process backend, e.g. fork so that workers inherit state.
+# process workers are started here, before the pipeline starts its threads,
+# since forking a process that is running other threads is unsafe
+class MapExecutor:
+    def __init__(self, backend: str = 'serial', workers: int = 1,
+                 initializer: Optional[Callable[...,None]] = None, initargs: Tuple[Any,...] = (),
+                 mp_context: Optional[str] = None) -> None:
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown backend {backend}, expected one of {BACKENDS}")
+        self._backend = backend
+        self._workers = max(1, workers)
+        self._pool: Optional[cf.Executor] = None
+
+        if backend in ('serial', 'threads') and initializer is not None:
+            initializer(*initargs)
+        if backend == 'threads':
+            self._pool = cf.ThreadPoolExecutor(self._workers)
+        elif backend == 'processes':
+            context = get_context(mp_context) if mp_context is not None else None
+            self._pool = cf.ProcessPoolExecutor(self._workers, mp_context=context,
+                                                initializer=initializer, initargs=initargs)
+            self._pool.submit(int).result()
+
+    # define getters
+    def get_backend(self) -> str:
+        return self._backend
+
+    def get_workers(self) -> int:
+        return self._workers if self._pool is not None else 0
+
+    # define a representation of the executor on print readouts
+    def __repr__(self) -> str:
+        return f"MapExecutor(backend={self._backend}, workers={self.get_workers()})"
+
+
+    # define a function that applies f to every item and returns the results
+    # in order, i.e. a MapF. process pools hand out the items in chunks
+    def map(self, f: Callable[[Any],Any], items: Container) -> List[Any]:
+        if self._pool is None:
+            return list(map(f, items))
+        if self._backend == 'processes':
+            return list(self._pool.map(f, items, chunksize=tuned_chunksize(len(items), self._workers)))
+        return list(self._pool.map(f, items))
+
+    # define a function that lazily applies f to the items of an iterable
+    # and yields the results in order, like multiprocessing.Pool.imap. items
+    # are submitted from a feeder thread as they arrive, so this works with
+    # the bounded queue of pipeline.run_pipeline
+    def imap(self, f: Callable[[Any],Any], items: Iterable[Any]) -> Iterator[Any]:
+        if self._pool is None:
+            yield from map(f, items)
+            return
+        futures: Queue = Queue()
+        errors: List[BaseException] = []
+
+        def feed() -> None:
+            try:
+                for item in items:
+                    futures.put(self._pool.submit(f, item))
+            except BaseException as e:
+                errors.append(e)
+            finally:
+                futures.put(_DONE)
+
+        threading.Thread(target=feed, name="executor-feeder", daemon=True).start()
+        while True:
+            future = futures.get()
+            if future is _DONE: break
+            yield future.result()
+        if errors:
+            raise errors[0]
+
+    # define a function that shuts the workers down once submitted work is done
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+
+    def __enter__(self) -> 'MapExecutor':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # define property objects to enforce getters
+    backend = property(get_backend)
+    workers = property(get_workers)
+
+
+# define a function that resolves the backend of a run: workers of 0 run
+# serially, 'auto' picks the backend with choose_backend from the expected
+# number of items and the seconds each takes, and any other backend is used
+# as given
+def resolve_backend(backend: str, workers: int, n: int = 0, item_seconds: float = 0.0) -> str:
+    if workers == 0: return 'serial'
+    if backend == 'auto': return choose_backend(n, item_seconds, workers)
+    return backend
@@ -0,0 +1,286 @@
+# File Name: fasta.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a memory-mapped reference genome over an uncompressed
+#  FASTA file and its samtools .fai index, and the harmonization of summary
+#  stats alleles against it. the reference bases of a whole batch of
+#  positions are gathered with one fancy index into the mapped file, so
+#  checking REF costs a few array operations per contig rather than a lookup
+#  per record.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
+from .batch import VariantBatch
+from .chain import reverse_complement_column
+from .contig import Contig
+from .instrument import count_rows, stage_timer
+from .variant import make_simple_chrom, make_ucsc_chrom
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class FaiEntry(NamedTuple):
+    name: str
+    length: int  # bases in the sequence
+    offset: int  # byte offset of the first base
+    linebases: int  # bases per line
+    linewidth: int  # bytes per line, including the newline
+
+IntArray = np.ndarray
+ByteArray = np.ndarray
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# outcomes of harmonizing a record against the reference, in report order
+MATCHED, SWAPPED, FLIPPED, FLIP_SWAPPED, PALINDROMIC, MISMATCHED, UNCHECKED = range(7)
+OUTCOMES = ("matched", "swapped", "flipped", "flipped+swapped", "palindromic", "mismatched", "unchecked")
+
+# byte tables upper casing bases, complementing them and flagging A/C/G/T
+UPPER = np.arange(256, dtype=np.uint8)
+UPPER[ord('a'):ord('z') + 1] -= 32
+COMPLEMENT = np.arange(256, dtype=np.uint8)
+COMPLEMENT[[ord(b) for b in "ACGT"]] = [ord(b) for b in "TGCA"]
+IS_BASE = np.zeros(256, dtype=bool)
+IS_BASE[[ord(b) for b in "ACGT"]] = True
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the .fai index path of a fasta file
+def fai_path(fasta_path: str) -> str:
+    return f"{fasta_path}.fai"
+
+# define a function that reads a samtools .fai index, raising ValueError for
+# a malformed one
+def read_fai(path: str) -> List[FaiEntry]:
+    entries = []
+    with open(path, 'r') as fobj:
+        for line in fobj:
+            fields = line.rstrip('\n').split('\t')
+            if fields == ['']: continue
+            if len(fields) < 5:
+                raise ValueError(f"{path} is not a fasta index: expected 5 columns, got {len(fields)}")
+            entries.append(FaiEntry(fields[0], *map(int, fields[1:5])))
+    return entries
+
+# define a function that encodes a column of alleles as upper case bytes,
+# one per character
+def allele_bytes(alleles: List[str]) -> ByteArray:
+    return UPPER[np.frombuffer(''.join(alleles).encode('ascii', 'replace'), dtype=np.uint8)]
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ReferenceGenome object. the fasta file is mapped read-only and
+# never read up front; sequences are looked up by name through the .fai
+# entries. references pickle to the fasta path and map the file again in
+# the receiving process
+class ReferenceGenome:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        self._entries = {e.name: e for e in read_fai(fai_path(path))}
+        self._data = np.asarray(np.memmap(path, dtype=np.uint8, mode='r'))
+
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_names(self) -> Tuple[str,...]:
+        return tuple(self._entries)
+
+    def get_lengths(self) -> Dict[str,int]:
+        return {name: e.length for name, e in self._entries.items()}
+
+    # define pickling as the path of the fasta
+    def __reduce__(self) -> Tuple[type, Tuple[str]]:
+        return (ReferenceGenome, (self._path,))
+
+    # define a representation of the reference on print readouts
+    def __repr__(self) -> str:
+        return f"ReferenceGenome({self._path}, {len(self._entries)} sequences)"
+
+
+    # define a function that returns the upper case reference bases of the
+    # sequence name at the zero-based positions pos (an array of any shape),
+    # as bytes. positions off the end of the sequence read as N
+    def bases(self, name: str, pos: IntArray) -> ByteArray:
+        entry = self._entries[name]
+        inside = (pos >= 0) & (pos < entry.length)
+        p = np.where(inside, pos, 0)
+        offsets = entry.offset + (p // entry.linebases) * entry.linewidth + p % entry.linebases
+        return np.where(inside, UPPER[self._data[offsets]], ord('N')).astype(np.uint8)
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    names = property(get_names)
+    lengths = property(get_lengths)
+
+
+# define the Harmonizer object, which orients the alleles of each record to
+# the reference. names maps contig ids to the reference sequence names. REF
+# is checked against the reference; records whose ALT matches instead have
+# REF and ALT swapped and BETA and Z negated, and SNPs matching only on the
+# other strand have both alleles complemented (and are swapped too if it is
+# the complement of ALT that matches). A/T and C/G SNPs cannot be told apart
+# from their strand flip, so they are left as they are and counted as
+# palindromic. with drop set, palindromic and mismatched records are dropped
+class Harmonizer:
+    def __init__(self, reference: ReferenceGenome, names: Dict[str,str], drop: bool = False) -> None:
+        self._reference = reference
+        self._names = names
+        self._drop = drop
+
+
+    # define getters
+    def get_reference(self) -> ReferenceGenome:
+        return self._reference
+
+    def get_names(self) -> Dict[str,str]:
+        return self._names
+
+    def get_drop(self) -> bool:
+        return self._drop
+
+    # define pickling as the inputs of the harmonizer
+    def __reduce__(self) -> Tuple[type, Tuple[Any,...]]:
+        return (Harmonizer, (self._reference, self._names, self._drop))
+
+    # define a representation of the harmonizer on print readouts
+    def __repr__(self) -> str:
+        return f"Harmonizer({self._reference.path}, {len(self._names)} contigs, drop={self._drop})"
+
+
+    # define a function that returns the outcome of harmonizing each row of
+    # a batch, checking the SNPs and then the longer alleles of each contig
+    # as byte arrays over all of their rows at once
+    def outcomes(self, batch: VariantBatch) -> IntArray:
+        n = len(batch)
+        outcome = np.full(n, UNCHECKED, dtype=np.int8)
+        refs, alts = batch.get_refs().tolist(), batch.get_alts().tolist()
+        snp = ((np.fromiter(map(len, refs), dtype=np.int64, count=n) == 1)
+               & (np.fromiter(map(len, alts), dtype=np.int64, count=n) == 1))
+        codes, pos = batch.get_contig_codes(), batch.get_pos() - 1
+        for code, contig in enumerate(batch.get_contigs()):
+            name = self._names.get(contig.get_id())
+            if name is None: continue
+            on_contig = codes == code
+            rows = np.flatnonzero(on_contig & snp)
+            if rows.size:
+                outcome[rows] = snp_outcomes(self._reference.bases(name, pos[rows]),
+                                             allele_bytes([refs[i] for i in rows.tolist()]),
+                                             allele_bytes([alts[i] for i in rows.tolist()]))
+            rows = np.flatnonzero(on_contig & ~snp)
+            if rows.size:
+                outcome[rows] = allele_outcomes(self._reference, name, pos[rows],
+                                                [refs[i] for i in rows.tolist()],
+                                                [alts[i] for i in rows.tolist()])
+        return outcome
+
+    # define a function that returns the batch with its alleles oriented to
+    # the reference, counting the rows of each outcome under the harmonize
+    # stage
+    def harmonize(self, batch: VariantBatch) -> VariantBatch:
+        with stage_timer("harmonize"):
+            outcome = self.outcomes(batch)
+            counts = np.bincount(outcome, minlength=len(OUTCOMES))
+            for label, n in zip(OUTCOMES, counts.tolist()):
+                if n: count_rows("harmonize", label, n)
+            if self._drop and (counts[PALINDROMIC] or counts[MISMATCHED]):
+                keep = (outcome != PALINDROMIC) & (outcome != MISMATCHED)
+                batch, outcome = batch.filter(keep), outcome[keep]
+            return orient_batch(batch, outcome)
+
+    # define property objects to enforce getters
+    reference = property(get_reference)
+    names = property(get_names)
+    drop = property(get_drop)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the outcome of each SNP from the reference
+# base, REF and ALT as upper case bytes
+def snp_outcomes(base: ByteArray, ref: ByteArray, alt: ByteArray) -> IntArray:
+    outcome = np.full(len(base), MISMATCHED, dtype=np.int8)
+    cref, calt = COMPLEMENT[ref], COMPLEMENT[alt]
+    # checked from the least to the most preferred outcome, so each write
+    # overrides the ones before it
+    outcome[calt == base] = FLIP_SWAPPED
+    outcome[cref == base] = FLIPPED
+    outcome[alt == base] = SWAPPED
+    outcome[ref == base] = MATCHED
+    outcome[(calt == ref) & (outcome != MISMATCHED)] = PALINDROMIC
+    outcome[~(IS_BASE[base] & IS_BASE[ref] & IS_BASE[alt])] = UNCHECKED
+    return outcome
+
+# define a function that returns, for alleles starting at the zero-based
+# positions pos of the sequence name, whether each is made of A/C/G/T and
+# whether it matches the reference. the alleles of each length are compared
+# to the reference as one matrix of bytes
+def reference_matches(reference: ReferenceGenome, name: str, pos: IntArray,
+                      alleles: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    lengths = np.fromiter(map(len, alleles), dtype=np.int64, count=len(alleles))
+    valid, match = np.zeros(len(alleles), dtype=bool), np.zeros(len(alleles), dtype=bool)
+    for length in np.unique(lengths[lengths > 0]).tolist():
+        rows = np.flatnonzero(lengths == length)
+        coded = allele_bytes([alleles[i] for i in rows.tolist()]).reshape(-1, length)
+        valid[rows] = IS_BASE[coded].all(axis=1)
+        match[rows] = (reference.bases(name, pos[rows, None] + np.arange(length)) == coded).all(axis=1)
+    return valid, match
+
+# define a function that returns the outcome of each record with an allele
+# longer than a base. REF or ALT must match the reference from the record's
+# zero-based position; indels are not strand flipped, since their
+# representation differs between strands
+def allele_outcomes(reference: ReferenceGenome, name: str, pos: IntArray,
+                    refs: List[str], alts: List[str]) -> IntArray:
+    ref_valid, ref_match = reference_matches(reference, name, pos, refs)
+    alt_valid, alt_match = reference_matches(reference, name, pos, alts)
+    outcome = np.full(len(pos), MISMATCHED, dtype=np.int8)
+    outcome[alt_match] = SWAPPED
+    outcome[ref_match] = MATCHED
+    outcome[~(ref_valid & alt_valid)] = UNCHECKED
+    return outcome
+
+# define a function that swaps and complements the alleles of a batch by
+# the outcome of each row, negating BETA and Z of the swapped rows
+def orient_batch(batch: VariantBatch, outcome: IntArray) -> VariantBatch:
+    swap = (outcome == SWAPPED) | (outcome == FLIP_SWAPPED)
+    flip = (outcome == FLIPPED) | (outcome == FLIP_SWAPPED)
+    if not (swap.any() or flip.any()): return batch
+    refs, alts = batch.get_refs().copy(), batch.get_alts().copy()
+    refs[swap], alts[swap] = alts[swap], refs[swap]
+    if flip.any():
+        refs[flip] = reverse_complement_column(refs[flip])
+        alts[flip] = reverse_complement_column(alts[flip])
+    # 0.0 - x rather than -x, so that zero effects are not written as -0
+    stats = dict(batch.get_stats())
+    for k in ("BETA", "Z"):
+        stats[k] = np.where(swap, 0.0 - stats[k], stats[k])
+    return VariantBatch(batch.get_contigs(), batch.get_contig_codes(), batch.get_pos(), batch.get_names(),
+                        refs, alts, stats,
+                        batch.get_filts(), batch.get_quals(), batch.get_infos())
+
+# define a function that matches the sequence names of a reference to the
+# contig ids of contigs_dict. each name is converted with chrom_id (the
+# plan's --chr-convert lookup) and failing that tried in ucsc [chr1] and
+# simple [1] style, and the first name matching a contig is kept
+def match_reference_contigs(names: Tuple[str,...], contigs_dict: Dict[str, Contig],
+                            chrom_id: Callable[[str], str]) -> Dict[str,str]:
+    matched: Dict[str,str] = {}
+    for name in names:
+        cid = next((c for c in (chrom_id(name), make_ucsc_chrom(name), make_simple_chrom(name))
+                    if c in contigs_dict), None)
+        if cid is not None: matched.setdefault(cid, name)
+    return matched
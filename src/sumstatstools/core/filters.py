@@ -0,0 +1,167 @@
+# File Name: filters.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines row filters on parsed summary stats: genomic regions, given
+#  as chrom:start-end strings or read from a bed file, and p-value thresholds.
+#  a RowFilter is held by the ColumnPlan and applied to the contig code,
+#  position and statistic columns of each batch before its string columns
+#  are built, so rows outside the filter cost little more than their parse.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import re
+import numpy as np
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from .compress import open_input
+from .contig import Contig
+from .stats import StatColumns
+from .variant import make_simple_chrom, make_ucsc_chrom
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class Region(NamedTuple):
+    chrom: str
+    start: int  # one based, inclusive
+    end: int  # one based, inclusive
+
+Intervals = Tuple[np.ndarray, np.ndarray]  # starts and ends of sorted, disjoint regions
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+MAX_POS = 1 << 62  # end of a region given without one
+REGION_PATTERN = re.compile(r'^(?P<chrom>[^:\s]+)(?::(?P<start>[\d,]+)?(?:-(?P<end>[\d,]+))?)?$')
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that parses a region written as chrom, chrom:start or
+# chrom:start-end, with one based inclusive coordinates as in samtools
+def parse_region(text: str) -> Region:
+    match = REGION_PATTERN.match(text.strip())
+    if match is None:
+        raise ValueError(f"invalid region {text}, expected chrom[:start[-end]]")
+    start = int(match['start'].replace(',', '')) if match['start'] else 1
+    end = int(match['end'].replace(',', '')) if match['end'] else MAX_POS
+    if end < start:
+        raise ValueError(f"invalid region {text}, its end is before its start")
+    return Region(match['chrom'], max(1, start), end)
+
+# define a function that reads the regions of a bed file (plain or gzip
+# compressed), converting its zero based half-open intervals to one based
+# inclusive regions. track, browser and comment lines are skipped
+def read_bed(path: str) -> List[Region]:
+    regions = []
+    with open_input(path) as fobj:
+        for line in fobj:
+            fields = line.decode('utf-8').split()
+            if not fields or fields[0] in ('track', 'browser') or fields[0].startswith('#'): continue
+            regions.append(Region(fields[0], int(fields[1]) + 1, int(fields[2])))
+    return regions
+
+# define a function that sorts regions by chromosome and start and merges
+# overlapping and adjacent regions. chromosomes keep their first appearance
+# order
+def merge_regions(regions: Sequence[Region]) -> List[Region]:
+    merged: Dict[str, List[Region]] = {}
+    for region in sorted(regions, key=lambda r: r.start):
+        runs = merged.setdefault(region.chrom, [])
+        if runs and region.start <= runs[-1].end + 1:
+            runs[-1] = runs[-1]._replace(end=max(runs[-1].end, region.end))
+        else:
+            runs.append(region)
+    order = {chrom: i for i, chrom in reversed(list(enumerate(r.chrom for r in regions)))}
+    return [r for chrom in sorted(merged, key=order.get) for r in merged[chrom]]
+
+# define a function that renames the chromosome of each region to the id of
+# its contig, accepting ucsc [chr1] and simple [1] style names for any
+# contig. a region on an unknown contig raises KeyError, or is dropped when
+# strict is false (e.g. bed files listing contigs beyond the chrom sizes)
+def resolve_region_contigs(regions: Sequence[Region], contigs_dict: Dict[str, Contig],
+                           strict: bool = True) -> List[Region]:
+    resolved = []
+    for region in regions:
+        names = (region.chrom, make_ucsc_chrom(region.chrom), make_simple_chrom(region.chrom))
+        cid = next((n for n in names if n in contigs_dict), None)
+        if cid is None and strict: raise KeyError(region.chrom)
+        if cid is not None: resolved.append(region._replace(chrom=cid))
+    return resolved
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the RowFilter object. intervals maps contig codes (indices into a
+# plan's contig table) to the sorted, disjoint regions kept on that contig,
+# or is None to keep every position. rows must also have P <= max_pval and
+# LOGP >= min_logp when those are set; missing statistics fail both
+class RowFilter:
+    def __init__(self, intervals: Optional[Dict[int, Intervals]] = None,
+                 max_pval: Optional[float] = None, min_logp: Optional[float] = None) -> None:
+        self._intervals = intervals
+        self._max_pval = max_pval
+        self._min_logp = min_logp
+
+    # define getters
+    def get_intervals(self) -> Optional[Dict[int, Intervals]]:
+        return self._intervals
+
+    def get_max_pval(self) -> Optional[float]:
+        return self._max_pval
+
+    def get_min_logp(self) -> Optional[float]:
+        return self._min_logp
+
+    # define a representation of the filter on print readouts
+    def __repr__(self) -> str:
+        regions = sum(len(s) for s, _ in self._intervals.values()) if self._intervals is not None else 'all'
+        return f"RowFilter(regions={regions}, max_pval={self._max_pval}, min_logp={self._min_logp})"
+
+
+    # define a function that returns the mask of rows passing the filter
+    # from the contig code, position and statistic columns of a batch.
+    # positions are looked up in the regions of their contig by binary search
+    def mask(self, contig_codes: np.ndarray, pos: np.ndarray, stats: StatColumns) -> np.ndarray:
+        keep = np.ones(len(pos), dtype=bool)
+        if self._intervals is not None:
+            keep[:] = False
+            for code, (starts, ends) in self._intervals.items():
+                rows = np.flatnonzero(contig_codes == code)
+                if len(rows) == 0: continue
+                i = np.searchsorted(starts, pos[rows], side='right') - 1
+                keep[rows] = (i >= 0) & (pos[rows] <= ends[np.maximum(i, 0)])
+        if self._max_pval is not None:
+            keep &= stats["P"] <= self._max_pval
+        if self._min_logp is not None:
+            keep &= stats["LOGP"] >= self._min_logp
+        return keep
+
+    # define property objects to enforce getters
+    intervals = property(get_intervals)
+    max_pval = property(get_max_pval)
+    min_logp = property(get_min_logp)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that compiles the RowFilter of a set of regions, whose
+# chromosomes are contig ids, against a contig id -> code table. regions of
+# None keep every position
+def compile_row_filter(regions: Optional[Sequence[Region]], codes: Dict[str, int],
+                       max_pval: Optional[float] = None, min_logp: Optional[float] = None) -> RowFilter:
+    intervals: Optional[Dict[int, Intervals]] = None
+    if regions is not None:
+        runs: Dict[str, List[Region]] = {}
+        for region in merge_regions(regions):
+            runs.setdefault(region.chrom, []).append(region)
+        intervals = {codes[chrom]: (np.array([r.start for r in rs], dtype=np.int64),
+                                    np.array([r.end for r in rs], dtype=np.int64))
+                     for chrom, rs in runs.items()}
+    return RowFilter(intervals, max_pval, min_logp)
@@ -0,0 +1,132 @@
+# File Name: instrument.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines lightweight instrumentation for the command line tools.
+#  the work functions time their sub-stages (decode, build, stats, liftover,
+#  format) into a per-thread table which the pipeline collects after each
+#  chunk, so the timings of pool workers travel back with their results.
+#  stages may also count rows by outcome (e.g. harmonize: swapped), which
+#  travel back the same way.
+#  also defines cProfile helpers for the main process threads and the pool
+#  workers, and the peak RSS of a process.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import cProfile
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from multiprocessing.util import Finalize
+from typing import Any, Callable, Dict, Iterator, Optional, Tuple
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+StageTimes = Dict[str, float]
+StageCounts = Dict[Tuple[str, str], int]  # (stage, outcome) -> rows
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# seconds spent in each timed sub-stage by each thread since its last call
+# to take_stage_times, kept per thread for the thread backend of executors
+_LOCAL = threading.local()
+_PROFILER: Dict[str, cProfile.Profile] = {}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the sub-stage table of the calling thread
+def stage_seconds() -> StageTimes:
+    if not hasattr(_LOCAL, 'seconds'): _LOCAL.seconds = {}
+    return _LOCAL.seconds
+
+# define a function that returns the outcome count table of the calling thread
+def stage_counts() -> StageCounts:
+    if not hasattr(_LOCAL, 'counts'): _LOCAL.counts = {}
+    return _LOCAL.counts
+
+# define a function that adds n rows to an outcome of the named sub-stage
+# of the calling thread
+def count_rows(name: str, outcome: str, n: int) -> None:
+    counts = stage_counts()
+    counts[(name, outcome)] = counts.get((name, outcome), 0) + n
+
+# define a context manager that adds the time spent in its body to the named
+# sub-stage of the calling thread
+@contextmanager
+def stage_timer(name: str) -> Iterator[None]:
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = stage_seconds()
+        seconds[name] = seconds.get(name, 0.0) + time.perf_counter() - start
+
+# define a function that returns the sub-stage times recorded by the calling
+# thread since its last call and resets them
+def take_stage_times() -> StageTimes:
+    seconds = stage_seconds()
+    times = dict(seconds)
+    seconds.clear()
+    return times
+
+# define a function that returns the outcome counts recorded by the calling
+# thread since its last call and resets them
+def take_stage_counts() -> StageCounts:
+    counts = stage_counts()
+    taken = dict(counts)
+    counts.clear()
+    return taken
+
+# define a function that returns the peak resident set size of this process
+# in megabytes (linux reports ru_maxrss in kilobytes, macos in bytes)
+def peak_rss_mb() -> float:
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / (1024.0 * 1024.0) if sys.platform == 'darwin' else maxrss / 1024.0
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that wraps target so that it runs under its own cProfile
+# profiler, with the stats dumped to path when it returns. cProfile only
+# follows the thread it is enabled in, so each pipeline thread is wrapped
+def profiled(target: Callable[..., Any], path: str) -> Callable[..., Any]:
+    def run(*args, **kwargs) -> Any:
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return target(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(path)
+    return run
+
+# define a pool initializer that profiles the worker process until it exits,
+# dumping the stats to <prefix>.worker.<pid>.prof, and then runs the passed
+# initializer. the dump is registered as a multiprocessing finalizer since
+# pool workers exit without running atexit handlers; the pool has to be
+# closed and joined (not terminated) for the dump to be written
+def init_profiled_worker(prefix: str, initializer: Optional[Callable[..., None]] = None,
+                         initargs: Tuple[Any,...] = ()) -> None:
+    profiler = cProfile.Profile()
+    _PROFILER["worker"] = profiler
+    path = f"{prefix}.worker.{os.getpid()}.prof"
+
+    def dump() -> None:
+        profiler.disable()
+        profiler.dump_stats(path)
+
+    Finalize(None, dump, exitpriority=10)
+    if initializer is not None:
+        initializer(*initargs)
+    profiler.enable()
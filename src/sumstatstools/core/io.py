@@ -7,8 +7,10 @@
 # library imports
 # -----------------------------------------------------------------------------
 
-from itertools import islice
-from typing import BinaryIO, Tuple, Union
+import numpy as np
+from itertools import islice, filterfalse
+from typing import BinaryIO, Dict, List, Optional, Sequence, Tuple, Union
+from .compress import open_input, wrap_compressed
 from .custom_types import Tokens, MapF, BinLinesGenerator, Decoder
 from .custom_types import BinLines, Lines
 
@@ -17,6 +19,18 @@ from .custom_types import BinLines, Lines
 # -----------------------------------------------------------------------------
 
 MaybeLines = Union[Lines,Tuple[None]]
+Delimiter = Optional[str]  # a field separator, or None for runs of whitespace
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# the delimiters selectable on the command line. 'whitespace' splits on runs
+# of spaces and tabs; 'tab' and 'comma' keep spaces inside fields
+DELIMITERS: Dict[str, Delimiter] = {'tab': '\t', 'comma': ',', 'whitespace': None}
+DELIMITER_CHOICES = ('auto',) + tuple(DELIMITERS)
+PARQUET_MAGIC = b'PAR1'  # leading and trailing bytes of a parquet file
+
 
 # primitive function definitions
 # -----------------------------------------------------------------------------
@@ -29,20 +43,47 @@ def dec_ascii(binary_line: bytes) -> str:
     return binary_line.decode('ascii')
 
 
-# define a tokenize function that strips excess whitespace and splits
-# a text line based on passed delimiter
-def tokenize(line: str, delim: str = '\t') -> Tokens:
-    return tuple(line.strip().split())
+# define a tokenize function that splits a text line on the passed
+# delimiter, dropping the line ending. with no delimiter excess whitespace is
+# stripped and the line is split on runs of whitespace
+def tokenize(line: str, delim: Delimiter = None) -> Tokens:
+    if delim is None: return tuple(line.strip().split())
+    return tuple(line.rstrip('\r\n').split(delim))
 
 
 # define functions that compose the decoders and the tokenizer
-def dec_utf8_and_tokenize(binary_line: bytes, delim:str = '\t') -> Tokens:
+def dec_utf8_and_tokenize(binary_line: bytes, delim: Delimiter = None) -> Tokens:
     return tokenize(dec_utf8(binary_line), delim)
 
-def dec_ascii_and_tokenize(binary_line: bytes, delim: str = '\t') -> Tokens:
+def dec_ascii_and_tokenize(binary_line: bytes, delim: Delimiter = None) -> Tokens:
     return tokenize(dec_ascii(binary_line), delim)
 
 
+# define a function that guesses the delimiter of a file from its header
+# line: tabs, then commas, then runs of whitespace
+def sniff_delimiter(header_line: bytes) -> Delimiter:
+    if b'\t' in header_line: return '\t'
+    if b',' in header_line: return ','
+    return None
+
+# define a function that returns the delimiter for a command line choice,
+# sniffing it from the header line for 'auto'
+def resolve_delimiter(choice: str, header_line: bytes) -> Delimiter:
+    return sniff_delimiter(header_line) if choice == 'auto' else DELIMITERS[choice]
+
+# define a function that decodes a column of byte fields to strings with a
+# single decode, joining on a newline which no field can contain
+def decode_column(fields: Sequence[bytes]) -> List[str]:
+    if len(fields) == 0: return []
+    return b'\n'.join(fields).decode('utf-8').split('\n')
+
+
+# define a function that returns true if a file starts with the parquet
+# magic bytes
+def is_parquet_file(path: str) -> bool:
+    with open(path, 'rb') as fobj:
+        return fobj.read(4) == PARQUET_MAGIC
+
 # define a function that returns true or false based on whether the line
 # starts with the given header token 
 def is_header(line: str, startswith: str = "#") -> bool:
@@ -55,8 +96,11 @@ def is_header(line: str, startswith: str = "#") -> bool:
 # define a function that returns a an anonymous callable object for retrieving file lines.
 # the generate_file_reader function has a batch size argument to denote how many lines to 
 # read into memory at once. a batch size of -1 will allow users to read the entire file 
-# at once. 
-def generate_file_reader(fobj: BinaryIO, batch_size: int = 1000) -> BinLinesGenerator:
+# at once. the reader accepts a path or a binary file object; gzip and bgzf input is
+# detected from its magic bytes and decompressed transparently (bgzf on threads).
+def generate_file_reader(fobj: Union[str, BinaryIO], batch_size: int = 1000,
+                         threads: int = 1) -> BinLinesGenerator:
+    fobj = open_input(fobj, threads) if isinstance(fobj, str) else wrap_compressed(fobj, threads)
     if batch_size == -1:  # batch size code for reading all lines
         return lambda : tuple(islice(fobj, None))
     else:
@@ -70,6 +114,48 @@ def decode_lines(binary_lines: BinLines, mapf: MapF, dec: Decoder) -> Lines:
     return tuple(mapf(dec, binary_lines))
 
 
+# define a function that returns whether each of the nlines lines of data
+# holds ncols fields. the fields are counted per line over the whole chunk
+# with numpy, as the starts of non-whitespace runs or as the single byte
+# delimiters before each line ending
+def fields_per_line(data: bytes, nlines: int, ncols: int, sep: Optional[bytes] = None) -> bool:
+    if sep is not None and len(sep) != 1:
+        return all(l.count(sep) == ncols - 1 for l in data.split(b'\n')[:nlines])
+    buf = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buf == ord('\n'))
+    if len(ends) < nlines: ends = np.append(ends, len(buf))
+    if sep is None:
+        # the whitespace bytes.split() splits on: space and \t\n\v\f\r (9 to 13)
+        space = np.concatenate(([True], (buf == ord(' ')) | (buf - np.uint8(9) < 5)))
+        marks = np.flatnonzero(space[:-1] > space[1:])
+    else:
+        marks = np.flatnonzero(buf == sep[0])
+    counts = np.diff(np.searchsorted(marks, ends), prepend=0)
+    return bool((counts == (ncols if sep is None else ncols - 1)).all())
+
+# define a function that splits a whole chunk of binary lines into its
+# fields with one split over the joined bytes, without decoding. the fields
+# come back row-major, so column j is fields[j::ncols]. None is returned when
+# any line does not split into exactly ncols fields (blank or ragged lines),
+# and such chunks are tokenized line by line instead
+def split_chunk(binary_lines: BinLines, ncols: int, delim: Delimiter = None) -> Optional[List[bytes]]:
+    data = b''.join(binary_lines)
+    if b'\r' in data: data = data.replace(b'\r\n', b'\n')
+    sep = delim.encode('utf-8') if delim is not None else None
+    if sep is None:
+        fields = data.split()
+    else:
+        fields = data.rstrip(b'\n').replace(b'\n', sep).split(sep)
+    if len(fields) != len(binary_lines) * ncols: return None
+    return fields if fields_per_line(data, len(binary_lines), ncols, sep) else None
+
+
 # define a function that filters header lines from a tuple of lines
 def filter_header_lines(lines: Lines) -> MaybeLines:
-    return tuple(filter(is_header, lines))
\ No newline at end of file
+    return tuple(filterfalse(is_header, lines))
+
+# define a function that reads a sample of up to rows lines from the start
+# of a file, after skipping its first skip lines (e.g. a header line)
+def read_sample_lines(path: str, rows: int, skip: int = 1) -> BinLines:
+    with open_input(path) as fobj:
+        return tuple(l for l in islice(fobj, skip, skip + rows) if l.strip())
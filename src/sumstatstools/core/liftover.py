@@ -7,34 +7,160 @@
 # library imports
 # -----------------------------------------------------------------------------
 
-from copy import deepcopy
-from typing import Dict,Union
-from liftover import ChainFile
+import numpy as np
+from typing import Any, Dict, Tuple, Union
+from .batch import VariantBatch, contig_codes_dict
+from .chain import ChainIndex, load_chain_index, reverse_complement, reverse_complement_column
 from .contig import Contig
+from .custom_types import BinLines
+from .instrument import count_rows, stage_timer
 from .variant import Variant
+from .vcf import batch_from_vcf_lines, format_vcf_batch
 
 
 # type aliases
 # -----------------------------------------------------------------------------
 
 MaybeVariant = Union[Variant, None]
+IntArray = np.ndarray
+LiftedBatches = Tuple[VariantBatch, VariantBatch, IntArray]
+LiftedText = Tuple[str, str, int, int]  # mapped text, unmapped text, records, multi-mapped
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# liftover state shared with the worker processes. it is set in the parent
+# before the pool is forked so that workers inherit the (large) chain
+# copy-on-write instead of receiving a pickled copy with every task
+_SHARED: Dict[str,Any] = {}
+
 
 # function definitions
 # -----------------------------------------------------------------------------
 
-# define a function that takes a variant as input and converts it
-# using the passed liftover.ChainFile object
-def liftover_variant(variant: Variant, chain: ChainFile, target_contigs_dict: Dict[str,Contig]) -> MaybeVariant:
-    var_copy = deepcopy(variant)
-    varcoords = (var_copy.get_contig().get_id(), var_copy.get_pos())
-    newcoords = chain[varcoords[0]][varcoords[1]]
-    
-    # upon successful liftover, convert to 
-    if newcoords != []:
-        var_copy.set_contig(target_contigs_dict[newcoords[0][0]])
-        var_copy.set_pos(newcoords[0][1])
-        return var_copy
-    
-    else:
-        return None
-        
+# define a function that returns true if any allele of a (possibly multi-
+# allelic) ALT differs in length from REF, i.e. the record is an indel
+def is_indel(ref: str, alt: str) -> bool:
+    return any(len(a) != len(ref) for a in alt.split(','))
+
+# define a function that takes a variant as input and converts it using the
+# passed ChainIndex, as for one row of liftover_batch: all of its REF bases
+# must fall in one chain block. chain coordinates are zero-based while vcf
+# positions are one-based. variants lifted to the minus strand have their
+# alleles reverse complemented, except indels, which are not lifted since
+# their shared base would end up on the right of the alleles
+def liftover_variant(variant: Variant, chain: ChainIndex, target_contigs_dict: Dict[str,Contig]) -> MaybeVariant:
+    ref, alt = variant.get_ref(), variant.get_alt()
+    mapped, target, qpos, minus, _ = chain.lift(variant.get_contig().get_id(),
+                                                np.array([variant.get_pos() - 1]),
+                                                np.array([max(1, len(ref))]))
+    if not mapped[0]: return None
+    contig = target_contigs_dict.get(chain.get_target_names()[int(target[0])])
+    if contig is None: return None
+
+    # upon successful liftover, convert to the new coordinates. the lifted
+    # variant shares all other fields with the original
+    if minus[0]:
+        if is_indel(ref, alt): return None
+        return variant.replace(contig=contig, pos=int(qpos[0]) + 1,
+                               ref=reverse_complement(ref), alt=reverse_complement(alt))
+    return variant.replace(contig=contig, pos=int(qpos[0]) + 1)
+
+
+
+# define a function that lifts a whole batch of variants using the passed
+# ChainIndex. rather than copying each variant, the mapped rows are selected
+# from the batch and given new contig codes and positions over the target
+# contig table, with the positions of each source contig lifted in one call.
+# a row maps only if all of its REF bases fall in one chain block; rows
+# landing on the minus strand have REF/ALT reverse complemented, except
+# indels, which are returned unmapped and counted. returns
+# (mapped, unmapped, hits) where the unmapped batch is still in the source
+# assembly and hits holds the number of chain blocks covering each input
+# row, so that values above one flag multi-mapping positions. when
+# drop_multimap is set, multi-mapping rows are treated as unmapped
+def liftover_batch(batch: VariantBatch, chain: ChainIndex, target_contigs_dict: Dict[str,Contig],
+                   drop_multimap: bool = False) -> LiftedBatches:
+    target_contigs = tuple(target_contigs_dict.values())
+    target_codes = contig_codes_dict(target_contigs)
+    remap = np.array([target_codes.get(c, -1) for c in chain.get_target_names()] + [-1], dtype=np.int32)
+
+    n = len(batch)
+    codes = batch.get_contig_codes()
+    pos = batch.get_pos() - 1
+    lengths = np.array([max(1, len(r)) for r in batch.get_refs().tolist()], dtype=np.int64)
+    mapped = np.zeros(n, dtype=bool)
+    new_codes = np.zeros(n, dtype=np.int32)
+    new_pos = np.zeros(n, dtype=np.int64)
+    minus = np.zeros(n, dtype=bool)
+    hits = np.zeros(n, dtype=np.int32)
+    for code, contig in enumerate(batch.get_contigs()):
+        rows = np.flatnonzero(codes == code)
+        if rows.size == 0: continue
+        m, t, p, s, h = chain.lift(contig.get_id(), pos[rows], lengths[rows])
+        t = np.where(m, remap[t], -1)
+        mapped[rows] = t >= 0
+        new_codes[rows] = t
+        new_pos[rows] = p + 1
+        minus[rows] = s
+        hits[rows] = h
+
+    if drop_multimap:
+        mapped &= hits <= 1
+    flipped = np.flatnonzero(mapped & minus)
+    if flipped.size:
+        refs, alts = batch.get_refs(), batch.get_alts()
+        indels = flipped[[is_indel(refs[i], alts[i]) for i in flipped.tolist()]]
+        if indels.size:
+            mapped[indels] = False
+            count_rows("liftover", "minus strand indels", int(indels.size))
+    lifted = batch.filter(mapped)
+    flip = minus[mapped]
+    refs, alts = lifted.get_refs(), lifted.get_alts()
+    if flip.any():
+        refs, alts = refs.copy(), alts.copy()
+        refs[flip] = reverse_complement_column(refs[flip])
+        alts[flip] = reverse_complement_column(alts[flip])
+    lifted = VariantBatch(target_contigs, new_codes[mapped], new_pos[mapped], lifted.get_names(),
+                          refs, alts, lifted.get_stats(),
+                          lifted.get_filts(), lifted.get_quals(), lifted.get_infos())
+    return lifted, batch.filter(~mapped), hits
+
+
+# define a function that sets the chain and target contigs used by
+# liftover_vcf_lines in this process. call it before forking the pool
+def share_liftover_state(chain: ChainIndex, target_contigs_dict: Dict[str,Contig]) -> None:
+    _SHARED["chain"] = chain
+    _SHARED["target_contigs_dict"] = target_contigs_dict
+
+# define a pool initializer that loads the chain index in a worker process,
+# for platforms where workers are spawned rather than forked. the parent has
+# already written the .npz cache, so this only reads the arrays back
+def init_liftover_worker(chain_path: str, target_contigs_dict: Dict[str,Contig]) -> None:
+    share_liftover_state(load_chain_index(chain_path), target_contigs_dict)
+
+# define a function that returns the number of records in a lifted chunk
+def lifted_rows(result: LiftedText) -> int:
+    return result[2]
+
+# define a function that returns the characters of text in a lifted chunk
+def lifted_bytes(result: LiftedText) -> int:
+    return len(result[0]) + len(result[1])
+
+
+# define a function that lifts a chunk of binary vcf data lines using the
+# shared liftover state, returning the mapped records as vcf text in the
+# target assembly, the unmapped records as vcf text in the source assembly
+# and the number of records and of multi-mapping records. when drop_multimap
+# is set, multi-mapping records are sent to the unmapped records
+def liftover_vcf_lines(binary_lines: BinLines, source_contigs_dict: Dict[str,Contig],
+                       drop_multimap: bool = False) -> LiftedText:
+    with stage_timer("decode"):
+        batch = batch_from_vcf_lines(binary_lines, source_contigs_dict)
+    with stage_timer("liftover"):
+        mapped, unmapped, hits = liftover_batch(batch, _SHARED["chain"], _SHARED["target_contigs_dict"],
+                                                drop_multimap)
+    with stage_timer("format"):
+        mapped_text, unmapped_text = format_vcf_batch(mapped), format_vcf_batch(unmapped)
+    return mapped_text, unmapped_text, len(batch), int((hits > 1).sum())
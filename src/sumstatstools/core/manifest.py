@@ -0,0 +1,198 @@
+# File Name: manifest.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines multi-file conversion of summary stats to VCF. a manifest
+#  lists (metadata, sumstats, output) entries; the contigs of each chrom.sizes
+#  file are loaded once per genome build and every file is split into work
+#  units (byte ranges, or chunks of lines for compressed input) which are
+#  scheduled over one shared pool in manifest order. small files then run
+#  side by side on different workers while large files are spread over all
+#  of them, and each output is still written in input order.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import json
+import os
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple, Union
+from .chunking import ByteRange, generate_range_reader, parse_byte_range
+from .chunking import parse_lines_to_text
+from .compress import is_compressed_file, open_input
+from .contig import Contig, read_chrom_sizes
+from .custom_types import BinLines
+from .io import Delimiter, dec_utf8_and_tokenize, generate_file_reader, resolve_delimiter
+from .plan import ColumnPlan
+from .vcf import format_vcf_batch
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class ManifestEntry(NamedTuple):
+    metadata: str
+    sumstats: str
+    output: str
+    chrom_sizes: Optional[str]
+
+# a work unit is (file index, payload): a byte range of an uncompressed file,
+# a chunk of lines of a compressed file, or None marking the end of the file
+WorkUnit = Tuple[int, Union[ByteRange, BinLines, None]]
+UnitText = Tuple[int, str, int, bool]  # file index, vcf text, records, end of file
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+MANIFEST_FIELDS = ("metadata", "sumstats", "output", "chrom_sizes")
+
+# the column plans and formatting options of the job, set in the parent and
+# by the pool initializer in each worker
+_SHARED: Dict[str, Any] = {}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the number of records in a parsed unit
+def unit_rows(result: UnitText) -> int:
+    return result[2]
+
+# define a function that returns the number of bytes in a work unit
+def unit_bytes(unit: WorkUnit) -> int:
+    payload = unit[1]
+    if payload is None: return 0
+    if isinstance(payload, ByteRange): return payload.end - payload.start
+    return sum(map(len, payload))
+
+# define a function that returns the number of records in a work unit read
+# as lines; byte ranges are counted once parsed
+def unit_lines(unit: WorkUnit) -> int:
+    return len(unit[1]) if isinstance(unit[1], tuple) and not isinstance(unit[1], ByteRange) else 0
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ContigCache object, which loads the contigs of each chrom.sizes
+# file once per genome build and hands out the same table afterwards
+class ContigCache:
+    def __init__(self) -> None:
+        self._tables: Dict[Tuple[str,str], Dict[str,Contig]] = {}
+
+    # define a function that returns the contigs of a chrom.sizes file in a
+    # genome build, reading the file on first use
+    def get(self, path: str, genome_build: str) -> Dict[str,Contig]:
+        key = (os.path.abspath(path), genome_build)
+        if key not in self._tables:
+            self._tables[key] = read_chrom_sizes(path, genome_build)
+        return self._tables[key]
+
+    def __len__(self) -> int:
+        return len(self._tables)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that reads a manifest: a tab separated file with one
+# 'metadata sumstats output [chrom_sizes]' entry per line. blank lines, '#'
+# comments and a header line starting with 'metadata' are skipped, and
+# relative paths are taken relative to the manifest
+def read_manifest(path: str) -> List[ManifestEntry]:
+    base = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path, 'r') as fobj:
+        for n, line in enumerate(fobj, 1):
+            fields = line.rstrip('\r\n').split('\t')
+            if fields == [''] or fields[0].startswith('#') or fields[0] == MANIFEST_FIELDS[0]:
+                continue
+            if len(fields) not in (3, 4):
+                raise ValueError(f"{path}:{n}: expected 3 or 4 tab separated fields, got {len(fields)}")
+            fields = [os.path.join(base, f) if f != '' else None for f in fields] + [None] * (4 - len(fields))
+            entries.append(ManifestEntry(*fields))
+    return entries
+
+
+# define a function that reads the header line of a sumstats file and
+# returns its tokens, the byte offset of the first record and the delimiter
+# for the delimiter choice (sniffed from the header for 'auto')
+def read_sumstats_header(path: str, delimiter: str = 'whitespace') -> Tuple[Tuple[str,...], int, Delimiter]:
+    with open_input(path) as fobj:
+        line = fobj.readline()
+        delim = resolve_delimiter(delimiter, line)
+        return dec_utf8_and_tokenize(line, delim), fobj.tell(), delim
+
+
+# define a function that loads and validates the metadata of every entry,
+# returning the metadata dictionaries. each metadata file is read and
+# validated once however many entries share it
+def load_manifest_metadata(entries: List[ManifestEntry],
+                           validate: Callable[[dict], None]) -> List[dict]:
+    loaded: Dict[str, dict] = {}
+    for e in entries:
+        if e.metadata not in loaded:
+            with open(e.metadata, 'r') as jobj:
+                loaded[e.metadata] = json.load(jobj)
+            validate(loaded[e.metadata])
+    return [loaded[e.metadata] for e in entries]
+
+
+# define a function that sets the column plans (by file index) and the batch
+# formatting function used by parse_unit in this process. it is also the
+# pool initializer, so the plans are sent to each worker once per job
+def share_manifest_state(plans: Dict[int,ColumnPlan], format_batch: Callable[..., str] = format_vcf_batch,
+                         paths: Optional[Dict[int,str]] = None, chunk_size: int = 5000) -> None:
+    _SHARED["plans"] = plans
+    _SHARED["format_batch"] = format_batch
+    _SHARED["paths"] = paths if paths is not None else {}
+    _SHARED["chunk_size"] = chunk_size
+
+
+# define a function that parses one work unit to vcf text with the plan of
+# its file. this is the parse function handed to the shared pool
+def parse_unit(unit: WorkUnit) -> UnitText:
+    index, payload = unit
+    if payload is None:
+        return (index, '', 0, True)
+    plan = _SHARED["plans"][index]
+    if isinstance(payload, ByteRange):
+        text, rows = parse_byte_range(payload, _SHARED["paths"][index], plan.batch_from_lines,
+                                      _SHARED["chunk_size"], _SHARED["format_batch"])
+    else:
+        text, rows = parse_lines_to_text(payload, plan.batch_from_lines, _SHARED["format_batch"])
+    return (index, text, rows, False)
+
+
+# define a function that yields the work units of every file in manifest
+# order. uncompressed files are split into newline-aligned byte ranges which
+# the workers read themselves; compressed files are read here in chunks of
+# chunk_size lines. every file ends with an end of file unit
+def generate_work_units(paths: List[str], starts: List[int], range_bytes: int,
+                        chunk_size: int) -> Iterator[WorkUnit]:
+    for index, (path, start) in enumerate(zip(paths, starts)):
+        if is_compressed_file(path):
+            with open_input(path) as fobj:
+                fobj.readline()
+                reader_f = generate_file_reader(fobj, chunk_size)
+                lines = reader_f()
+                while lines != ():
+                    lines = tuple(l for l in lines if l.strip())
+                    if lines != (): yield (index, lines)
+                    lines = reader_f()
+        else:
+            reader_f = generate_range_reader(path, start, range_bytes)
+            byte_range = reader_f()
+            while byte_range != ():
+                yield (index, byte_range)
+                byte_range = reader_f()
+        yield (index, None)
+
+
+# define a function that returns an anonymous callable object producing the
+# work units one at a time, with an empty tuple at the end, as expected by
+# the pipeline reader
+def generate_unit_reader(paths: List[str], starts: List[int], range_bytes: int,
+                         chunk_size: int) -> Callable[[], Union[WorkUnit, Tuple[()]]]:
+    units = generate_work_units(paths, starts, range_bytes, chunk_size)
+    return lambda: next(units, ())
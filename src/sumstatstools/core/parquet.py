@@ -0,0 +1,308 @@
+# File Name: parquet.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines parquet input and output of summary stats through arrow.
+#  parquet sumstats are read one row group per work item, with only the
+#  columns named in the metadata 'columns' mapping, and built into
+#  VariantBatches straight from the arrow columns without any text parsing.
+#  the derived table (chrom, pos, id, alleles and the BETA/SE/Z/P/LOGP stats)
+#  can be written as a parquet dataset partitioned by chromosome, hive style
+#  (chrom=<id>/part-0.parquet), so readers can prune by chromosome and by the
+#  statistics of each row group. pyarrow is an optional dependency, installed
+#  with the 'parquet' extra.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import os
+import numpy as np
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple, Union
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError as e:
+    raise ImportError("parquet input and output need pyarrow, installed with "
+                      "'pip install sumstatstools[parquet]'") from e
+from .batch import VariantBatch
+from .custom_types import Tokens
+from .instrument import stage_timer
+from .plan import ColumnPlan
+from .stats import STAT_KEYS
+from .variant import make_simple_chrom, make_ucsc_chrom
+from .vcf import format_vcf_batch
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class RowGroup(NamedTuple):
+    index: int
+    rows: int
+    nbytes: int
+
+MaybeRowGroup = Union[RowGroup, Tuple[()]]
+ColumnNames = Dict[int, str]  # header index -> parquet column name, for the mapped columns
+FormattedChunk = Tuple[Any, int]  # vcf text or an arrow table, and the number of records
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+ROW_GROUP_ROWS = 128 * 1024  # rows buffered per chromosome before writing a row group
+PARTITION_COLUMN = "chrom"
+PARTITION_FILE = "part-0.parquet"
+
+# the plan, parquet file and mapped column names used by parse_row_group in
+# this process, set in the parent and by the pool initializer in each worker
+_SHARED: Dict[str, Any] = {}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the column names of a parquet file, which
+# stand in for the header line of a text sumstats file
+def read_parquet_header(path: str) -> Tokens:
+    return tuple(pq.read_schema(path).names)
+
+# define a function that lists the row groups of a parquet file
+def parquet_row_groups(path: str) -> List[RowGroup]:
+    meta = pq.read_metadata(path)
+    return [RowGroup(i, meta.row_group(i).num_rows, meta.row_group(i).total_byte_size)
+            for i in range(meta.num_row_groups)]
+
+# define a function that returns the number of records in a row group
+def row_group_rows(group: RowGroup) -> int:
+    return group.rows
+
+# define a function that returns the uncompressed size of a row group
+def row_group_bytes(group: RowGroup) -> int:
+    return group.nbytes
+
+# define a function that returns the names of the columns a plan reads from
+# a file with the passed header, by header index
+def plan_column_names(plan: ColumnPlan, header: Tokens) -> ColumnNames:
+    return {i: header[i] for i in plan.core_indices + plan.stat_indices if i != '.'}
+
+# define a function that converts an arrow column to the values a ColumnPlan
+# builds batches from. integer and float columns become numpy arrays, with
+# nulls as NaN; any other column becomes a list of strings, with nulls as '.'
+def arrow_column(array: Any, numeric: bool) -> Union[np.ndarray, List[str]]:
+    if numeric and (pa.types.is_integer(array.type) or pa.types.is_floating(array.type)):
+        return array.to_numpy(zero_copy_only=False)
+    return pc.fill_null(pc.cast(array, pa.string()), '.').to_pylist()
+
+# define a function that returns the min and max statistics of column i of a
+# row group, or None if the column is unmapped or has no statistics
+def column_bounds(row_group: Any, i: Any) -> Optional[Tuple[Any, Any]]:
+    if i == '.': return None
+    stats = row_group.column(i).statistics
+    return (stats.min, stats.max) if stats is not None and stats.has_min_max else None
+
+# define a function that returns true if a chromosome column with the passed
+# bounds may hold a name of the contig cid, in any naming style
+def may_hold_contig(bounds: Optional[Tuple[Any, Any]], cid: str) -> bool:
+    if bounds is None: return True
+    names = {cid, make_simple_chrom(cid), make_ucsc_chrom(cid)}
+    if not isinstance(bounds[0], str):
+        names = {int(n) for n in names if n.isdigit()}
+    return any(bounds[0] <= n <= bounds[1] for n in names)
+
+# define a function that returns the schema of the derived table written for
+# the passed INFO fields
+def parquet_schema(info_fields: Sequence[str] = STAT_KEYS) -> Any:
+    return pa.schema([("chrom", pa.string()), ("pos", pa.int64()), ("id", pa.string()),
+                      ("ref", pa.string()), ("alt", pa.string())]
+                     + [(k, pa.float64()) for k in info_fields])
+
+# define a function that joins the arrow tables formatted from the chunks of
+# a work item, like ''.join for vcf text
+def concat_arrow_tables(tables: List[Any]) -> Any:
+    return pa.concat_tables(tables) if tables else pa.table({})
+
+# define a function that returns the size of a formatted chunk: the
+# characters of vcf text or the bytes of an arrow table
+def formatted_bytes(result: FormattedChunk) -> int:
+    return result[0].nbytes if isinstance(result[0], pa.Table) else len(result[0])
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ParquetDatasetWriter object, which writes arrow tables of the
+# derived columns to one parquet file per chromosome under path. rows are
+# buffered per chromosome and written in row groups of row_group_rows, and
+# the chromosome is kept in the directory name rather than in the files
+class ParquetDatasetWriter:
+    def __init__(self, path: str, metadata: Optional[Dict[str, str]] = None,
+                 row_group_rows: int = ROW_GROUP_ROWS) -> None:
+        self._path = path
+        self._metadata = dict(metadata) if metadata is not None else {}
+        self._row_group_rows = row_group_rows
+        self._writers: Dict[str, Any] = {}
+        self._buffers: Dict[str, List[Any]] = {}
+        self._buffered: Dict[str, int] = {}
+        self._rows = 0
+        os.makedirs(path, exist_ok=True)
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_partitions(self) -> Tuple[str,...]:
+        return tuple(self._writers)
+
+    # define a representation of the writer on print readouts
+    def __repr__(self) -> str:
+        return f"ParquetDatasetWriter({self._path}, {self._rows} rows, {len(self._writers)} partitions)"
+
+
+    # define a function that adds the rows of a table to the buffers of their
+    # chromosomes, writing every buffer that reaches a full row group
+    def write(self, table: Any) -> None:
+        if len(table) == 0: return
+        chroms = table.column(PARTITION_COLUMN)
+        values = pc.unique(chroms).to_pylist()
+        for chrom in values:
+            part = table if len(values) == 1 else table.filter(pc.equal(chroms, chrom))
+            self._buffers.setdefault(chrom, []).append(part.drop_columns([PARTITION_COLUMN]))
+            self._buffered[chrom] = self._buffered.get(chrom, 0) + len(part)
+            if self._buffered[chrom] >= self._row_group_rows:
+                self.flush(chrom)
+        self._rows += len(table)
+
+    # define a function that writes the buffered rows of a chromosome,
+    # opening its partition file on its first rows
+    def flush(self, chrom: str) -> None:
+        tables = self._buffers.pop(chrom, [])
+        self._buffered.pop(chrom, None)
+        if not tables: return
+        table = pa.concat_tables(tables)
+        if chrom not in self._writers:
+            directory = os.path.join(self._path, f"{PARTITION_COLUMN}={chrom}")
+            os.makedirs(directory, exist_ok=True)
+            schema = table.schema.with_metadata(self._metadata)
+            self._writers[chrom] = pq.ParquetWriter(os.path.join(directory, PARTITION_FILE), schema)
+        self._writers[chrom].write_table(table, row_group_size=self._row_group_rows)
+
+    # define a function that writes the remaining buffers and closes every
+    # partition file
+    def close(self) -> None:
+        for chrom in list(self._buffers): self.flush(chrom)
+        for writer in self._writers.values(): writer.close()
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    rows = property(get_rows)
+    partitions = property(get_partitions)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that keeps the row groups of a parquet file whose column
+# statistics show they may hold rows passing the plan's row filter: a mapped
+# P column must reach down to max_pval and a LOGP column up to min_logp, and
+# the chromosome and position bounds must overlap a region
+def prune_row_groups(path: str, groups: Sequence[RowGroup], plan: ColumnPlan) -> List[RowGroup]:
+    row_filter = plan.row_filter
+    if row_filter is None: return list(groups)
+    meta = pq.read_metadata(path)
+    chrom_i, pos_i = plan.core_indices[:2]
+    pval_i, logp_i = plan.stat_indices[3:5]
+    kept = []
+    for group in groups:
+        row_group = meta.row_group(group.index)
+        pval, logp = (b if b is not None and isinstance(b[0], (int, float)) else None
+                      for b in (column_bounds(row_group, pval_i), column_bounds(row_group, logp_i)))
+        if row_filter.max_pval is not None and pval is not None and pval[0] > row_filter.max_pval: continue
+        if row_filter.min_logp is not None and logp is not None and logp[1] < row_filter.min_logp: continue
+        if row_filter.intervals is not None:
+            chrom, pos = column_bounds(row_group, chrom_i), column_bounds(row_group, pos_i)
+            if not any(may_hold_contig(chrom, plan.contigs[code].get_id())
+                       and (pos is None or bool(((starts <= pos[1]) & (ends >= pos[0])).any()))
+                       for code, (starts, ends) in row_filter.intervals.items()):
+                continue
+        kept.append(group)
+    return kept
+
+
+# define a function that converts a VariantBatch to an arrow table of the
+# derived columns. this is the parquet counterpart of vcf.format_vcf_batch
+def format_arrow_batch(batch: VariantBatch, info_fields: Sequence[str] = STAT_KEYS) -> Any:
+    ids = np.array([c.get_id() for c in batch.get_contigs()], dtype=object)
+    stats = batch.get_stats()
+    columns = [pa.array(ids[batch.get_contig_codes()], pa.string()), pa.array(batch.get_pos(), pa.int64()),
+               pa.array(batch.get_names(), pa.string()), pa.array(batch.get_refs(), pa.string()),
+               pa.array(batch.get_alts(), pa.string())]
+    columns += [pa.array(stats[k], pa.float64()) for k in info_fields]
+    return pa.Table.from_arrays(columns, schema=parquet_schema(info_fields))
+
+
+# define a function that builds the VariantBatch of an arrow record batch
+# with a plan. names gives the parquet column of each mapped header index;
+# the position and statistic columns are kept numeric
+def batch_from_record_batch(plan: ColumnPlan, record_batch: Any, names: ColumnNames) -> VariantBatch:
+    with stage_timer("decode"):
+        pos = plan.core_indices[1]
+        numeric = {i for i in plan.stat_indices + [pos] if i != '.'}
+        columns = {i: arrow_column(record_batch.column(name), i in numeric) for i, name in names.items()}
+    return plan.batch_from_columns(record_batch.num_rows, columns.__getitem__)
+
+
+# define a function that sets the plan and parquet file used by
+# parse_row_group in this process. it is also the pool initializer, so each
+# worker opens the file and reads its footer once
+def share_parquet_state(plan: ColumnPlan, path: str) -> None:
+    pfile = pq.ParquetFile(path)
+    _SHARED["plan"] = plan
+    _SHARED["file"] = pfile
+    _SHARED["names"] = plan_column_names(plan, tuple(pfile.schema_arrow.names))
+
+
+# define a function that builds and formats one arrow record batch with the
+# shared plan, returning the formatted chunk and its number of records
+def parse_record_batch(record_batch: Any,
+                       format_batch: Callable[[VariantBatch],Any] = format_vcf_batch) -> FormattedChunk:
+    batch = batch_from_record_batch(_SHARED["plan"], record_batch, _SHARED["names"])
+    with stage_timer("format"):
+        formatted = format_batch(batch)
+    return (formatted, len(batch))
+
+
+# define a function that reads one row group of the shared parquet file,
+# only its mapped columns, and parses it in chunks of chunk_size records.
+# the formatted chunks are joined by join: ''.join for vcf text and
+# concat_arrow_tables for arrow tables
+def parse_row_group(group: RowGroup, chunk_size: int = 5000,
+                    format_batch: Callable[[VariantBatch],Any] = format_vcf_batch,
+                    join: Callable[[List[Any]],Any] = ''.join) -> FormattedChunk:
+    columns = list(dict.fromkeys(_SHARED["names"].values()))
+    with stage_timer("row group read"):
+        record_batches = list(_SHARED["file"].iter_batches(chunk_size, row_groups=[group.index],
+                                                           columns=columns, use_threads=False))
+    outputs, rows = [], 0
+    for record_batch in record_batches:
+        formatted, n = parse_record_batch(record_batch, format_batch)
+        outputs.append(formatted)
+        rows += n
+    return (join(outputs), rows)
+
+
+# define a function that reads the first rows of a parquet file as one
+# record batch, e.g. to time the parse with --backend auto
+def read_parquet_sample(path: str, rows: int) -> Any:
+    return next(pq.ParquetFile(path).iter_batches(rows), pa.record_batch({}))
+
+
+# define a function that returns an anonymous callable object producing the
+# row groups of a parquet file one at a time, with an empty tuple at the end,
+# as expected by the pipeline reader
+def generate_row_group_reader(groups: Sequence[RowGroup]) -> Callable[[], MaybeRowGroup]:
+    remaining = iter(groups)
+    return lambda: next(remaining, ())
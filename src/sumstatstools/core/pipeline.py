@@ -0,0 +1,287 @@
+# File Name: pipeline.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a streaming, bounded-memory pipeline that overlaps reading,
+#  parsing and writing. a reader thread pulls chunks of lines from the input,
+#  a map function (e.g. multiprocessing.Pool.imap) parses them, and an ordered
+#  writer thread writes results in input order. a semaphore caps the number
+#  of chunks in flight so peak memory does not depend on the input size.
+#  every stage keeps its rows, bytes and busy time, the sub-stages timed in
+#  the workers are collected with each result, and the time the reader waits
+#  for a free slot and the writer waits for a parsed chunk is recorded, so a
+#  slow run can be told apart as I/O bound or CPU bound.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import sys
+import threading
+import time
+from functools import partial
+from multiprocessing import cpu_count
+from queue import Queue
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from .instrument import StageCounts, StageTimes, peak_rss_mb, profiled, take_stage_counts, take_stage_times
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+ChunkReader = Callable[[], Any]
+ImapF = Callable[[Callable[[Any],Any], Iterable[Any]], Iterator[Any]]
+Timed = Tuple[Any, int, float, StageTimes, StageCounts]
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+_DONE = object()  # sentinel marking the end of the reader queue
+MAIN_STAGES = ("read", "parse", "write")
+WAIT_STAGES = ("reader wait", "writer wait")  # waiting for a slot / a parsed chunk
+BYTES_PER_WORKER = 8 * 1024 * 1024  # input bytes per default worker process
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the StageStats object which accumulates the work done by one stage
+class StageStats:
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._rows = 0
+        self._chunks = 0
+        self._seconds = 0.0
+        self._bytes = 0
+        self._counts: Dict[str,int] = {}
+        self._lock = threading.Lock()
+
+    # define a function that records one chunk of work done by the stage
+    def add(self, rows: int, seconds: float, nbytes: int = 0) -> None:
+        with self._lock:
+            self._rows += rows
+            self._chunks += 1
+            self._seconds += seconds
+            self._bytes += nbytes
+
+    # define a function that adds rows to an outcome counted by the stage
+    def count(self, outcome: str, rows: int) -> None:
+        with self._lock:
+            self._counts[outcome] = self._counts.get(outcome, 0) + rows
+
+    # define getters
+    def get_name(self) -> str:
+        return self._name
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_chunks(self) -> int:
+        return self._chunks
+
+    def get_seconds(self) -> float:
+        return self._seconds
+
+    def get_bytes(self) -> int:
+        return self._bytes
+
+    def get_counts(self) -> Dict[str,int]:
+        return dict(self._counts)
+
+    # define a function that returns the stage throughput in rows per busy second
+    def rate(self) -> float:
+        return self._rows / self._seconds if self._seconds > 0 else float('inf')
+
+    # define a function that returns the stage statistics as a dictionary
+    # for the json report
+    def to_dict(self) -> Dict[str,Any]:
+        return {"rows": self._rows, "chunks": self._chunks, "seconds": round(self._seconds, 6),
+                "bytes": self._bytes,
+                "rows_per_sec": round(self.rate(), 1) if self._seconds > 0 else None,
+                **({"counts": dict(self._counts)} if self._counts else {})}
+
+    # define a representation of the stage on print readouts
+    def __repr__(self) -> str:
+        mb = f", {self._bytes / 1e6:.1f} MB" if self._bytes else ''
+        if self._name in WAIT_STAGES:
+            return f"{self._name}: {self._seconds:.3f}s over {self._chunks} chunks"
+        counts = f" ({', '.join(f'{n} {k}' for k, n in self._counts.items())})" if self._counts else ''
+        return (f"{self._name}: {self._rows} rows in {self._chunks} chunks{mb}, "
+                f"{self._seconds:.3f}s busy, {self.rate():.0f} rows/s{counts}")
+
+    # define property objects to enforce getters
+    name = property(get_name)
+    rows = property(get_rows)
+    chunks = property(get_chunks)
+    seconds = property(get_seconds)
+    bytes = property(get_bytes)
+    counts = property(get_counts)
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that calls f on a chunk and returns the result along with
+# the number of rows in the result, the time spent and the sub-stage times
+# and outcome counts recorded while parsing. this runs inside the parse workers so that parse
+# time is measured where the work happens
+def timed_call(f: Callable[[Any],Any], rows_of: Callable[[Any],int], chunk: Any) -> Timed:
+    take_stage_times()
+    take_stage_counts()
+    start = time.perf_counter()
+    result = f(chunk)
+    seconds = time.perf_counter() - start
+    return result, rows_of(result), seconds, take_stage_times(), take_stage_counts()
+
+# define a function that picks the number of worker processes for an input
+# of nbytes on disk. an explicit request is used as is, with 0 parsing in the
+# main process. otherwise one worker is used per BYTES_PER_WORKER of input,
+# up to one per core, so that inputs too small to repay the cost of forking
+# workers and sending chunks between processes are parsed in process
+def plan_workers(requested: Optional[int], nbytes: int) -> int:
+    if requested is not None: return max(0, requested)
+    return min(cpu_count(), nbytes // BYTES_PER_WORKER)
+
+# define a function that returns the number of bytes in a chunk of lines
+def lines_bytes(chunk: Any) -> int:
+    return sum(map(len, chunk))
+
+# define a function that returns the number of characters of text in a
+# parsed result whose first element is text
+def text_bytes(result: Any) -> int:
+    return len(result[0])
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that runs the read -> parse -> write pipeline. read_f
+# returns the next chunk, e.g. a tuple of lines (an empty tuple at end of
+# input), parse is applied to each chunk through imapf, and write is called
+# on every parsed result in input order. at most max_inflight chunks are read but not yet
+# written at any time. chunk_rows and result_rows count the rows in a chunk
+# and in a parsed result for the stage statistics (result_rows must be
+# picklable as it runs in the workers), and chunk_bytes and result_bytes the
+# bytes read and written. when progress is set, a live rate line is printed
+# to stderr every progress seconds; when profile is set, the reader and
+# writer threads are profiled to <profile>.reader.prof / .writer.prof.
+# returns the per-stage statistics.
+def run_pipeline(read_f: ChunkReader, parse: Callable[[Any],Any],
+                 write: Callable[[Any],None], imapf: ImapF = map,
+                 max_inflight: int = 8, chunk_rows: Callable[[Any],int] = len,
+                 result_rows: Callable[[Any],int] = len,
+                 chunk_bytes: Callable[[Any],int] = lines_bytes,
+                 result_bytes: Callable[[Any],int] = text_bytes,
+                 progress: Optional[float] = None,
+                 profile: Optional[str] = None) -> Dict[str,StageStats]:
+    stats = {s: StageStats(s) for s in MAIN_STAGES + WAIT_STAGES}
+    slots = threading.Semaphore(max_inflight)
+    chunks: Queue = Queue()
+    abort = threading.Event()
+    errors: List[BaseException] = []
+
+    # reader stage: pull chunks from the input until it is exhausted, waiting
+    # for a free slot before each read so that memory stays bounded
+    def reader() -> None:
+        try:
+            while True:
+                start = time.perf_counter()
+                while not slots.acquire(timeout=0.1):
+                    if abort.is_set(): return
+                stats["reader wait"].add(0, time.perf_counter() - start)
+                start = time.perf_counter()
+                chunk = read_f()
+                if chunk == (): break
+                stats["read"].add(chunk_rows(chunk), time.perf_counter() - start, chunk_bytes(chunk))
+                chunks.put(chunk)
+        except BaseException as e:
+            errors.append(e)
+            abort.set()
+        finally:
+            chunks.put(_DONE)
+
+    # hand queued chunks to the parse stage in order
+    def queued() -> Iterator[Any]:
+        while True:
+            chunk = chunks.get()
+            if chunk is _DONE: return
+            yield chunk
+
+    # writer stage: consume parsed results in input order and free a slot
+    # once each chunk has been written. the sub-stage times of each chunk are
+    # added to stages of their own, along with their outcome counts
+    def writer() -> None:
+        try:
+            results = iter(imapf(partial(timed_call, parse, result_rows), queued()))
+            while True:
+                start = time.perf_counter()
+                timed = next(results, _DONE)
+                if timed is _DONE: break
+                stats["writer wait"].add(0, time.perf_counter() - start)
+                result, rows, seconds, stage_times, stage_counts = timed
+                stats["parse"].add(rows, seconds)
+                for name, t in stage_times.items():
+                    stats.setdefault(name, StageStats(name)).add(rows, t)
+                for (name, outcome), n in stage_counts.items():
+                    stats.setdefault(name, StageStats(name)).count(outcome, n)
+                start = time.perf_counter()
+                write(result)
+                stats["write"].add(rows, time.perf_counter() - start, result_bytes(result))
+                slots.release()
+        except BaseException as e:
+            errors.append(e)
+            abort.set()
+
+    # progress stage: print the running totals until the pipeline finishes
+    done = threading.Event()
+    def reporter() -> None:
+        start = time.perf_counter()
+        end = '\r' if sys.stderr.isatty() else '\n'
+        while not done.wait(progress):
+            print(format_progress(stats, time.perf_counter() - start), end=end, file=sys.stderr, flush=True)
+        print(format_progress(stats, time.perf_counter() - start), file=sys.stderr, flush=True)
+
+    if profile is not None:
+        reader = profiled(reader, f"{profile}.reader.prof")
+        writer = profiled(writer, f"{profile}.writer.prof")
+    threads = [threading.Thread(target=reader, name="pipeline-reader", daemon=True),
+               threading.Thread(target=writer, name="pipeline-writer", daemon=True)]
+    for t in threads: t.start()
+    if progress is not None:
+        progress_thread = threading.Thread(target=reporter, name="pipeline-progress", daemon=True)
+        progress_thread.start()
+    for t in threads: t.join()
+    if progress is not None:
+        done.set()
+        progress_thread.join()
+
+    if errors:
+        raise errors[0]
+    return stats
+
+
+# define a function that formats per-stage statistics for the end of run
+# report, including the overall wall time throughput
+def format_stage_report(stats: Dict[str,StageStats], wall_seconds: float) -> str:
+    rows = max((s.rows for s in stats.values()), default=0)
+    lines = [repr(s) for s in stats.values()]
+    lines.append(f"total: {rows} rows in {wall_seconds:.3f}s wall, "
+                 f"{(rows / wall_seconds) if wall_seconds > 0 else 0:.0f} rows/s")
+    return '\n'.join(lines)
+
+# define a function that formats the running totals for the progress line
+def format_progress(stats: Dict[str,StageStats], elapsed: float) -> str:
+    rows = stats["write"].rows
+    rate = rows / elapsed if elapsed > 0 else 0
+    return (f"{rows} rows written, {rate:.0f} rows/s, read {stats['read'].bytes / 1e6:.1f} MB, "
+            f"written {stats['write'].bytes / 1e6:.1f} MB, {elapsed:.0f}s elapsed")
+
+# define a function that builds the end of run report written by --stats-json
+def stage_report(stats: Dict[str,StageStats], wall_seconds: float, **extra: Any) -> Dict[str,Any]:
+    rows = max((s.rows for s in stats.values()), default=0)
+    report = {"wall_seconds": round(wall_seconds, 6), "rows": rows,
+              "rows_per_sec": round(rows / wall_seconds, 1) if wall_seconds > 0 else None,
+              "peak_rss_mb": round(peak_rss_mb(), 1),
+              "stages": {name: s.to_dict() for name, s in stats.items()}}
+    report.update(extra)
+    return report
@@ -0,0 +1,381 @@
+# File Name: plan.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines the ColumnPlan object, compiled once per sumstats file from
+#  its header and the metadata column mapping. the plan holds fixed getters
+#  for the columns present in the file and constants for the missing ones, a
+#  chromosome -> Contig table with the ucsc/simple conversion already applied
+#  and flags for the statistics that have to be derived, so that the per row
+#  and per batch parsing code is straight-line. chunks of lines are split
+#  into fields in one pass over their bytes and only the mapped columns are
+#  decoded. a plan may carry a RowFilter, applied to the numeric columns of
+#  each batch before its string columns are built, and a Harmonizer orienting
+#  the alleles of the rows kept to a reference genome. files without
+#  chromosome and position columns are placed by the rsIDs of their rows
+#  through an RsidIndex. plans pickle to their inputs and are handed to pool
+#  workers once per job by an initializer.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from functools import partial
+from operator import itemgetter
+from typing import Any, Callable, Dict, List, Mapping, Optional, Sequence, Tuple
+from .batch import VariantBatch, contig_codes_dict, interned_column, string_column
+from .contig import Contig
+from .custom_types import BinLines, Tokens
+from .fasta import Harmonizer
+from .filters import RowFilter
+from .rsindex import RsidIndex
+from .instrument import count_rows, stage_timer
+from .io import Delimiter, dec_utf8_and_tokenize, decode_column, split_chunk
+from .stats import compute_zscore, compute_pvalue, compute_logpvalue
+from .stats import StatColumns, derive_stat_columns, missing_column, to_float_column
+from .variant import Variant, TokensBatch, Indices, ConvertChoices, InfoT
+from .variant import make_ucsc_chrom, make_simple_chrom
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+Getter = Callable[[Tokens], Any]
+ColumnF = Callable[[int], List[str]]  # returns the values of a column by index
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+CORE_ATTRS = ('chrom', 'pos', 'id', 'other_allele', 'eff_allele')
+STAT_ATTRS = ('beta', 'beta_se', 'zscore', 'pval', 'logp')
+CONVERTERS: Dict[str, Callable[[str], str]] = {
+    'ucsc': make_ucsc_chrom, 'simple': make_simple_chrom, 'none': str}
+MISSING_PAD = ('.',)  # appended to rows so that missing columns read as '.'
+MISSING_STAT = (None,)
+
+# the plan used by batch_from_shared_plan in this process. it is set in the
+# parent for in-process parsing and by the pool initializer in each worker
+_SHARED: Dict[str, 'ColumnPlan'] = {}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that finds the column index of each attribute in a
+# sumstats header, using '.' for attributes mapped to null or to a column
+# the file does not have
+def column_indices(header: Tokens, columns: Mapping[str, Optional[str]],
+                   attrs: Sequence[str]) -> Indices:
+    return [header.index(columns[a]) if columns.get(a) in header else '.' for a in attrs]
+
+# define a function that compiles a getter returning the tuple of the passed
+# columns of a row. when every column is present this is a bare itemgetter;
+# otherwise missing columns are read from the '.' padded onto the row
+def tuple_getter(indices: Indices) -> Getter:
+    if '.' not in indices and len(indices) > 1:
+        return itemgetter(*indices)
+    get = itemgetter(*[i if i != '.' else -1 for i in indices], -1)
+    return lambda tokens: get(tokens + MISSING_PAD)[:-1]
+
+# define a function that compiles a getter returning one statistic of a row
+# as a one-tuple, or the missing statistic for a column not in the file
+def stat_getter(index: Any) -> Getter:
+    if index == '.':
+        return lambda tokens: MISSING_STAT
+    return lambda tokens: (float(tokens[index]),)
+
+# define a function that builds the table from the chromosome names found in
+# a sumstats file to contigs, for every name that the contig_convert
+# conversion maps onto a contig id
+def contig_table(contigs_dict: Dict[str, Contig], contig_convert: ConvertChoices) -> Dict[str, Contig]:
+    convert = CONVERTERS[contig_convert]
+    table: Dict[str, Contig] = {}
+    for cid, contig in contigs_dict.items():
+        for raw in (cid, make_simple_chrom(cid), make_ucsc_chrom(cid)):
+            if convert(raw) == cid: table.setdefault(raw, contig)
+    return table
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ColumnPlan object
+class ColumnPlan:
+    def __init__(self, core_ind: Indices, stat_ind: Indices, contigs_dict: Dict[str, Contig],
+                 contig_convert: ConvertChoices, ncols: int = 0, delim: Delimiter = None,
+                 row_filter: Optional[RowFilter] = None, harmonizer: Optional[Harmonizer] = None,
+                 rsid_index: Optional[RsidIndex] = None) -> None:
+        self._core_ind = list(core_ind)
+        self._stat_ind = list(stat_ind)
+        self._contigs_dict = contigs_dict
+        self._contig_convert = contig_convert
+        self._ncols = ncols
+        self._delim = delim
+        self._row_filter = row_filter
+        self._harmonizer = harmonizer
+        self._rsid_index = rsid_index
+
+        # compiled state, rebuilt from the inputs above when unpickled
+        self._contigs = tuple(contigs_dict.values())
+        self._convert = CONVERTERS[contig_convert]
+        self._contig_table = contig_table(contigs_dict, contig_convert)
+        codes = contig_codes_dict(self._contigs)
+        self._code_table = {raw: codes[c.get_id()] for raw, c in self._contig_table.items()}
+        self._core = tuple_getter(self._core_ind)
+        self._beta, self._se, self._z, self._p, self._logp = (stat_getter(i) for i in self._stat_ind)
+        self._derive_z, self._derive_p, self._derive_logp = (i == '.' for i in self._stat_ind[2:])
+        self._tokenize = partial(dec_utf8_and_tokenize, delim=delim)
+        self._index_codes: Optional[np.ndarray] = None  # rsid index contig -> contig code, or -1
+
+    # define getters
+    def get_core_indices(self) -> Indices:
+        return self._core_ind
+
+    def get_stat_indices(self) -> Indices:
+        return self._stat_ind
+
+    def get_contigs(self) -> Tuple[Contig,...]:
+        return self._contigs
+
+    def get_contig_convert(self) -> ConvertChoices:
+        return self._contig_convert
+
+    def get_delimiter(self) -> Delimiter:
+        return self._delim
+
+    def get_row_filter(self) -> Optional[RowFilter]:
+        return self._row_filter
+
+    def get_harmonizer(self) -> Optional[Harmonizer]:
+        return self._harmonizer
+
+    def get_rsid_index(self) -> Optional[RsidIndex]:
+        return self._rsid_index
+
+    # define pickling as the inputs of the plan; the getters are compiled
+    # again in the receiving process
+    def __reduce__(self) -> Tuple[type, Tuple[Any,...]]:
+        return (ColumnPlan, (self._core_ind, self._stat_ind, self._contigs_dict, self._contig_convert,
+                             self._ncols, self._delim, self._row_filter, self._harmonizer,
+                             self._rsid_index))
+
+    # define a representation of the plan on print readouts
+    def __repr__(self) -> str:
+        return (f"ColumnPlan(core={self._core_ind}, stats={self._stat_ind}, "
+                f"{len(self._contigs)} contigs, convert={self._contig_convert}, filter={self._row_filter}, "
+                f"harmonizer={self._harmonizer}, rsid_index={self._rsid_index})")
+
+
+    # define a function that returns the contig for a chromosome name from
+    # the file. names outside the precomputed table are converted and cached,
+    # raising KeyError if the contig is unknown
+    def contig_of(self, chrom: str) -> Contig:
+        contig = self._contig_table.get(chrom)
+        if contig is None:
+            contig = self._contigs_dict[self._convert(chrom)]
+            self._contig_table[chrom] = contig
+            self._code_table[chrom] = self._contigs.index(contig)
+        return contig
+
+    # define a function that returns the info dictionary of one row,
+    # deriving the statistics whose columns are missing from the file
+    def info(self, tokens: Tokens) -> InfoT:
+        beta = self._beta(tokens)
+        beta_se = self._se(tokens)
+        zscore = compute_zscore((beta, beta_se)) if self._derive_z else self._z(tokens)
+        pval = compute_pvalue(zscore) if self._derive_p else self._p(tokens)
+        logp = compute_logpvalue(pval) if self._derive_logp else self._logp(tokens)
+        return {"BETA": beta, "SE": beta_se, "Z": zscore, "P": pval, "LOGP": logp}
+
+    # define a function that builds the Variant of one row. this is the
+    # compiled counterpart of variant.variant_from_tokens
+    def variant(self, tokens: Tokens) -> Variant:
+        chrom, pos, name, ref, alt = self._core(tokens)
+        return Variant(contig=self.contig_of(chrom), pos=int(pos), name=name, ref=ref, alt=alt,
+                       filt='.', qual='.', info=self.info(tokens))
+
+    # define a function that returns the contig codes of a column of
+    # chromosome names, adding any name missing from the table first
+    def contig_codes(self, chroms: List[str]) -> np.ndarray:
+        table = self._code_table
+        try:
+            return np.array([table[c] for c in chroms], dtype=np.int32)
+        except KeyError:
+            for c in set(chroms).difference(table): self.contig_of(c)
+            return np.array([table[c] for c in chroms], dtype=np.int32)
+
+    # define a function that returns the contig code of a chromosome name,
+    # or -1 if the contig is unknown
+    def contig_code(self, chrom: str) -> int:
+        try:
+            self.contig_of(chrom)
+        except KeyError:
+            return -1
+        return self._code_table[chrom]
+
+    # define a function that places rows by their rsIDs with the plan's rsid
+    # index. returns the rows found on a contig of the plan, with their contig
+    # codes and positions, and their names and alleles; alleles the file has
+    # no column for are taken from the index
+    def locate(self, name_col: List[str], ref_col: List[str],
+               alt_col: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray, List[str], List[str], List[str]]:
+        with stage_timer("locate"):
+            index = self._rsid_index
+            if self._index_codes is None:
+                self._index_codes = np.array([self.contig_code(c) for c in index.contigs], dtype=np.int32)
+            found, contig, pos, pairs = index.locate(name_col)
+            codes = np.full(len(found), -1, dtype=np.int32)
+            codes[found] = self._index_codes[contig[found]]
+            rows = np.flatnonzero(codes >= 0)
+            nfound = int(found.sum())
+            count_rows("locate", "placed", len(rows))
+            if nfound < len(found): count_rows("locate", "not in index", len(found) - nfound)
+            if len(rows) < nfound: count_rows("locate", "off contigs", nfound - len(rows))
+            keep = rows.tolist()
+            name_col, ref_col, alt_col = ([col[i] for i in keep] for col in (name_col, ref_col, alt_col))
+            if pairs is not None and '.' in self._core_ind[3:5]:
+                refs, alts = index.alleles(pairs[rows])
+                if self._core_ind[3] == '.': ref_col = refs
+                if self._core_ind[4] == '.': alt_col = alts
+            return rows, codes[rows], pos[rows], name_col, ref_col, alt_col
+
+    # define a function that builds a VariantBatch of n rows from a function
+    # returning the decoded values of a column by its index. with an rsid
+    # index the rows are placed by their rsIDs, dropping those it cannot
+    # place. unless finished is false, the rows failing the row filter are
+    # dropped once the numeric columns are built, so only kept rows get
+    # string columns, and the kept rows are harmonized
+    def batch_from_columns(self, n: int, column: ColumnF, finished: bool = True) -> VariantBatch:
+        located = None
+        with stage_timer("build"):
+            chrom_col, pos_col, name_col, ref_col, alt_col = (
+                column(i) if i != '.' else ['.'] * n for i in self._core_ind)
+            if self._rsid_index is None:
+                contig_codes = self.contig_codes(chrom_col)
+                pos = np.array(pos_col, dtype=np.int64)
+        if self._rsid_index is not None:
+            located, contig_codes, pos, name_col, ref_col, alt_col = self.locate(name_col, ref_col, alt_col)
+        with stage_timer("stats"):
+            stats = self.stat_columns(n, column)
+            if located is not None: stats = {k: v[located] for k, v in stats.items()}
+        if finished and self._row_filter is not None:
+            with stage_timer("filter"):
+                keep = np.flatnonzero(self._row_filter.mask(contig_codes, pos, stats))
+                contig_codes, pos = contig_codes[keep], pos[keep]
+                stats = {k: v[keep] for k, v in stats.items()}
+                rows = keep.tolist()
+                name_col, ref_col, alt_col = ([col[i] for i in rows] for col in (name_col, ref_col, alt_col))
+        with stage_timer("build"):
+            names, refs, alts = string_column(name_col), interned_column(ref_col), interned_column(alt_col)
+        batch = VariantBatch(
+            contigs = self._contigs,
+            contig_codes = contig_codes,
+            pos = pos,
+            names = names,
+            refs = refs,
+            alts = alts,
+            stats = stats
+        )
+        if finished and self._harmonizer is not None:
+            return self._harmonizer.harmonize(batch)
+        return batch
+
+    # define a function that drops the rows of a batch failing the row
+    # filter and harmonizes the rest, e.g. for a batch built with finished
+    # false or read from a cache
+    def finish_batch(self, batch: VariantBatch) -> VariantBatch:
+        if self._row_filter is not None:
+            with stage_timer("filter"):
+                batch = batch.filter(self._row_filter.mask(batch.get_contig_codes(), batch.get_pos(),
+                                                           batch.get_stats()))
+        if self._harmonizer is not None:
+            batch = self._harmonizer.harmonize(batch)
+        return batch
+
+    # define a function that converts the statistic columns of n rows to
+    # floats and derives the missing ones
+    def stat_columns(self, n: int, column: ColumnF) -> StatColumns:
+        raw = [to_float_column(column(i)) if i != '.' else missing_column(n) for i in self._stat_ind]
+        return derive_stat_columns(*raw)
+
+    # define a function that builds the VariantBatch of a batch of token
+    # rows. this is the compiled counterpart of batch.batch_from_tokens
+    def batch(self, tokens_batch: TokensBatch) -> VariantBatch:
+        return self.batch_from_columns(len(tokens_batch), lambda i: list(map(itemgetter(i), tokens_batch)))
+
+    # define a function that splits a batch of binary sumstats lines into
+    # columns, returning the number of rows and a function returning the
+    # decoded values of a column by index. the chunk is split into fields in
+    # one pass over its bytes and only the mapped columns are decoded, one
+    # decode per column; chunks with blank or ragged lines are tokenized line
+    # by line
+    def columns_from_lines(self, binary_lines: BinLines) -> Tuple[int, ColumnF]:
+        with stage_timer("decode"):
+            fields = split_chunk(binary_lines, self._ncols, self._delim) if self._ncols > 0 else None
+            if fields is None:
+                tokens_batch = tuple(map(self._tokenize, binary_lines))
+                return len(tokens_batch), lambda i: list(map(itemgetter(i), tokens_batch))
+            used = {i for i in self._core_ind + self._stat_ind if i != '.'}
+            columns = {i: decode_column(fields[i::self._ncols]) for i in used}
+            return len(binary_lines), columns.__getitem__
+
+    # define a function that returns the chromosome names of a batch, as
+    # written in the file, from the columns returned by columns_from_lines
+    def chrom_column(self, n: int, column: ColumnF) -> List[str]:
+        return column(self._core_ind[0]) if self._core_ind[0] != '.' else ['.'] * n
+
+    # define a function that returns the contig id of a chromosome name from
+    # the file, or its converted name if the contig is unknown
+    def chrom_id(self, chrom: str) -> str:
+        contig = self._contig_table.get(chrom)
+        return contig.get_id() if contig is not None else self._convert(chrom)
+
+    # define a function that returns the contig id (as chrom_id) and the
+    # position of one binary sumstats line
+    def locus(self, binary_line: bytes) -> Tuple[str, int]:
+        chrom, pos = self._core(self._tokenize(binary_line))[:2]
+        return (self.chrom_id(chrom), int(pos))
+
+    # define a function that builds the VariantBatch of a batch of binary
+    # sumstats lines
+    def batch_from_lines(self, binary_lines: BinLines) -> VariantBatch:
+        return self.batch_from_columns(*self.columns_from_lines(binary_lines))
+
+    # define property objects to enforce getters
+    core_indices = property(get_core_indices)
+    stat_indices = property(get_stat_indices)
+    contigs = property(get_contigs)
+    contig_convert = property(get_contig_convert)
+    delimiter = property(get_delimiter)
+    row_filter = property(get_row_filter)
+    harmonizer = property(get_harmonizer)
+    rsid_index = property(get_rsid_index)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that compiles the ColumnPlan of a sumstats file from its
+# header tokens, split on the file's delimiter, and the 'columns' mapping of
+# its metadata, optionally applying a row filter and a harmonizer and placing
+# rows through an rsid index
+def compile_column_plan(header: Tokens, columns: Mapping[str, Optional[str]],
+                        contigs_dict: Dict[str, Contig], contig_convert: ConvertChoices,
+                        delim: Delimiter = None, row_filter: Optional[RowFilter] = None,
+                        harmonizer: Optional[Harmonizer] = None,
+                        rsid_index: Optional[RsidIndex] = None) -> ColumnPlan:
+    return ColumnPlan(column_indices(header, columns, CORE_ATTRS),
+                      column_indices(header, columns, STAT_ATTRS), contigs_dict, contig_convert,
+                      len(header), delim, row_filter, harmonizer, rsid_index)
+
+# define a function that sets the plan used by batch_from_shared_plan in this
+# process. it is also the pool initializer, so the plan is pickled once per
+# worker rather than with every chunk
+def share_column_plan(plan: ColumnPlan) -> None:
+    _SHARED["plan"] = plan
+
+# define a function that builds the VariantBatch of a chunk of binary lines
+# with the shared plan. this is the parse function handed to the pool
+def batch_from_shared_plan(binary_lines: BinLines) -> VariantBatch:
+    return _SHARED["plan"].batch_from_lines(binary_lines)
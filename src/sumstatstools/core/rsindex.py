@@ -0,0 +1,335 @@
+# File Name: rsindex.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines a compact on-disk index from rsIDs to the contig, position
+#  and alleles of a variant, built from a dbSNP style vcf, for sumstats that
+#  give rsIDs but no coordinates. rsIDs are stored as integers in a sorted
+#  uint32 column beside a uint16 contig code, a uint32 position and a uint32
+#  code into a table of REF/ALT pairs, each column a raw binary file that is
+#  memory-mapped when the index is opened. a batch of rsIDs is looked up with
+#  one searchsorted over the mapped rsid column, so only the pages on the
+#  search paths and the rows found are read. the index is built with an
+#  external bucket sort: records are appended to files by the high bits of
+#  their rsid, and each bucket is then sorted in memory on its own. REF/ALT
+#  pairs are appended to the pair table on disk as they are first seen, with
+#  only the most common pairs kept in memory to reuse their codes.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import json
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from typing import Any, BinaryIO, Dict, List, Optional, Sequence, Tuple
+from .custom_types import BinLines
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+# the records parsed from a chunk of vcf lines, with the chunk's own tables
+# of contig names and REF/ALT pairs that its codes index into
+ParsedRecords = Dict[str, Any]
+Located = Tuple[np.ndarray, np.ndarray, np.ndarray, Optional[np.ndarray]]  # found, contig, pos, alleles
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+INDEX_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+MAX_RSID = np.iinfo(np.uint32).max
+BUCKET_SHIFT = 22  # rsids per bucket file (4M), sorted in memory one at a time
+PAIR_CACHE = 1 << 20  # REF/ALT pairs whose codes are kept in memory and reused
+MAX_PAIRS = np.iinfo(np.uint32).max
+RECORD = np.dtype([("rsid", "<u4"), ("contig", "<u2"), ("pos", "<u4"), ("alleles", "<u4")])
+COLUMNS: Dict[str, Any] = {name: RECORD.fields[name][0] for name in RECORD.names}
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the integer rsids of a column of variant
+# names, with 0 (no rsid is 0) for names that are not rsIDs
+def rsid_column(names: Sequence[str]) -> np.ndarray:
+    return np.fromiter((int(n[2:]) if n[:2] == 'rs' and n[2:].isdigit() else 0 for n in names),
+                       dtype=np.uint64, count=len(names))
+
+# define a function that parses a chunk of binary vcf data lines to the rsid,
+# contig, position and REF/ALT pair of each record with an rsID. a record
+# with several rsIDs (rs1;rs2) gives one row per rsID. this is the parse
+# function handed to the pool
+def parse_vcf_records(binary_lines: BinLines, alleles: bool = True) -> ParsedRecords:
+    contigs: Dict[bytes, int] = {}
+    pairs: Dict[bytes, int] = {}
+    rsids, codes, pos, pair_codes = [], [], [], []
+    for line in binary_lines:
+        fields = line.split(b'\t', 5)
+        if len(fields) < 5 or line[:1] == b'#': continue
+        for ident in fields[2].split(b';'):
+            if ident[:2] != b'rs' or not ident[2:].isdigit(): continue
+            rsids.append(int(ident[2:]))
+            codes.append(contigs.setdefault(fields[0], len(contigs)))
+            pos.append(int(fields[1]))
+            if alleles: pair_codes.append(pairs.setdefault(fields[3] + b'\t' + fields[4].rstrip(), len(pairs)))
+    return {"rsid": np.array(rsids, dtype=np.uint64), "contig": np.array(codes, dtype=np.int64),
+            "pos": np.array(pos, dtype=np.int64), "alleles": np.array(pair_codes, dtype=np.int64),
+            "contigs": [c.decode('utf-8') for c in contigs], "pairs": [p.decode('utf-8') for p in pairs]}
+
+# define a function that returns the names of the column files of an index,
+# which has an alleles column only when it was built with alleles
+def index_columns(alleles: bool) -> List[str]:
+    return [name for name in COLUMNS if alleles or name != "alleles"]
+
+# define a function that returns the number of records in a parsed chunk
+def parsed_rows(parsed: ParsedRecords) -> int:
+    return len(parsed["rsid"])
+
+# define a function that reads a two column file renaming contigs, as for
+# bcftools annotate --rename-chrs (e.g. NC_000001.11 -> chr1)
+def read_contig_renames(path: str) -> Dict[str, str]:
+    with open(path, 'r') as fobj:
+        return dict(line.split()[:2] for line in fobj if line.strip())
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the RsidIndexWriter object, which appends parsed chunks of a vcf to
+# bucket files of packed records under a temporary directory, and on close()
+# sorts each bucket by rsid into the column files of the index. rsids seen
+# more than once keep their first record. each REF/ALT pair gets a code when
+# first seen and is appended to the pair table file; the codes of the first
+# PAIR_CACHE pairs (the SNVs and common indels of any large vcf) are reused,
+# while rarer pairs past the cache are appended again where they recur, so
+# memory stays bounded however many distinct indel alleles the vcf holds.
+# the index is built in a hidden directory and renamed to path once complete
+class RsidIndexWriter:
+    def __init__(self, path: str, alleles: bool = True, renames: Optional[Dict[str, str]] = None,
+                 tmp_dir: Optional[str] = None) -> None:
+        self._path = path
+        self._tmp = f"{path}.{os.getpid()}.tmp"
+        self._alleles = alleles
+        self._renames = renames or {}
+        self._bucket_dir = tempfile.mkdtemp(prefix="rsindex.", dir=tmp_dir)
+        self._buckets: Dict[int, int] = {}
+        self._contigs: Dict[str, int] = {}
+        self._pairs: Dict[str, int] = {}
+        self._npairs = 0
+        self._pair_bytes = 0
+        self._pairs_fobj = open(os.path.join(self._bucket_dir, "pairs.bin"), 'wb')
+        self._offsets_fobj = open(os.path.join(self._bucket_dir, "pairs.off.bin"), 'wb')
+        self._offsets_fobj.write(np.zeros(1, dtype=np.int64).tobytes())
+        self._records = 0
+        self._duplicates = 0
+        self._rows = 0
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_duplicates(self) -> int:
+        return self._duplicates
+
+    # define a representation of the writer on print readouts
+    def __repr__(self) -> str:
+        return f"RsidIndexWriter({self._path}, {self._records} records)"
+
+
+    # define a function that appends a parsed chunk to the bucket files,
+    # renumbering its contig and REF/ALT pair codes into the index tables
+    def append(self, parsed: ParsedRecords) -> None:
+        n = len(parsed["rsid"])
+        if n == 0: return
+        if int(parsed["rsid"].max()) > MAX_RSID:
+            raise ValueError(f"rsid rs{int(parsed['rsid'].max())} does not fit the index's uint32 rsid column")
+        contigs = np.array([self._contigs.setdefault(self._renames.get(c, c), len(self._contigs))
+                            for c in parsed["contigs"]], dtype=np.int64)
+        if len(self._contigs) > np.iinfo(np.uint16).max + 1:
+            raise ValueError("too many contigs for the index's uint16 contig column")
+        records = np.empty(n, dtype=RECORD)
+        records["rsid"] = parsed["rsid"]
+        records["contig"] = contigs[parsed["contig"]]
+        records["pos"] = parsed["pos"]
+        records["alleles"] = 0
+        if self._alleles:
+            records["alleles"] = self.pair_codes(parsed["pairs"])[parsed["alleles"]]
+        buckets = records["rsid"] >> BUCKET_SHIFT
+        order = np.argsort(buckets, kind='stable')
+        records, buckets = records[order], buckets[order]
+        starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+        for start, end in zip(starts.tolist(), starts[1:].tolist() + [n]):
+            bucket = int(buckets[start])
+            with open(os.path.join(self._bucket_dir, f"{bucket}.bin"), 'ab') as fobj:
+                fobj.write(records[start:end].tobytes())
+            self._buckets[bucket] = self._buckets.get(bucket, 0) + end - start
+        self._records += n
+
+    # define a function that returns the index codes of a chunk's table of
+    # REF/ALT pairs, appending the pairs without a cached code to the pair
+    # table file
+    def pair_codes(self, pairs: Sequence[str]) -> np.ndarray:
+        codes = np.empty(len(pairs), dtype=np.int64)
+        added: List[bytes] = []
+        for i, pair in enumerate(pairs):
+            code = self._pairs.get(pair)
+            if code is None:
+                code = self._npairs + len(added)
+                added.append(pair.encode('utf-8') + b'\n')
+                if len(self._pairs) < PAIR_CACHE: self._pairs[pair] = code
+            codes[i] = code
+        if added:
+            if self._npairs + len(added) > MAX_PAIRS:
+                raise ValueError("too many REF/ALT pairs for the index's uint32 alleles column")
+            ends = self._pair_bytes + np.cumsum([len(a) for a in added], dtype=np.int64)
+            self._pairs_fobj.write(b''.join(added))
+            self._offsets_fobj.write(ends.tobytes())
+            self._npairs += len(added)
+            self._pair_bytes = int(ends[-1])
+        return codes
+
+    # define a function that sorts each bucket and writes the index, with its
+    # manifest, moving it into place at path. an index without alleles has
+    # no alleles column
+    def close(self, source: Optional[str] = None) -> None:
+        os.makedirs(self._tmp, exist_ok=True)
+        files: Dict[str, BinaryIO] = {name: open(os.path.join(self._tmp, f"{name}.bin"), 'wb')
+                                      for name in index_columns(self._alleles)}
+        try:
+            for bucket in sorted(self._buckets):
+                records = np.fromfile(os.path.join(self._bucket_dir, f"{bucket}.bin"), dtype=RECORD)
+                records = records[np.argsort(records["rsid"], kind='stable')]
+                first = np.concatenate(([True], records["rsid"][1:] != records["rsid"][:-1]))
+                self._duplicates += int(len(records) - first.sum())
+                records = records[first]
+                for name in files:
+                    files[name].write(np.ascontiguousarray(records[name]).tobytes())
+                self._rows += len(records)
+                os.remove(os.path.join(self._bucket_dir, f"{bucket}.bin"))
+        finally:
+            for fobj in files.values(): fobj.close()
+        self._pairs_fobj.close()
+        self._offsets_fobj.close()
+        for name in ("pairs.bin", "pairs.off.bin"):
+            shutil.move(os.path.join(self._bucket_dir, name), os.path.join(self._tmp, name))
+        manifest = {"version": INDEX_VERSION, "rows": self._rows, "duplicates": self._duplicates,
+                    "contigs": list(self._contigs), "pairs": self._npairs, "alleles": self._alleles,
+                    "source": os.path.abspath(source) if source is not None else None,
+                    "created": time.time()}
+        with open(os.path.join(self._tmp, MANIFEST_NAME), 'w') as jobj:
+            json.dump(manifest, jobj, indent=2)
+        shutil.rmtree(self._bucket_dir, ignore_errors=True)
+        os.rename(self._tmp, self._path)
+
+    # define a function that discards the buckets and a partly written index
+    def abort(self) -> None:
+        self._pairs_fobj.close()
+        self._offsets_fobj.close()
+        shutil.rmtree(self._bucket_dir, ignore_errors=True)
+        shutil.rmtree(self._tmp, ignore_errors=True)
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    rows = property(get_rows)
+    duplicates = property(get_duplicates)
+
+
+# define the RsidIndex object, which memory-maps the columns of an index.
+# indexes pickle to their path and are mapped again in the receiving process
+class RsidIndex:
+    def __init__(self, path: str) -> None:
+        self._path = path
+        with open(os.path.join(path, MANIFEST_NAME), 'r') as jobj:
+            self._manifest = json.load(jobj)
+        if self._manifest.get("version") != INDEX_VERSION:
+            raise ValueError(f"{path} is an rsid index of another version, build it again")
+        rows = self._manifest["rows"]
+        self._columns = {name: self.map_column(name, COLUMNS[name], rows)
+                         for name in index_columns(self._manifest["alleles"])}
+        self._pairs = self.map_column("pairs", np.uint8, os.path.getsize(os.path.join(path, "pairs.bin")))
+        self._pair_offsets = self.map_column("pairs.off", np.int64, self._manifest["pairs"] + 1)
+
+    # define a function that memory-maps one column file of the index
+    def map_column(self, name: str, dtype: Any, length: int) -> np.ndarray:
+        if length == 0: return np.empty(0, dtype=dtype)
+        return np.memmap(os.path.join(self._path, f"{name}.bin"), dtype=dtype, mode='r', shape=(length,))
+
+    # define getters
+    def get_path(self) -> str:
+        return self._path
+
+    def get_rows(self) -> int:
+        return self._manifest["rows"]
+
+    def get_contigs(self) -> List[str]:
+        return self._manifest["contigs"]
+
+    def get_has_alleles(self) -> bool:
+        return self._manifest["alleles"]
+
+    # define pickling as the path of the index
+    def __reduce__(self) -> Tuple[type, Tuple[str]]:
+        return (RsidIndex, (self._path,))
+
+    # define a representation of the index on print readouts
+    def __repr__(self) -> str:
+        return f"RsidIndex({self._path}, {self.get_rows()} rsids)"
+
+
+    # define a function that returns whether each of an array of integer
+    # rsids is in the index, and its row. the rsids are searched in sorted
+    # order, so that consecutive searches share the pages of the mapped
+    # column on their paths
+    def lookup(self, rsids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        column = self._columns["rsid"]
+        found = np.zeros(len(rsids), dtype=bool)
+        rows = np.zeros(len(rsids), dtype=np.int64)
+        valid = np.flatnonzero((rsids > 0) & (rsids <= MAX_RSID))
+        if len(column) == 0 or len(valid) == 0: return found, rows
+        keys = rsids[valid].astype(column.dtype)
+        order = np.argsort(keys, kind='stable')
+        at = np.minimum(np.searchsorted(column, keys[order]), len(column) - 1)
+        hit = column[at] == keys[order]
+        found[valid[order]] = hit
+        rows[valid[order]] = at
+        return found, rows
+
+    # define a function that looks up a column of variant names, returning
+    # whether each was found and the contig code (into get_contigs()),
+    # position and REF/ALT pair code of its row. pair codes are None for an
+    # index built without alleles
+    def locate(self, names: Sequence[str]) -> Located:
+        found, rows = self.lookup(rsid_column(names))
+        rows = rows[found]
+        contig = np.zeros(len(found), dtype=np.int64)
+        pos = np.zeros(len(found), dtype=np.int64)
+        contig[found] = self._columns["contig"][rows]
+        pos[found] = self._columns["pos"][rows]
+        pairs = None
+        if self.get_has_alleles():
+            pairs = np.zeros(len(found), dtype=np.int64)
+            pairs[found] = self._columns["alleles"][rows]
+        return found, contig, pos, pairs
+
+    # define a function that returns the REF and ALT alleles of an array of
+    # pair codes, decoding each distinct pair once
+    def alleles(self, pairs: np.ndarray) -> Tuple[List[str], List[str]]:
+        offsets = self._pair_offsets
+        table = {p: bytes(self._pairs[offsets[p]:offsets[p + 1] - 1]).decode('utf-8').split('\t', 1)
+                 for p in set(pairs.tolist())}
+        refs = [table[p][0] for p in pairs.tolist()]
+        alts = [table[p][1] for p in pairs.tolist()]
+        return refs, alts
+
+    # define property objects to enforce getters
+    path = property(get_path)
+    rows = property(get_rows)
+    contigs = property(get_contigs)
+    has_alleles = property(get_has_alleles)
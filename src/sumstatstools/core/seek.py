@@ -0,0 +1,209 @@
+# File Name: seek.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines readers that only read the parts of a sumstats file around
+#  a set of regions. for bgzf input with a tabix index the index gives the
+#  virtual offset of each region. for uncompressed input sorted by position
+#  within contiguous chromosome blocks, the blocks are found by probing byte
+#  offsets and each region start by bisecting its block. reading a region
+#  stops at the first chunk running past it, and the plan's row filter drops
+#  the rows read around the regions.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+from itertools import dropwhile, islice
+from typing import BinaryIO, Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Set, Tuple
+from .custom_types import BinLines, BinLinesGenerator
+from .filters import Region
+from .tabix import TabixIndex
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+class Probe(NamedTuple):
+    offset: int  # offset of the first byte of the line
+    chrom: Optional[str]  # None past the end of the file
+    pos: int
+
+LocusF = Callable[[bytes], Tuple[str, int]]  # contig id and position of a line
+OpenAtF = Callable[[int], BinaryIO]  # opens the input positioned at an offset
+RegionSeek = Tuple[int, Region]  # offset to start reading a region from, and the region
+Span = Tuple[int, int]  # offsets of the lines just before and just after a chromosome block
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+PROBES = 256  # evenly spaced probes locating the chromosome blocks of a sorted file
+MIN_GAP = 64 * 1024  # gaps below this many bytes are read line by line rather than probed
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the locus of the first non-blank line
+# starting at or after offset, between the first data line at start and the
+# end of the file at size
+def probe(fobj: BinaryIO, offset: int, start: int, size: int, locus: LocusF) -> Probe:
+    if offset <= start:
+        fobj.seek(start)
+    else:
+        fobj.seek(offset - 1)
+        fobj.readline()
+    while True:
+        at = fobj.tell()
+        line = fobj.readline()
+        if line == b'': return Probe(size, None, -1)
+        if line.strip():
+            chrom, pos = locus(line)
+            return Probe(at, chrom, pos)
+
+# define a function that returns the loci of every non-blank line starting
+# in [begin, end)
+def read_probes(fobj: BinaryIO, begin: int, end: int, locus: LocusF) -> List[Probe]:
+    probes = []
+    fobj.seek(begin)
+    while True:
+        at = fobj.tell()
+        line = fobj.readline()
+        if at >= end or line == b'': return probes
+        if line.strip():
+            chrom, pos = locus(line)
+            probes.append(Probe(at, chrom, pos))
+
+# define a function that opens a file for binary reading at a byte offset
+def open_at_offset(path: str, offset: int) -> BinaryIO:
+    fobj = open(path, 'rb')
+    fobj.seek(offset)
+    return fobj
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that locates the chromosome blocks of a file sorted by
+# position within contiguous chromosome blocks, whose data lines run from
+# start to size. the file is probed at evenly spaced offsets; gaps between
+# probes on different chromosomes are bisected, and read line by line once
+# small, so every block boundary is found exactly. returns the span of each
+# chromosome
+def chromosome_spans(fobj: BinaryIO, start: int, size: int, locus: LocusF,
+                     probes: int = PROBES) -> Dict[str, Span]:
+    points = {p.offset: p for p in (probe(fobj, start + (size - start) * i // probes, start, size, locus)
+                                    for i in range(probes))}
+    points[size] = Probe(size, None, -1)
+    offsets = sorted(points)
+    gaps = [(a, b) for a, b in zip(offsets, offsets[1:]) if points[a].chrom != points[b].chrom]
+    while gaps:
+        a, b = gaps.pop()
+        if b - a > MIN_GAP:
+            mid = probe(fobj, (a + b) // 2, start, size, locus)
+            if a < mid.offset < b:
+                points[mid.offset] = mid
+                gaps.extend(g for g in ((a, mid.offset), (mid.offset, b))
+                            if points[g[0]].chrom != points[g[1]].chrom)
+                continue
+        points.update((p.offset, p) for p in read_probes(fobj, a, b, locus))
+
+    spans: Dict[str, Span] = {}
+    ordered = [points[o] for o in sorted(points)]
+    for i, p in enumerate(ordered):
+        if p.chrom is None: continue
+        before = ordered[i - 1].offset if i > 0 and ordered[i - 1].chrom != p.chrom else None
+        lo, _ = spans.get(p.chrom, (before if before is not None else p.offset, 0))
+        spans[p.chrom] = (lo, ordered[i + 1].offset)
+    return spans
+
+# define a function that returns an offset at or before the first line of a
+# region within the span of its chromosome, bisecting on position
+def bisect_region(fobj: BinaryIO, span: Span, region: Region, start: int, size: int,
+                  locus: LocusF) -> int:
+    lo, hi = span
+    while hi - lo > MIN_GAP:
+        p = probe(fobj, (lo + hi) // 2, start, size, locus)
+        if p.offset >= hi: break
+        if p.chrom == region.chrom and p.pos < region.start:
+            lo = p.offset
+        else:
+            hi = p.offset
+    return lo
+
+# define a function that returns where to start reading each region of a
+# sorted, uncompressed file, in file order. regions on chromosomes missing
+# from the file are dropped
+def sorted_region_seeks(path: str, start: int, regions: Sequence[Region], locus: LocusF) -> List[RegionSeek]:
+    with open(path, 'rb') as fobj:
+        fobj.seek(0, 2)
+        size = fobj.tell()
+        spans = chromosome_spans(fobj, start, size, locus)
+        seeks = [(bisect_region(fobj, spans[r.chrom], r, start, size, locus), r)
+                 for r in regions if r.chrom in spans]
+    return sorted(seeks, key=lambda s: s[0])
+
+# define a function that returns the virtual offset to start reading each
+# region of a tabix indexed bgzf file, in file order. contig_id maps the
+# chromosome names of the index to contig ids (e.g. ColumnPlan.chrom_id)
+def tabix_region_seeks(index: TabixIndex, regions: Sequence[Region],
+                       contig_id: Callable[[str], str]) -> List[RegionSeek]:
+    seeks = []
+    for region in regions:
+        offsets = [index.query(name, region.start - 1, region.end) for name in index.names
+                   if contig_id(name) == region.chrom]
+        offsets = [o for o in offsets if o is not None]
+        if offsets: seeks.append((min(offsets), region))
+    return sorted(seeks, key=lambda s: s[0])
+
+# define a function that returns an anonymous callable object producing
+# chunks of chunk_size lines around each region, like io.generate_file_reader.
+# each region is read from its seek offset until a chunk ends past it. as the
+# seeks are in file order, the lines from where the file was last opened up
+# to the last line read have all been read: a region on a chromosome read
+# past since then is skipped, a region already reached on the current one is
+# read on without seeking, and a reopened file drops its lines until one is
+# on the region's chromosome and past the last line read there, since a seek
+# offset may fall up to MIN_GAP bytes or a chromosome block early. so no line
+# is read twice
+def generate_region_reader(open_at: OpenAtF, seeks: Sequence[RegionSeek], locus: LocusF,
+                           chunk_size: int = 5000) -> BinLinesGenerator:
+    def chunks() -> Iterator[BinLines]:
+        fobj: Optional[BinaryIO] = None
+        last: Optional[Tuple[str, int]] = None
+        seen: Set[str] = set()  # chromosomes read since the file was opened
+        skip_to: Optional[Tuple[str, int]] = None  # chromosome and position to read past on reopening
+        def skipped(line: bytes) -> bool:
+            chrom, pos = locus(line)
+            return chrom != skip_to[0] or pos <= skip_to[1]
+        try:
+            for offset, region in seeks:
+                current = last is not None and last[0] == region.chrom
+                if region.chrom in seen and not current: continue
+                reached = current and last[1] >= region.start
+                if reached and last[1] > region.end: continue
+                if not reached:
+                    if fobj is not None: fobj.close()
+                    fobj = open_at(offset)
+                    skip_to = last if current else (region.chrom, -1)
+                    seen = set()
+                while True:
+                    lines = tuple(islice(fobj, chunk_size))
+                    if lines == ():
+                        last = None
+                        break
+                    lines = tuple(l for l in lines if l.strip())
+                    if skip_to is not None:
+                        lines = tuple(dropwhile(skipped, lines))
+                        if lines != (): skip_to = None
+                    if lines == (): continue
+                    yield lines
+                    first, last = locus(lines[0]), locus(lines[-1])
+                    seen.update((first[0], last[0]) if first[0] == last[0] else
+                                (locus(l)[0] for l in lines))
+                    if last[0] != region.chrom or last[1] > region.end: break
+        finally:
+            if fobj is not None: fobj.close()
+
+    remaining = chunks()
+    return lambda: next(remaining, ())
@@ -0,0 +1,184 @@
+# File Name: sort.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines coordinate sorting of vcf output. workers attach a sort key
+#  (contig order in the chrom.sizes file, then position) to each record of
+#  the text they format, and the writer hands the keyed text to an
+#  ExternalSorter. records are sorted in memory with a stable argsort on the
+#  keys while they fit under a memory cap; past the cap the sorted buffer is
+#  spilled to disk as a run and the runs are k-way merged at the end.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import heapq
+import os
+import shutil
+import tempfile
+import time
+import numpy as np
+from itertools import chain, islice
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from .contig import Contig
+
+
+# type aliases
+# -----------------------------------------------------------------------------
+
+ContigOrder = Dict[str, int]  # contig id -> rank in the chrom.sizes file
+KeyArray = np.ndarray  # int64 sort keys, contig rank << 32 | position
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+SORT_MEMORY_BYTES = 1024 * 1024 * 1024  # default cap on records buffered before spilling
+LINE_OVERHEAD = 64  # approximate bytes held per buffered record besides its text
+KEY_SHIFT = 32  # positions are below 2**32, so the contig rank sits above them
+KEY_WIDTH = 16  # hex digits of a key prefixed to each line of a spilled run
+WRITE_LINES = 10000  # number of sorted lines joined into each write
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the rank of each contig, in the order of
+# the chrom.sizes file
+def contig_order(contigs: Iterable[Contig]) -> ContigOrder:
+    return {c.get_id(): i for i, c in enumerate(contigs)}
+
+# define a function that splits vcf text into its lines, without newlines
+def text_lines(text: str) -> List[str]:
+    return text[:-1].split('\n') if text != '' else []
+
+# define a function that returns the sort key of each record of vcf text.
+# contigs missing from the order sort after all known contigs
+def text_keys(text: str, order: ContigOrder) -> KeyArray:
+    fields = [line.split('\t', 2) for line in text_lines(text)]
+    unknown = len(order)
+    ranks = np.array([order.get(f[0], unknown) for f in fields], dtype=np.int64)
+    pos = np.array([f[1] for f in fields], dtype=np.int64)
+    return (ranks << KEY_SHIFT) | pos
+
+# define a function that runs parse on a chunk and appends the sort keys of
+# the text in the first element of its result. this wraps the parse function
+# handed to the workers, so the keys are computed in parallel
+def keyed_parse(parse: Callable[[Any],Tuple[Any,...]], order: ContigOrder, chunk: Any) -> Tuple[Any,...]:
+    result = parse(chunk)
+    return result + (text_keys(result[0], order),)
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the ExternalSorter object. keyed text is buffered until close(),
+# which writes every record to write in key order; records with equal keys
+# keep their input order. when the buffer grows past memory_bytes it is
+# sorted and spilled to a run file under tmp_dir, and close() merges the runs
+class ExternalSorter:
+    def __init__(self, write: Callable[[str], Any], memory_bytes: int = SORT_MEMORY_BYTES,
+                 tmp_dir: Optional[str] = None) -> None:
+        self._write = write
+        self._memory_bytes = memory_bytes
+        self._tmp_dir = tmp_dir
+        self._run_dir: Optional[str] = None
+        self._runs: List[str] = []
+        self._texts: List[str] = []
+        self._keys: List[KeyArray] = []
+        self._buffered = 0
+        self._rows = 0
+        self._seconds = 0.0
+
+    # define getters
+    def get_runs(self) -> int:
+        return len(self._runs)
+
+    def get_rows(self) -> int:
+        return self._rows
+
+    def get_seconds(self) -> float:
+        return self._seconds
+
+    # define a representation of the sorter on print readouts
+    def __repr__(self) -> str:
+        return f"ExternalSorter({self._rows} records, {len(self._runs)} runs)"
+
+
+    # define a function that adds a chunk of vcf text and the keys of its
+    # records to the sorter, spilling the buffer once it is over the cap
+    def add(self, text: str, keys: KeyArray) -> None:
+        self._texts.append(text)
+        self._keys.append(keys)
+        self._buffered += len(text) + LINE_OVERHEAD * len(keys)
+        self._rows += len(keys)
+        if self._buffered > self._memory_bytes:
+            self.spill()
+
+    # define a function that sorts the buffered records, returning their
+    # keys and lines in key order and emptying the buffer
+    def take_sorted(self) -> Tuple[KeyArray, np.ndarray]:
+        start = time.perf_counter()
+        keys = np.concatenate(self._keys) if self._keys else np.empty(0, dtype=np.int64)
+        lines = np.empty(len(keys), dtype=object)
+        lines[:] = list(chain.from_iterable(map(text_lines, self._texts)))
+        order = np.argsort(keys, kind='stable')
+        self._texts, self._keys, self._buffered = [], [], 0
+        self._seconds += time.perf_counter() - start
+        return keys[order], lines[order]
+
+    # define a function that writes the sorted buffer to a new run file, each
+    # line prefixed with its key in fixed width hex so runs merge as text
+    def spill(self) -> None:
+        keys, lines = self.take_sorted()
+        if len(keys) == 0: return
+        start = time.perf_counter()
+        if self._run_dir is None:
+            self._run_dir = tempfile.mkdtemp(prefix="sumstats-sort-", dir=self._tmp_dir)
+        path = os.path.join(self._run_dir, f"run{len(self._runs)}.txt")
+        with open(path, 'w') as fobj:
+            for i in range(0, len(keys), WRITE_LINES):
+                block = zip(keys[i:i+WRITE_LINES].tolist(), lines[i:i+WRITE_LINES])
+                fobj.write(''.join(f"{k:0{KEY_WIDTH}x}\t{l}\n" for k, l in block))
+        self._runs.append(path)
+        self._seconds += time.perf_counter() - start
+
+    # define a function that writes every record in key order. with no runs
+    # on disk the buffer is sorted in memory; otherwise it is spilled as the
+    # last run and the runs are merged, taking equal keys from earlier runs
+    # first so that the sort stays stable
+    def close(self) -> None:
+        if not self._runs:
+            lines = self.take_sorted()[1]
+            start = time.perf_counter()
+            for i in range(0, len(lines), WRITE_LINES):
+                self._write('\n'.join(lines[i:i+WRITE_LINES]) + '\n')
+            self._seconds += time.perf_counter() - start
+            return
+        self.spill()
+        start = time.perf_counter()
+        runs = [open(path, 'r') for path in self._runs]
+        try:
+            merged = heapq.merge(*runs, key=lambda line: line[:KEY_WIDTH])
+            block = list(islice(merged, WRITE_LINES))
+            while block:
+                self._write(''.join(line[KEY_WIDTH+1:] for line in block))
+                block = list(islice(merged, WRITE_LINES))
+        finally:
+            for fobj in runs: fobj.close()
+            shutil.rmtree(self._run_dir, ignore_errors=True)
+        self._seconds += time.perf_counter() - start
+
+    # define property objects to enforce getters
+    runs = property(get_runs)
+    rows = property(get_rows)
+    seconds = property(get_seconds)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that adds the keyed text of a parsed chunk to a sorter.
+# the text is the first element of the result and the keys the last
+def add_keyed_text(sorter: ExternalSorter, result: Tuple[Any,...]) -> None:
+    sorter.add(result[0], result[-1])
@@ -8,8 +8,9 @@
 # library imports
 # -----------------------------------------------------------------------------
 
-from math import inf, copysign, erf, sqrt, log10
-from typing import Tuple, Union
+import numpy as np
+from math import inf, copysign, erfc, sqrt, log10, log
+from typing import Dict, Sequence, Tuple, Union
 
 # type definitions
 # -----------------------------------------------------------------------------
@@ -35,7 +36,49 @@ ZScore = Tuple[Union[float,None]]
 PValue = Tuple[Union[float,None]]
 LogPValue = Tuple[Union[float,None]]
 
+# batch type definitions. a column is a float64 array holding one statistic
+# for a whole batch of variants, with NaN marking missing values.
+FloatArray = np.ndarray
+StatColumns = Dict[str, FloatArray]
+RawColumn = Sequence[Union[str, float, None]]
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+STAT_KEYS = ("BETA", "SE", "Z", "P", "LOGP")
+MISSING_TOKENS = frozenset(('.', '', None))
+LN10 = log(10.0)
+
+# coefficients of W. J. Cody's rational chebyshev approximations to the
+# complementary error function (Math. Comp. 1969). region 1 covers
+# x <= 0.46875, region 2 covers 0.46875 < x <= 4 and region 3 covers x > 4.
+_ERF_A = (3.16112374387056560e00, 1.13864154151050156e02,
+          3.77485237685302021e02, 3.20937758913846947e03,
+          1.85777706184603153e-1)
+_ERF_B = (2.36012909523441209e01, 2.44024637934444173e02,
+          1.28261652607737228e03, 2.84423683343917062e03)
+_ERF_C = (5.64188496988670089e-1, 8.88314979438837594e00,
+          6.61191906371416295e01, 2.98635138197400131e02,
+          8.81952221241769090e02, 1.71204761263407058e03,
+          2.05107837782607147e03, 1.23033935479799725e03,
+          2.15311535474403846e-8)
+_ERF_D = (1.57449261107098347e01, 1.17693950891312499e02,
+          5.37181101862009858e02, 1.62138957456669019e03,
+          3.29079923573345963e03, 4.36261909014324716e03,
+          3.43936767414372164e03, 1.23033935480374942e03)
+_ERF_P = (3.05326634961232344e-1, 3.60344899949804439e-1,
+          1.25781726111229246e-1, 1.60837851487422766e-2,
+          6.58749161529837803e-4, 1.63153871373020978e-2)
+_ERF_Q = (2.56852019228982242e00, 1.87295284992346725e00,
+          5.27905102951428412e-1, 6.05183413124413191e-2,
+          2.33520497626869185e-3)
+_INV_SQRT_PI = 5.6418958354775628695e-1
+_ERF_THRESH = 0.46875
+
+
 # mapping functor definitions
+# -----------------------------------------------------------------------------
 
 # Effect --> ZScore
 def compute_zscore(eff: Effect) -> ZScore:
@@ -48,10 +91,11 @@ def compute_zscore(eff: Effect) -> ZScore:
     return (zscore,)
 
 # ZScore --> PValue
+# erfc is used rather than 1 - erf so that small p-values keep their precision
 def compute_pvalue(zscore: ZScore) -> PValue:
     if (zscore[0] == None): return (None,)
     else:
-        pval =  2.0 * (1 - 0.5 * (1.0 + erf(abs(zscore[0]) / sqrt(2.0))))
+        pval = erfc(abs(zscore[0]) / sqrt(2.0))
         return (pval,)
 
 # PValue --> LogPValue
@@ -63,3 +107,120 @@ def compute_logpvalue(pval: PValue) -> LogPValue:
         return (-1.0 * log10(pval[0]),)
 
 
+# batch primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that converts a raw column of tokens or optional floats
+# to a float64 array, marking missing values ('.', '' or None) with NaN.
+# numeric arrays (e.g. read from parquet, with nulls as NaN) are cast as is
+def to_float_column(values: RawColumn) -> FloatArray:
+    if isinstance(values, np.ndarray) and values.dtype.kind in 'fiu':
+        return values.astype(np.float64, copy=False)
+    return np.array([np.nan if v in MISSING_TOKENS else v for v in values], dtype=np.float64)
+
+# define a function that returns a column of missing values of length n
+def missing_column(n: int) -> FloatArray:
+    return np.full(n, np.nan, dtype=np.float64)
+
+# define a function that computes the natural log of erfc(x) for x >= 0.
+# in the tails erfc(x) = exp(-x^2) * R(x) so the log is computed as
+# -x^2 + log(R(x)) which never underflows, unlike log(erfc(x))
+def log_erfc(x: FloatArray) -> FloatArray:
+    x = np.asarray(x, dtype=np.float64)
+    out = np.full(x.shape, np.nan, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+
+        # region 1: |x| <= 0.46875, erfc = 1 - erf
+        m = (x <= _ERF_THRESH)
+        if m.any():
+            y = x[m]
+            ysq = y * y
+            num = _ERF_A[4] * ysq
+            den = ysq.copy()
+            for i in range(3):
+                num = (num + _ERF_A[i]) * ysq
+                den = (den + _ERF_B[i]) * ysq
+            out[m] = np.log1p(-y * (num + _ERF_A[3]) / (den + _ERF_B[3]))
+
+        # region 2: 0.46875 < x <= 4
+        m = (x > _ERF_THRESH) & (x <= 4.0)
+        if m.any():
+            y = x[m]
+            num = _ERF_C[8] * y
+            den = y.copy()
+            for i in range(7):
+                num = (num + _ERF_C[i]) * y
+                den = (den + _ERF_D[i]) * y
+            out[m] = -(y * y) + np.log((num + _ERF_C[7]) / (den + _ERF_D[7]))
+
+        # region 3: x > 4, asymptotic rational form
+        m = (x > 4.0)
+        if m.any():
+            y = x[m]
+            ysq = 1.0 / (y * y)
+            num = _ERF_P[5] * ysq
+            den = ysq.copy()
+            for i in range(4):
+                num = (num + _ERF_P[i]) * ysq
+                den = (den + _ERF_Q[i]) * ysq
+            r = ysq * (num + _ERF_P[4]) / (den + _ERF_Q[4])
+            out[m] = -(y * y) + np.log((_INV_SQRT_PI - r) / y)
+
+    return out
+
+
+# batch mapping functor definitions
+# -----------------------------------------------------------------------------
+
+# Effect --> ZScore for whole columns. an SE of zero yields a signed
+# infinity and a missing (NaN) beta stays missing, matching compute_zscore
+def compute_zscore_batch(beta: FloatArray, beta_se: FloatArray) -> FloatArray:
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = beta / beta_se
+    zero_se = (beta_se == 0) & ~np.isnan(beta)
+    if zero_se.any():
+        zscore[zero_se] = np.copysign(np.inf, beta[zero_se])
+    return zscore
+
+# ZScore --> ln(PValue) for whole columns. this is the log-survival function
+# of the standard normal (two sided) and stays finite for any finite zscore
+def compute_log_pvalue_batch(zscore: FloatArray) -> FloatArray:
+    return log_erfc(np.abs(zscore) / sqrt(2.0))
+
+# ZScore --> PValue for whole columns
+def compute_pvalue_batch(zscore: FloatArray) -> FloatArray:
+    return np.exp(compute_log_pvalue_batch(zscore))
+
+# PValue --> LogPValue for whole columns. a p-value of zero yields inf,
+# matching compute_logpvalue
+def compute_logpvalue_batch(pval: FloatArray) -> FloatArray:
+    with np.errstate(divide='ignore'):
+        return -1.0 * np.log10(pval)
+
+# ZScore --> LogPValue for whole columns, computed in log space so that
+# |z| > ~38 does not underflow through P=0 to LOGP=inf
+def compute_logpvalue_from_zscore_batch(zscore: FloatArray) -> FloatArray:
+    return -1.0 * compute_log_pvalue_batch(zscore) / LN10
+
+
+# define a function that takes whole stat columns (NaN marking missing
+# values) and derives every missing statistic in one vectorized pass.
+# provided values are never overwritten. LOGP is taken from the provided
+# P where there is one, and from the zscore in log space otherwise.
+def derive_stat_columns(beta: FloatArray, beta_se: FloatArray, zscore: FloatArray,
+                        pval: FloatArray, logp: FloatArray) -> StatColumns:
+    zscore = np.where(np.isnan(zscore), compute_zscore_batch(beta, beta_se), zscore)
+    log_pz = compute_log_pvalue_batch(zscore)
+
+    given_p = ~np.isnan(pval)
+    pval = np.where(given_p, pval, np.exp(log_pz))
+    logp_derived = np.where(given_p, compute_logpvalue_batch(pval), -1.0 * log_pz / LN10)
+    logp = np.where(np.isnan(logp), logp_derived, logp)
+
+    return {
+        "BETA": beta,
+        "SE": beta_se,
+        "Z": zscore,
+        "P": pval,
+        "LOGP": logp
+    }
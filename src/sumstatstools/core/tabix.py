@@ -0,0 +1,279 @@
+# File Name: tabix.py
+# Created By: ZW
+# Created On: 2026-10-16
+# Purpose: defines an on-the-fly tabix (.tbi) / coordinate-sorted index (.csi)
+#  builder for bgzf compressed VCF output. records are added as they are
+#  written, keyed by their uncompressed file offsets; once the compressed
+#  block layout is known the offsets are converted to bgzf virtual offsets
+#  and the index is serialized in the htslib binary format. tabix indexes of
+#  any bgzf file (e.g. sumstats indexed with tabix -s1 -b2 -e2) can be read
+#  back to find the virtual offset of a region.
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import gzip
+import struct
+import sys
+from bisect import bisect_right
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+TBX_VCF = 2  # tabix preset code for vcf
+TBI_MAGIC = b'TBI\x01'
+TBI_MIN_SHIFT = 14
+TBI_DEPTH = 5
+TBI_MAX_POS = 1 << (TBI_MIN_SHIFT + TBI_DEPTH * 3)  # 2^29 bp, the span of a tbi index
+CSI_DEPTH = 6  # covers contigs up to 2^32 bp
+INDEX_KINDS = ('tbi', 'csi')
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that computes the smallest bin fully containing the
+# zero-based, half-open interval [beg, end) in the UCSC/htslib binning scheme
+def reg2bin(beg: int, end: int, min_shift: int = TBI_MIN_SHIFT, depth: int = TBI_DEPTH) -> int:
+    end -= 1
+    s = min_shift
+    t = ((1 << depth * 3) - 1) // 7
+    for l in range(depth, 0, -1):
+        if (beg >> s) == (end >> s):
+            return t + (beg >> s)
+        s += 3
+        t -= 1 << ((l - 1) * 3)
+    return 0
+
+# define a function that returns the pseudo-bin number holding per-reference
+# metadata for the given binning depth
+def pseudo_bin(depth: int) -> int:
+    return ((1 << (depth * 3 + 3)) - 1) // 7 + 1
+
+# define a function that lists every bin that may hold records overlapping
+# the zero-based, half-open interval [beg, end), from the root bin down
+def reg2bins(beg: int, end: int, min_shift: int = TBI_MIN_SHIFT, depth: int = TBI_DEPTH) -> List[int]:
+    end -= 1
+    bins: List[int] = []
+    s, t = min_shift + depth * 3, 0
+    for l in range(depth + 1):
+        bins.extend(range(t + (beg >> s), t + (end >> s) + 1))
+        s -= 3
+        t += 1 << (l * 3)
+    return bins
+
+
+# object definitions
+# -----------------------------------------------------------------------------
+
+# define the TabixIndexer object which accumulates the bins, chunks and linear
+# index of every record written to a bgzf vcf
+class TabixIndexer:
+    def __init__(self, kind: str = 'tbi') -> None:
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"unknown index type {kind}, expected one of {INDEX_KINDS}")
+        self._kind = kind
+        self._min_shift = TBI_MIN_SHIFT
+        self._depth = TBI_DEPTH if kind == 'tbi' else CSI_DEPTH
+        self._names: List[str] = []
+        self._ref_ids: Dict[str,int] = {}
+        self._bins: List[Dict[int,List[List[int]]]] = []
+        self._linear: List[List[int]] = []
+        self._spans: List[List[int]] = []  # per ref [first offset, last offset, n records]
+        self._last = (-1, -1)
+        self._sorted = True
+        self._unsorted_at = ''
+
+    # define getters
+    def get_kind(self) -> str:
+        return self._kind
+
+    def is_sorted(self) -> bool:
+        return self._sorted
+
+
+    # define a function that records one vcf record spanning [beg, end) on
+    # chrom, stored at uncompressed offsets [ustart, uend)
+    def add_record(self, chrom: str, beg: int, end: int, ustart: int, uend: int) -> None:
+        rid = self._ref_ids.get(chrom)
+        if rid is None:
+            rid = len(self._names)
+            self._ref_ids[chrom] = rid
+            self._names.append(chrom)
+            self._bins.append({})
+            self._linear.append([])
+            self._spans.append([ustart, uend, 0])
+
+        # check that records arrive in coordinate order
+        if self._sorted and (rid < self._last[0] or (rid == self._last[0] and beg < self._last[1])):
+            self._sorted = False
+            self._unsorted_at = f"{chrom}:{beg + 1}"
+        self._last = (rid, beg)
+        if self._kind == 'tbi' and end > (1 << (self._min_shift + 3 * self._depth)):
+            raise ValueError(f"position {chrom}:{end} is too large for a tbi index, use csi")
+
+        # add the record to its bin, extending the last chunk when contiguous
+        chunks = self._bins[rid].setdefault(reg2bin(beg, end, self._min_shift, self._depth), [])
+        if chunks and chunks[-1][1] == ustart:
+            chunks[-1][1] = uend
+        else:
+            chunks.append([ustart, uend])
+
+        # record the first offset overlapping each linear index window
+        linear = self._linear[rid]
+        last_window = (end - 1) >> self._min_shift
+        if len(linear) <= last_window:
+            linear.extend([-1] * (last_window + 1 - len(linear)))
+        for w in range(beg >> self._min_shift, last_window + 1):
+            if linear[w] == -1: linear[w] = ustart
+
+        span = self._spans[rid]
+        span[1] = uend
+        span[2] += 1
+
+    # define a function that records every data line in a block of vcf bytes
+    # starting at uncompressed offset uoffset. header lines are skipped. the
+    # block must consist of complete lines
+    def add_bytes(self, data: bytes, uoffset: int) -> None:
+        u = uoffset
+        for line in data.split(b'\n')[:-1]:
+            length = len(line) + 1
+            if not line.startswith(b'#'):
+                chrom, pos, _, ref = line.split(b'\t', 4)[:4]
+                beg = int(pos) - 1
+                self.add_record(chrom.decode(), beg, beg + max(1, len(ref)), u, u + length)
+            u += length
+
+
+    # define a function that serializes the index, converting uncompressed
+    # offsets to virtual offsets using the start of each bgzf block in
+    # uncompressed (ustarts) and compressed (coffsets) space. ustarts must end
+    # with the total uncompressed size and coffsets with the offset of the
+    # eof block. returns None (with a warning) if the records were not sorted
+    def serialize(self, ustarts: Sequence[int], coffsets: Sequence[int]) -> Optional[bytes]:
+        if not self._sorted:
+            print(f"warning: output is not coordinate sorted (at {self._unsorted_at}); "
+                  f"{self._kind} index not written", file=sys.stderr)
+            return None
+
+        def voffset(u: int) -> int:
+            i = bisect_right(ustarts, u) - 1
+            return (coffsets[i] << 16) | (u - ustarts[i])
+
+        names = b''.join(n.encode() + b'\0' for n in self._names)
+        header = struct.pack('<7i', TBX_VCF, 1, 2, 0, ord('#'), 0, len(names)) + names
+        pseudo = pseudo_bin(self._depth)
+
+        if self._kind == 'tbi':
+            out = [b'TBI\x01', struct.pack('<i', len(self._names)), header]
+        else:
+            out = [b'CSI\x01', struct.pack('<3i', self._min_shift, self._depth, len(header)),
+                   header, struct.pack('<i', len(self._names))]
+
+        for rid in range(len(self._names)):
+            bins = self._bins[rid]
+            out.append(struct.pack('<i', len(bins) + 1))
+            for b in sorted(bins):
+                chunks = bins[b]
+                if self._kind == 'tbi':
+                    out.append(struct.pack('<Ii', b, len(chunks)))
+                else:
+                    out.append(struct.pack('<IQi', b, voffset(chunks[0][0]), len(chunks)))
+                out.extend(struct.pack('<QQ', voffset(c[0]), voffset(c[1])) for c in chunks)
+
+            # pseudo-bin with the span of the reference and its record counts
+            span = self._spans[rid]
+            if self._kind == 'tbi':
+                out.append(struct.pack('<Ii', pseudo, 2))
+            else:
+                out.append(struct.pack('<IQi', pseudo, 0, 2))
+            out.append(struct.pack('<4Q', voffset(span[0]), voffset(span[1]), span[2], 0))
+
+            # linear index, filling empty windows from the previous window
+            if self._kind == 'tbi':
+                ioffs = []
+                prev = 0
+                for u in self._linear[rid]:
+                    prev = voffset(u) if u != -1 else prev
+                    ioffs.append(prev)
+                out.append(struct.pack(f'<i{len(ioffs)}Q', len(ioffs), *ioffs))
+
+        out.append(struct.pack('<Q', 0))
+        return b''.join(out)
+
+    # define property objects to enforce getters
+    kind = property(get_kind)
+
+
+# define the TabixIndex object, a .tbi index read back from disk. it maps a
+# region of a reference to the virtual offset in the bgzf file from which
+# reading finds every record overlapping the region
+class TabixIndex:
+    def __init__(self, names: Sequence[str], bins: Sequence[Dict[int,List[Tuple[int,int]]]],
+                 linear: Sequence[List[int]]) -> None:
+        self._names = tuple(names)
+        self._ref_ids = {n: i for i, n in enumerate(self._names)}
+        self._bins = list(bins)
+        self._linear = list(linear)
+
+    # define getters
+    def get_names(self) -> Tuple[str,...]:
+        return self._names
+
+    # define a representation of the index on print readouts
+    def __repr__(self) -> str:
+        return f"TabixIndex({len(self._names)} references)"
+
+
+    # define a function that returns the virtual offset of the first chunk
+    # that may hold records of chrom overlapping the zero-based, half-open
+    # interval [beg, end), or None if no records can overlap it. chunks
+    # ending before the linear index entry of beg's window are skipped. end
+    # is clipped to the span covered by the index
+    def query(self, chrom: str, beg: int, end: int) -> Optional[int]:
+        rid = self._ref_ids.get(chrom)
+        if rid is None or beg >= TBI_MAX_POS: return None
+        end = min(end, TBI_MAX_POS)
+        linear = self._linear[rid]
+        min_off = linear[min(beg >> TBI_MIN_SHIFT, len(linear) - 1)] if linear else 0
+        offsets = [max(cbeg, min_off) for b in reg2bins(beg, end)
+                   for cbeg, cend in self._bins[rid].get(b, ()) if cend > min_off]
+        return min(offsets) if offsets else None
+
+    # define property objects to enforce getters
+    names = property(get_names)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that reads a .tbi index, raising ValueError for any
+# other file (csi indexes are not read back)
+def read_tabix_index(path: str) -> TabixIndex:
+    with open(path, 'rb') as fobj:
+        data = gzip.decompress(fobj.read())
+    if data[:4] != TBI_MAGIC:
+        raise ValueError(f"{path} is not a tabix (.tbi) index")
+    n_ref, l_nm = struct.unpack_from('<i', data, 4)[0], struct.unpack_from('<i', data, 32)[0]
+    names = [n.decode() for n in data[36:36 + l_nm].split(b'\0')[:-1]]
+    pseudo = pseudo_bin(TBI_DEPTH)
+    off = 36 + l_nm
+    all_bins, all_linear = [], []
+    for _ in range(n_ref):
+        n_bin, = struct.unpack_from('<i', data, off)
+        off += 4
+        bins: Dict[int,List[Tuple[int,int]]] = {}
+        for _ in range(n_bin):
+            b, n_chunk = struct.unpack_from('<Ii', data, off)
+            off += 8
+            chunks = struct.unpack_from(f'<{2 * n_chunk}Q', data, off)
+            off += 16 * n_chunk
+            if b != pseudo: bins[b] = list(zip(chunks[0::2], chunks[1::2]))
+        n_intv, = struct.unpack_from('<i', data, off)
+        all_linear.append(list(struct.unpack_from(f'<{n_intv}Q', data, off + 4)))
+        off += 4 + 8 * n_intv
+        all_bins.append(bins)
+    return TabixIndex(names, all_bins, all_linear)
@@ -10,7 +10,11 @@
 
 from .stats import Beta, StdErr, Effect, ZScore, PValue, LogPValue
 from .stats import compute_zscore, compute_pvalue, compute_logpvalue
-from typing import Dict, Tuple, List, Literal, Union, Any
+from .stats import StatColumns, STAT_KEYS, to_float_column, missing_column
+from .stats import derive_stat_columns
+from collections.abc import Mapping
+from math import isnan
+from typing import Dict, Tuple, List, Literal, Union, Any, Sequence, Iterator
 from .contig import Contig
 
 
@@ -18,6 +22,7 @@ from .contig import Contig
 # -----------------------------------------------------------------------------
 
 Tokens = Tuple[str,...]
+TokensBatch = Sequence[Tokens]
 InfoT = Dict[str,Tuple[Any,...]]
 Indices = List[Union[int,Literal['.']]]
 ConvertChoices = Union[Literal['simple'],Literal['ucsc'],Literal['none']]
@@ -26,8 +31,13 @@ ConvertChoices = Union[Literal['simple'],Literal['ucsc'],Literal['none']]
 # object definitions
 # -----------------------------------------------------------------------------
 
+# define the Variant object. variants are slotted records exposing read-only
+# properties; use replace() to derive a modified copy, which shares every
+# unchanged field (including the contig and info dict) with the original
 class Variant:
-    # define initial configuration requiring 7 core attributes to be passed
+    __slots__ = ('_contig', '_pos', '_name', '_ref', '_alt', '_filt', '_qual', '_info')
+
+    # define initial configuration requiring 8 core attributes to be passed
     def __init__(self, contig: Contig, pos: int, ref: str, name: str,
                   alt: str, filt: str, qual: str, info: InfoT) -> None:
         self._contig = contig
@@ -39,69 +49,103 @@ class Variant:
         self._qual = qual
         self._info = info
 
-    # define getters and setters
+    # define getters
     def get_contig(self) -> Contig:
         return self._contig
 
-    def set_contig(self, new_contig: Contig) -> None:
-        self._contig = new_contig
-
     def get_pos(self) -> int:
         return self._pos
 
-    def set_pos(self, new_pos: int) -> None:
-        self._pos = new_pos
-
     def get_name(self) -> str:
         return self._name
-    
-    def set_name(self, new_name: str) -> None:
-        self._name = new_name
 
     def get_ref(self) -> str:
         return self._ref
 
-    def set_ref(self, new_ref: str) -> None:
-        self._ref = new_ref
-
     def get_alt(self) -> str:
         return self._alt
 
-    def set_alt(self, new_alt: str) -> None:
-        self._ref = new_alt
-
     def get_filt(self) -> str:
         return self._filt
-    
-    def set_filt(self, new_filt: str) -> None:
-        self._filt = new_filt
 
     def get_qual(self) -> str:
         return self._qual
 
-    def set_qual(self, new_qual: str) -> None:
-        self._qual = new_qual
-
     def get_info(self) -> InfoT:
         return self._info
-    
-    def set_info(self, new_info: InfoT) -> None:
-        self._info = new_info
+
+
+    # define a function that returns a copy of the variant with the passed
+    # fields replaced. unchanged fields are shared, not copied
+    def replace(self, **changes: Any) -> 'Variant':
+        fields = {"contig": self._contig, "pos": self._pos, "ref": self._ref,
+                  "name": self._name, "alt": self._alt, "filt": self._filt,
+                  "qual": self._qual, "info": self._info}
+        fields.update(changes)
+        return Variant(**fields)
+
+    # define compact pickling as a plain argument tuple
+    def __reduce__(self) -> Tuple[type, Tuple[Any,...]]:
+        return (Variant, (self._contig, self._pos, self._ref, self._name,
+                          self._alt, self._filt, self._qual, self._info))
 
 
     #define a representation of the variant on print readouts
     def __repr__(self) -> str:
         return f"Variant({self._name} - {self._contig.id}:{self._pos} {self._ref}>{self._alt})"
 
-    # define property objects to enforce getters and setters
-    contig = property(get_contig, set_contig)
-    pos = property(get_pos, set_pos)
-    name = property(get_name, set_name)
-    ref = property(get_ref, set_ref)
-    alt = property(get_alt, set_alt)
-    filt = property(get_filt, set_filt)
-    qual = property(get_qual, set_qual)
-    info = property(get_info, set_info)
+    # define read-only property objects to enforce getters
+    contig = property(get_contig)
+    pos = property(get_pos)
+    name = property(get_name)
+    ref = property(get_ref)
+    alt = property(get_alt)
+    filt = property(get_filt)
+    qual = property(get_qual)
+    info = property(get_info)
+
+
+# define the LazyInfo object, a read-only mapping over the raw INFO text of a
+# vcf record. the text is only split into a dictionary the first time a
+# field is accessed, so records that are passed through unchanged (e.g. in
+# liftover) never pay for decoding their INFO
+class LazyInfo(Mapping):
+    __slots__ = ('_text', '_info')
+
+    def __init__(self, text: str) -> None:
+        self._text = text
+        self._info = None
+
+    # define getters
+    def get_text(self) -> str:
+        return self._text
+
+    # decode the INFO text on first use
+    def _decoded(self) -> InfoT:
+        if self._info is None:
+            self._info = info_from_text(self._text)
+        return self._info
+
+    # define mapping protocol methods
+    def __getitem__(self, key: str) -> Tuple[Any,...]:
+        return self._decoded()[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._decoded())
+
+    def __len__(self) -> int:
+        return len(self._decoded())
+
+    # define compact pickling as the raw text only
+    def __reduce__(self) -> Tuple[type, Tuple[str]]:
+        return (LazyInfo, (self._text,))
+
+    #define a representation of the info on print readouts
+    def __repr__(self) -> str:
+        return f"LazyInfo({self._text!r})"
+
+    # define property objects to enforce getters
+    text = property(get_text)
 
 
 
@@ -123,6 +167,15 @@ def make_simple_chrom(contig_name: str) -> str:
         return contig_name
 
 
+# define a function that takes vcf info text like 'aa=0.5;Effect=0.2,1.1'
+# and returns a dictionary in the form {'aa' : ('0.5',), 'Effect': ('0.2', '1.1')}.
+# flags without a value map to an empty tuple and '.' to an empty dictionary
+def info_from_text(token: str) -> InfoT:
+    if token == '.': return {}
+    kvpairs = [f.partition('=') for f in token.split(';')]
+    return {k:(tuple(v.split(',')) if sep else ()) for k,sep,v in kvpairs}
+
+
 # define a function to extract core attributes from summary stats file tokens
 def extract_core_attributes(tokens : Tokens, indices: Indices) -> Tokens: 
     return tuple(tokens[i] if i != '.' else '.' for i in indices)
@@ -147,6 +200,25 @@ def extract_stat_attributes(tokens : Tokens, indices: Indices) -> InfoT:
     }
 
 
+# define a function to extract the stat columns for a whole batch of token rows
+# at once. missing columns become NaN columns and the missing statistics are
+# derived in a single vectorized pass rather than once per row
+def extract_stat_columns(tokens_batch: TokensBatch, indices: Indices) -> StatColumns:
+    n = len(tokens_batch)
+    raw = [to_float_column([t[i] for t in tokens_batch]) if i != '.' else missing_column(n)
+           for i in indices]
+    return derive_stat_columns(*raw)
+
+# define a function to convert one row of a set of stat columns back to the
+# per-variant info dictionary, with None marking missing values
+def info_from_stat_columns(columns: StatColumns, row: int) -> InfoT:
+    info: InfoT = {}
+    for k in STAT_KEYS:
+        v = float(columns[k][row])
+        info[k] = ((None,) if isnan(v) else (v,))
+    return info
+
+
 # define function to generate a variant object from a set of tokens
 def variant_from_tokens(tokens: Tokens, core_ind: Indices, stat_ind: Indices,
                         contigs_dict: Dict[str, Contig], contig_convert: ConvertChoices) -> Variant:
@@ -8,15 +8,20 @@
 # -----------------------------------------------------------------------------
 
 import sys
+import numpy as np
 from datetime import date
+from math import isnan
 from functools import partial
 from pathlib import Path
-from typing import Tuple, Dict, Union, TextIO
+from typing import Tuple, Dict, List, Union, TextIO, Sequence, Iterator, BinaryIO
 from .custom_types import BinLines, MapF, Decoder, Tokens
 from .custom_types import VariantsT, ContigsT
-from .io import decode_lines, filter_header_lines, tokenize
+from .io import decode_lines, filter_header_lines, tokenize, dec_utf8, generate_file_reader
+from .compress import open_input, skip_input
+from .batch import VariantBatch, contig_codes_dict, string_column
 from .contig import Contig
-from .variant import Variant, InfoT
+from .stats import StatColumns, STAT_KEYS
+from .variant import Variant, InfoT, LazyInfo, info_from_text
 
 
 # type aliases
@@ -47,6 +52,9 @@ HEADER_BOTTOM=(
     "#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO"
 )
 
+INFO_PRECISION = 4  # default number of digits after the point in INFO values
+MAX_FAST_PRECISION = 10  # largest precision formatted by scientific_codes
+
 
 # primitive function definitions
 # -----------------------------------------------------------------------------
@@ -54,8 +62,7 @@ HEADER_BOTTOM=(
 # define a function that takes a string like 'aa=0.5;Effect=0.2,1.1'
 # and return a dictionary in the form {'aa' : 0.5 , 'Effect': [0.2, 1.1]}
 def vcftext_to_info(token: str) -> InfoT:
-    kvpairs = [f.split('=') for f in token.split(';')]
-    return {k:tuple(v.split(',')) for k,v in kvpairs}
+    return info_from_text(token)
 
 # define a function that takes an InfoT dictionary object and generates
 # an info string. This function inverts the above function
@@ -64,17 +71,82 @@ def info_to_vcftext(info: InfoT) -> str:
 
 
 # define a function that takes a properly ordered token set and converts to 
-# a variant object. the tokenset order is: chrom, pos, name, ref, alt, filt,
-# qual, info
+# a variant object. the tokenset order is: chrom, pos, name, ref, alt, qual,
+# filt, info
 def create_variant(tokens: Tokens, contig_dict: Dict[str,Contig]) -> Variant:
     return Variant(contig=contig_dict[tokens[0]], 
                       pos=int(tokens[1]), 
                       name=tokens[2], 
                       ref=tokens[3], 
                       alt=tokens[4], 
-                      filt=tokens[5], 
-                      qual=tokens[6], 
-                      info=vcftext_to_info(tokens[7]))
+                      filt=tokens[6], 
+                      qual=tokens[5], 
+                      info=LazyInfo(tokens[7]))
+
+
+# define a function that reads the header lines of a vcf from an open binary
+# file object, up to and including the #CHROM line, leaving the file
+# positioned at the first data line
+def read_vcf_header(fobj) -> Tuple[str,...]:
+    lines = []
+    for line in iter(fobj.readline, b''):
+        lines.append(dec_utf8(line).rstrip('\r\n'))
+        if line.startswith(b'#CHROM'): break
+    return tuple(lines)
+
+# define a function that parses the key=value fields of a structured header
+# line like '##contig=<ID=chr1,length=249250621,assembly=GRCh37>'
+def header_line_fields(line: str) -> Dict[str,str]:
+    body = line.strip().split('=', 1)[1].strip('<>')
+    return dict(f.split('=', 1) for f in body.split(',') if '=' in f)
+
+# define a function that converts a ##contig header line to a Contig. the
+# assembly field is used as the genome build when present
+def contig_from_header_line(line: str, default_build: str) -> Contig:
+    fields = header_line_fields(line)
+    return Contig(fields['ID'], int(fields.get('length', 0)), fields.get('assembly', default_build))
+
+# define a function that builds a contigs dict from the ##contig lines of a
+# vcf header, in header order
+def contigs_from_header(header_lines: Tuple[str,...], default_build: str = 'UNKNOWN') -> Dict[str,Contig]:
+    contigs = (contig_from_header_line(l, default_build) for l in header_lines
+               if l.startswith('##contig='))
+    return {c.get_id() : c for c in contigs}
+
+# define a function that returns the genome build named by the ##reference
+# line of a vcf header, or the default if there is none
+def build_from_header(header_lines: Tuple[str,...], default_build: str = 'UNKNOWN') -> str:
+    refs = [l.split('=', 1)[1].strip() for l in header_lines if l.startswith('##reference=')]
+    return refs[0] if refs else default_build
+
+# define a function that splits a chunk of vcf lines into the first eight
+# columns of its data lines. the chunk is decoded once and, when it holds
+# exactly seven tabs per line, split as a single string so that each column
+# is a strided slice of the fields. other chunks (e.g. with sample columns)
+# are split line by line
+def split_vcf_columns(binary_lines: BinLines) -> Tuple[Sequence[str],...]:
+    text = b''.join(binary_lines).decode('utf-8')
+    if '\r' in text: text = text.replace('\r\n', '\n')
+    if text.startswith('#') or '\n#' in text or '\n\n' in text:
+        text = '\n'.join(l for l in text.split('\n') if l.strip() and not l.startswith('#'))
+    text = text.rstrip('\n')
+    if text == '': return ((),) * 8
+    if text.count('\t') == 7 * (text.count('\n') + 1):
+        fields = text.replace('\n', '\t').split('\t')
+        return tuple(fields[i::8] for i in range(8))
+    return tuple(zip(*(l.split('\t')[:8] for l in text.split('\n'))))
+
+# define a function that extracts one INFO field from a column of raw INFO
+# text without decoding the rest, returning the value text per row ('.'
+# where the field is absent, '' for a flag)
+def info_column(infos: Sequence[str], key: str) -> Tuple[str,...]:
+    prefix = key + '='
+    def field(info: str) -> str:
+        for f in info.split(';'):
+            if f.startswith(prefix): return f[len(prefix):]
+            if f == key: return ''
+        return '.'
+    return tuple(field(i) for i in infos)
 
 
 # high-level function definitions
@@ -91,6 +163,31 @@ def process_vcf_lines(binary_lines: BinLines, mapf: MapF, dec: Decoder,
     return tuple(mapf(partial(create_variant, contig_dict=contig_dict), filt_lines_tokens))
 
 
+# define a function to convert a batch of binary vcf data lines to a
+# VariantBatch. the INFO column is kept as raw text rather than being
+# decoded to a dictionary per record, and the string columns are used as
+# split rather than interned since streamed chunks are short-lived. contigs missing from contig_dict (i.e.
+# not declared in the header) are added with an unknown length and build
+def batch_from_vcf_lines(binary_lines: BinLines, contig_dict: Dict[str,Contig]) -> VariantBatch:
+    cols = split_vcf_columns(binary_lines)
+    contigs = list(contig_dict.values())
+    contigs += [Contig(c, 0, 'UNKNOWN') for c in dict.fromkeys(cols[0]) if c not in contig_dict]
+    codes = contig_codes_dict(tuple(contigs))
+    contig_codes = np.array([codes[c] for c in cols[0]], dtype=np.int32)
+    return VariantBatch(
+        contigs = contigs,
+        contig_codes = contig_codes,
+        pos = np.array(cols[1], dtype=np.int64),
+        names = string_column(cols[2]),
+        refs = string_column(cols[3]),
+        alts = string_column(cols[4]),
+        stats = {},
+        quals = string_column(cols[5]),
+        filts = string_column(cols[6]),
+        infos = string_column(cols[7])
+    )
+
+
 # define a function which takes a variant and writes it to a vcf file object
 def write_vcf_record(vcfobj: TextIO, variant: Variant) -> None:
     core_fmtd = (f"{variant.get_contig().get_id()}\t"
@@ -103,12 +200,119 @@ def write_vcf_record(vcfobj: TextIO, variant: Variant) -> None:
     return
 
 
-
+# define a function that formats a float column in scientific notation with
+# the given number of digits after the point, exactly as f'{x:.{precision}e}'
+# does, but with array operations: each value becomes a row of unicode code
+# points, NUL padded to a fixed width, so the rows can be viewed as numpy
+# strings without formatting every value in python. values whose rounding
+# is within float error of a tie, values outside 1e-290..1e290 and NaN/inf
+# are formatted by python, NaN as the missing value token '.'
+def scientific_codes(column: np.ndarray, precision: int = INFO_PRECISION) -> np.ndarray:
+    x = np.asarray(column, dtype=np.float64)
+    n = len(x)
+    width = precision + 8
+    if not 1 <= precision <= MAX_FAST_PRECISION:
+        text = ['.' if isnan(v) else f'{v:.{precision}e}' for v in x.tolist()]
+        width = max([len(t) for t in text], default=1)
+        return np.array(text, dtype=f'<U{width}').view(np.uint32).reshape(n, width)
+
+    with np.errstate(all='ignore'):
+        a = np.abs(x)
+        fast = np.isfinite(x) & (a >= 1e-290) & (a < 1e290)
+        a = np.where(fast, a, 1.0)
+
+        # scale each value to a mantissa with precision + 1 digits, fixing the
+        # exponent where log10 or the rounding moves it by one
+        e = np.floor(np.log10(a)).astype(np.int64)
+        y = a * 10.0 ** (precision - e)
+        fast &= np.abs(y - np.floor(y) - 0.5) > 1e-6
+        hi = y >= 10 ** (precision + 1) - 0.5
+        lo = y < 10 ** precision - 0.5
+        e = e + hi - lo
+        y = np.where(hi | lo, a * 10.0 ** (precision - e), y)
+        fast &= np.abs(y - np.floor(y) - 0.5) > 1e-6
+        m = np.rint(np.where(fast, y, 0.0)).astype(np.int64)
+
+    # lay out '-D.DDDDe+XX' (or a three digit exponent) then drop the sign
+    # position of non-negative values by shifting them left
+    codes = np.zeros((n, width + 1), dtype=np.uint32)
+    digits = m[:, None] // 10 ** np.arange(precision, -1, -1) % 10
+    ae = np.abs(e)
+    three = ae >= 100
+    codes[:, 0] = ord('-')
+    codes[:, 1] = 48 + digits[:, 0]
+    codes[:, 2] = ord('.')
+    codes[:, 3:3 + precision] = 48 + digits[:, 1:]
+    codes[:, 3 + precision] = ord('e')
+    codes[:, 4 + precision] = np.where(e < 0, ord('-'), ord('+'))
+    codes[:, 5 + precision] = 48 + np.where(three, ae // 100, ae // 10 % 10)
+    codes[:, 6 + precision] = 48 + np.where(three, ae // 10 % 10, ae % 10)
+    codes[:, 7 + precision] = np.where(three, 48 + ae % 10, 0)
+    positive = ~np.signbit(x)
+    codes[positive, :-1] = codes[positive, 1:]
+    codes = codes[:, :width]
+
+    for i in np.flatnonzero(~fast).tolist():
+        v = x[i]
+        text = '.' if isnan(v) else f'{v:.{precision}e}'
+        codes[i] = 0
+        codes[i, :len(text)] = [ord(c) for c in text]
+    return codes
+
+# define a function which formats a stat column as vcf info text, writing
+# the missing value token '.' wherever the column holds NaN
+def format_stat_column(column, precision: int = INFO_PRECISION) -> Tuple[str,...]:
+    codes = scientific_codes(column, precision)
+    return tuple(codes.view(f'<U{codes.shape[1]}').ravel().tolist())
+
+# define a function which formats the INFO column of a batch from its stat
+# columns. the 'KEY=' prefixes, values and separators of all fields are laid
+# out side by side in one code point array, so each row's INFO text comes
+# out of a single array view. short values leave NUL characters inside the
+# rows, which the caller must remove from the final text
+def format_info_codes(stats: StatColumns, info_fields: Sequence[str],
+                      precision: int = INFO_PRECISION) -> List[str]:
+    n = len(stats[STAT_KEYS[0]])
+    if len(info_fields) == 0: return ['.'] * n
+    parts = []
+    for i, k in enumerate(info_fields):
+        prefix = f"{';' if i > 0 else ''}{k}="
+        parts.append(np.broadcast_to(np.array([ord(c) for c in prefix], dtype=np.uint32), (n, len(prefix))))
+        parts.append(scientific_codes(stats[k], precision))
+    codes = np.ascontiguousarray(np.hstack(parts))
+    return codes.view(f'<U{codes.shape[1]}').ravel().tolist()
+
+# define a function which formats a whole batch of variants as vcf text.
+# this is the batch-level counterpart of write_vcf_record. raw INFO text
+# read from a vcf is written as is; otherwise the INFO column is built from
+# the info_fields stat columns with precision digits after the point
+def format_vcf_batch(batch: VariantBatch, precision: int = INFO_PRECISION,
+                     info_fields: Sequence[str] = STAT_KEYS) -> str:
+    ids = [c.get_id() for c in batch.get_contigs()]
+    chroms = [ids[c] for c in batch.get_contig_codes().tolist()]
+    if batch.get_infos() is not None:
+        info = batch.get_infos()
+    else:
+        info = format_info_codes(batch.get_stats(), info_fields, precision)
+    rows = zip(chroms, batch.get_pos().tolist(), batch.get_names(), batch.get_refs(),
+               batch.get_alts(), batch.get_quals(), batch.get_filts(), info)
+    text = ''.join([f"{c}\t{p}\t{n}\t{r}\t{a}\t{q}\t{f}\t{i}\n" for c,p,n,r,a,q,f,i in rows])
+    return text.replace('\x00', '') if batch.get_infos() is None else text
+
+# define a function which writes a whole batch of variants to a vcf file
+# object with a single write call
+def write_vcf_batch(vcfobj: TextIO, batch: VariantBatch, precision: int = INFO_PRECISION,
+                    info_fields: Sequence[str] = STAT_KEYS) -> None:
+    vcfobj.write(format_vcf_batch(batch, precision, info_fields))
+    return
 
 
 # define write_vcf_header function which takes as input a file object open in
-# write mode, as well as a metadata dictionary containing the column mappings
-def write_vcf_header(fobj: TextIO, genome_build: str, doi: str, contigs: ContigsT) -> None:
+# write mode, as well as a metadata dictionary containing the column mappings.
+# with per_allele the info fields hold one value per ALT allele (Number=A),
+# as in merged multi-allelic records
+def write_vcf_header(fobj: TextIO, genome_build: str, doi: str, contigs: ContigsT,
+                     info_fields: Sequence[str] = STAT_KEYS, per_allele: bool = False) -> None:
     # format the top header string
     program = str(Path(sys.argv[0]).stem)
     fmtdtop = ("\n".join(HEADER_TOP).format(date.today(),program,genome_build,doi) + '\n')
@@ -117,8 +321,12 @@ def write_vcf_header(fobj: TextIO, genome_build: str, doi: str, contigs: Contigs
     middle = [f"##contig=<ID={c.get_id()},length={str(c.get_length())},assembly={c.get_genome_build()}>" for c in contigs]
     fmtdmiddle = ('\n'.join(middle) + "\n")
     
-    # format the bottom header string
-    fmtdbottom: str = ('\n'.join(HEADER_BOTTOM) + '\n')
+    # format the bottom header string, declaring only the written info fields
+    bottom = [l for l in HEADER_BOTTOM if not l.startswith("##INFO=<ID=")
+              or l[len("##INFO=<ID="):].split(',')[0] in info_fields]
+    if per_allele:
+        bottom = [l.replace("Number=1", "Number=A") if l.startswith("##INFO=<ID=") else l for l in bottom]
+    fmtdbottom: str = ('\n'.join(bottom) + '\n')
 
     # write the header to the file
     fobj.write(fmtdtop)
@@ -127,6 +335,85 @@ def write_vcf_header(fobj: TextIO, genome_build: str, doi: str, contigs: Contigs
     return
 
 
+# define a function which writes the header of a lifted-over vcf. the header
+# lines of the input are copied, with its ##contig lines replaced by the
+# target assembly contigs and the ##reference line by the target build
+def write_lifted_vcf_header(fobj: TextIO, header_lines: Tuple[str,...],
+                            contigs: ContigsT, genome_build: str) -> None:
+    contig_lines = [f"##contig=<ID={c.get_id()},length={str(c.get_length())},assembly={c.get_genome_build()}>"
+                    for c in contigs]
+    out = []
+    for line in header_lines:
+        if line.startswith('##contig='):
+            out.extend(contig_lines)
+            contig_lines = []
+        elif line.startswith('##reference='):
+            out.append(f"##reference={genome_build}")
+        else:
+            if line.startswith('#CHROM'): out.extend(contig_lines)
+            out.append(line.rstrip('\n'))
+    fobj.write('\n'.join(out) + '\n')
+    return
 
 
+# object definitions
+# -----------------------------------------------------------------------------
 
+# define the VcfReader object, a streaming reader over a (plain, gzip or
+# bgzip) vcf file. the header is read on construction and its ##contig lines
+# are converted to Contig objects; records are then read in batches of
+# batch_size, either as raw lines (e.g. to hand to pool workers) or as
+# VariantBatch objects whose INFO column stays raw text
+class VcfReader:
+    def __init__(self, path: Union[str,BinaryIO], batch_size: int = 5000, threads: int = 1,
+                 default_build: str = 'UNKNOWN') -> None:
+        self._fobj = open_input(path, threads) if isinstance(path, str) else path
+        self._header_lines = read_vcf_header(self._fobj)
+        self._genome_build = build_from_header(self._header_lines, default_build)
+        self._contigs_dict = contigs_from_header(self._header_lines, self._genome_build)
+        self._reader_f = generate_file_reader(self._fobj, batch_size)
+
+    # define getters
+    def get_header_lines(self) -> Tuple[str,...]:
+        return self._header_lines
+
+    def get_contigs_dict(self) -> Dict[str,Contig]:
+        return self._contigs_dict
+
+    def get_genome_build(self) -> str:
+        return self._genome_build
+
+
+    # define a function that skips the next nbytes of data lines, e.g. those
+    # already converted by an interrupted run
+    def skip(self, nbytes: int) -> None:
+        skip_input(self._fobj, nbytes)
+
+    # define a function that returns the next batch of raw data lines, or an
+    # empty tuple at the end of the file
+    def read_lines(self) -> BinLines:
+        return self._reader_f()
+
+    # define a function that returns the next batch of records, or an empty
+    # tuple at the end of the file
+    def read_batch(self) -> Union[VariantBatch,Tuple[()]]:
+        lines = self._reader_f()
+        return batch_from_vcf_lines(lines, self._contigs_dict) if lines != () else ()
+
+    # define iteration over the record batches of the file
+    def __iter__(self) -> Iterator[VariantBatch]:
+        return iter(self.read_batch, ())
+
+    def close(self) -> None:
+        self._fobj.close()
+
+    def __enter__(self) -> 'VcfReader':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    # define property objects to enforce getters
+    header_lines = property(get_header_lines)
+    contigs_dict = property(get_contigs_dict)
+    genome_build = property(get_genome_build)
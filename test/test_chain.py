@@ -0,0 +1,142 @@
+# File Name: test_chain.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the chain index of chain.py on a small hand written chain
+#  file, checking overlapping chains lift by their header score rather than
+#  their file order, the minus strand arithmetic and allele complementing,
+#  and that positions in chain gaps are unmapped
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from sumstatstools.core.chain import ChainIndex, parse_chain_file
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.instrument import take_stage_counts
+from sumstatstools.core.liftover import liftover_batch, liftover_variant
+from sumstatstools.core.variant import Variant
+from sumstatstools.core.vcf import batch_from_vcf_lines
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# chr1 [0,300) maps to chrX [500,800) in a low scoring chain, listed first,
+# and chr1 [100,200) and [210,400) map to chrY [1000,1290) in a higher
+# scoring chain. chr2 [0,100) and [150,250) map to the minus strand of chrX
+# at [100,200) and [200,300) in minus strand coordinates
+CHAIN = """chain 100 chr1 1000 + 0 300 chrX 1000 + 500 800 1
+300
+
+chain 5000 chr1 1000 + 100 400 chrY 2000 + 1000 1290 2
+100 10 0
+190
+
+chain 50 chr2 500 + 0 250 chrX 1000 - 100 300 3
+100 50 0
+100
+"""
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that writes the chain file and parses it to an index
+def chain_index(tmp_path) -> ChainIndex:
+    path = tmp_path / "test.chain"
+    path.write_text(CHAIN)
+    return parse_chain_file(str(path))
+
+# define functions that return the source and target contigs of the chain
+def source_contigs() -> dict:
+    return {c: Contig(c, n, "hg19") for c, n in (("chr1", 1000), ("chr2", 500))}
+
+def target_contigs() -> dict:
+    return {c: Contig(c, n, "hg38") for c, n in (("chrX", 1000), ("chrY", 2000))}
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# positions covered by both chr1 chains lift by the higher scoring chain
+# listed second, and positions in its gap fall back to the other chain
+def test_overlapping_chains_ranked_by_score(tmp_path) -> None:
+    index = chain_index(tmp_path)
+    pos = np.array([50, 150, 205, 350, 600])
+    mapped, target, qpos, minus, nhits = index.lift("chr1", pos, np.ones(5, dtype=np.int64))
+    names = [index.target_names[t] for t in target.tolist()]
+    assert mapped.tolist() == [True, True, True, True, False]
+    assert names[:4] == ["chrX", "chrY", "chrX", "chrY"]
+    assert qpos[:4].tolist() == [550, 1050, 705, 1240]
+    assert nhits.tolist() == [1, 2, 1, 1, 0]
+    assert not minus.any()
+    assert index.query("chr1", 150) == [("chrY", 1050, '+'), ("chrX", 650, '+')]
+
+# positions on a minus strand chain lift to the forward strand start of the
+# whole REF interval, and positions in its gap or past it are unmapped.
+# indels landing on the minus strand are unmapped and counted, as their
+# shared base would end up on the right
+def test_minus_strand_lift(tmp_path) -> None:
+    index = chain_index(tmp_path)
+    mapped, target, qpos, minus, _ = index.lift("chr2", np.array([9, 9, 120, 160, 260]),
+                                                np.array([1, 2, 1, 1, 1]))
+    assert mapped.tolist() == [True, True, False, True, False]
+    assert minus.tolist() == [True, True, False, True, False]
+    assert qpos[[0, 1, 3]].tolist() == [890, 889, 789]
+    assert index.query("chr2", 9) == [("chrX", 890, '-')]
+
+    take_stage_counts()
+    lines = [b"chr2\t11\trs1\tAC\tA\t.\tPASS\t.\n", b"chr2\t11\trs2\tA\tAGG\t.\tPASS\t.\n",
+             b"chr2\t11\trs3\tA\tG,AT\t.\tPASS\t.\n", b"chr2\t11\trs4\tAC\tGT\t.\tPASS\t.\n",
+             b"chr1\t51\trs5\tA\tAGG\t.\tPASS\t.\n"]
+    mapped, unmapped, _ = liftover_batch(batch_from_vcf_lines(lines, source_contigs()), index,
+                                         target_contigs())
+    assert mapped.get_names().tolist() == ["rs4", "rs5"]
+    assert mapped.get_pos().tolist() == [889, 551]
+    assert mapped.get_refs().tolist() == ["GT", "A"]
+    assert mapped.get_alts().tolist() == ["AC", "AGG"]
+    assert unmapped.get_names().tolist() == ["rs1", "rs2", "rs3"]
+    assert take_stage_counts() == {("liftover", "minus strand indels"): 3}
+
+# lifting a batch of vcf records complements the alleles of minus strand
+# records and returns the records in gaps unmapped, in the source assembly
+def test_liftover_batch_alleles(tmp_path) -> None:
+    index = chain_index(tmp_path)
+    lines = [b"chr2\t10\trs1\tAC\tGA\t.\tPASS\t.\n", b"chr1\t151\trs2\tG\tT\t.\tPASS\t.\n",
+             b"chr2\t121\trs3\tC\tG\t.\tPASS\t.\n", b"chr1\t601\trs4\tA\tG\t.\tPASS\t.\n",
+             b"chr2\t161\trs5\tA\tG,T\t.\tPASS\t.\n"]
+    mapped, unmapped, hits = liftover_batch(batch_from_vcf_lines(lines, source_contigs()), index,
+                                            target_contigs())
+    chroms = [mapped.get_contigs()[c].get_id() for c in mapped.get_contig_codes().tolist()]
+    assert chroms == ["chrX", "chrY", "chrX"]
+    assert mapped.get_pos().tolist() == [890, 1051, 790]
+    assert mapped.get_names().tolist() == ["rs1", "rs2", "rs5"]
+    assert mapped.get_refs().tolist() == ["GT", "G", "T"]
+    assert mapped.get_alts().tolist() == ["TC", "T", "C,A"]
+    assert unmapped.get_names().tolist() == ["rs3", "rs4"]
+    assert unmapped.get_pos().tolist() == [121, 601]
+    assert hits.tolist() == [1, 2, 0, 0, 1]
+
+# a single variant lifts as the same row of a batch does, including a REF
+# running past the end of a block into a chain gap
+def test_liftover_variant_matches_batch(tmp_path) -> None:
+    index = chain_index(tmp_path)
+    source, target = source_contigs(), target_contigs()
+    lines = [b"chr1\t51\trs1\tA\tG\t.\tPASS\t.\n", b"chr1\t199\trs2\tACGTA\tA\t.\tPASS\t.\n",
+             b"chr2\t99\trs3\tACG\tA\t.\tPASS\t.\n", b"chr2\t10\trs4\tAC\tGA\t.\tPASS\t.\n",
+             b"chr2\t11\trs5\tA\tAGG\t.\tPASS\t.\n", b"chr1\t351\trs6\tC\tT\t.\tPASS\t.\n"]
+    mapped = liftover_batch(batch_from_vcf_lines(lines, source), index, target)[0]
+    expected = {n: (mapped.get_contigs()[c].get_id(), p, r, a) for n, c, p, r, a in
+                zip(mapped.get_names().tolist(), mapped.get_contig_codes().tolist(),
+                    mapped.get_pos().tolist(), mapped.get_refs().tolist(), mapped.get_alts().tolist())}
+    assert sorted(expected) == ["rs1", "rs2", "rs4", "rs6"]
+    for line in lines:
+        chrom, pos, name, ref, alt = line.decode().split('\t')[:5]
+        variant = Variant(source[chrom], int(pos), ref, name, alt, 'PASS', '.', {})
+        lifted = liftover_variant(variant, index, target)
+        if name not in expected:
+            assert lifted is None, name
+        else:
+            got = (lifted.get_contig().get_id(), lifted.get_pos(), lifted.get_ref(), lifted.get_alt())
+            assert got == expected[name], name
@@ -0,0 +1,156 @@
+# File Name: test_checkpoint.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the checkpoints of checkpoint.py with a plain text output,
+#  checking an output committed mid-stream, written on past the commit and
+#  then resumed from the checkpoint matches an uninterrupted write, and that
+#  a checkpoint written with other settings is refused
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import io
+import json
+import pytest
+from typing import Optional, Tuple
+from sumstatstools.core.checkpoint import (Checkpointer, checkpoint_path, checkpoint_settings,
+                                           read_checkpoint)
+from sumstatstools.core.compress import open_text_output, skip_input
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+HEADER = b"chromosome\tposition\trsid\n"
+ROWS = [f"1\t{100 * (i + 1)}\trs{i}\n".encode() for i in range(50)]
+CHUNK_LINES = 4
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that writes the input file and returns its path
+def write_input(tmp_path) -> str:
+    path = str(tmp_path / "input.tsv")
+    with open(path, 'wb') as fobj:
+        fobj.write(HEADER + b''.join(ROWS))
+    return path
+
+# define a function that converts the input to the output as a run would,
+# through a checkpointer reading chunks of lines and writing each as upper
+# case text. with stop_after, the output is committed after that many
+# chunks, a chunk more is written past the commit and the run stops there
+# without a commit, as if it had been killed
+def convert(input_path: str, output: str, checkpointer: Checkpointer,
+            stop_after: Optional[int] = None) -> None:
+    resume_at = checkpointer.resume_offset("vcf")
+    with open(input_path, 'rb') as src, open_text_output(output, resume_at) as out:
+        checkpointer.track("vcf", out)
+        src.readline()
+        if resume_at is None:
+            out.write("#HEADER\n")
+        else:
+            skip_input(src, checkpointer.input_offset)
+        def read_chunk() -> Tuple[bytes,...]:
+            chunk = [line for line in (src.readline() for _ in range(CHUNK_LINES)) if line]
+            return tuple(chunk) if chunk else ()
+        read_f = checkpointer.reader(read_chunk)
+        write_f = checkpointer.writer(lambda text: out.write(text), lambda text: text.count('\n'))
+        while True:
+            chunk = read_f()
+            if chunk == (): break
+            write_f(b''.join(chunk).decode().upper())
+            if checkpointer.chunks == stop_after:
+                checkpointer.commit()
+            elif stop_after is not None and checkpointer.chunks > stop_after:
+                return
+    checkpointer.finish()
+
+# define a class of a binary stream that cannot seek, as a pipe
+class Unseekable(io.RawIOBase):
+    def __init__(self, data: bytes) -> None:
+        self._data = io.BytesIO(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self._data.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# an output committed mid-stream and written on past its commit is cut back
+# to the commit when resumed, and ends up as an uninterrupted write would
+def test_resume_matches_uninterrupted(tmp_path) -> None:
+    input_path = write_input(tmp_path)
+    settings = checkpoint_settings(input_path, {"chunk_lines": CHUNK_LINES, "threads": 2}, ("threads",))
+    whole = str(tmp_path / "whole.vcf")
+    convert(input_path, whole, Checkpointer(checkpoint_path(whole), settings, float('inf')))
+
+    output = str(tmp_path / "out.vcf")
+    ckpt = checkpoint_path(output)
+    convert(input_path, output, Checkpointer(ckpt, settings, float('inf')), stop_after=5)
+    with open(output, 'rb') as fobj:
+        interrupted = fobj.read()
+    state = read_checkpoint(ckpt, settings)
+    assert state is not None
+    assert state["chunks"] == 5 and state["rows"] == 5 * CHUNK_LINES
+    assert state["input_offset"] == len(b''.join(ROWS[:5 * CHUNK_LINES]))
+    assert state["outputs"]["vcf"] < len(interrupted)
+
+    checkpointer = Checkpointer(ckpt, settings, float('inf'), state)
+    assert checkpointer.resumed and checkpointer.resume_offset("vcf") == state["outputs"]["vcf"]
+    convert(input_path, output, checkpointer)
+    with open(output, 'r') as fobj, open(whole, 'r') as wobj:
+        assert fobj.read() == wobj.read()
+    assert checkpointer.rows == len(ROWS)
+    assert read_checkpoint(ckpt, settings) is None
+
+# a checkpoint written for another input, with other options or by another
+# version raises a ValueError; options passed in ignore may differ
+def test_checkpoint_other_settings(tmp_path) -> None:
+    input_path = write_input(tmp_path)
+    settings = checkpoint_settings(input_path, {"chunk_lines": CHUNK_LINES, "threads": 2}, ("threads",))
+    ckpt = checkpoint_path(str(tmp_path / "out.vcf"))
+    Checkpointer(ckpt, settings).commit()
+    assert read_checkpoint(ckpt, checkpoint_settings(input_path, {"chunk_lines": CHUNK_LINES, "threads": 8},
+                                                     ("threads",))) is not None
+    with pytest.raises(ValueError):
+        read_checkpoint(ckpt, checkpoint_settings(input_path, {"chunk_lines": 8}))
+    with open(input_path, 'ab') as fobj:
+        fobj.write(ROWS[0])
+    with pytest.raises(ValueError):
+        read_checkpoint(ckpt, checkpoint_settings(input_path, {"chunk_lines": CHUNK_LINES}))
+
+    with open(ckpt, 'r') as jobj:
+        state = json.load(jobj)
+    state["version"] += 1
+    with open(ckpt, 'w') as jobj:
+        json.dump(state, jobj)
+    with pytest.raises(ValueError):
+        read_checkpoint(ckpt, settings)
+
+# resumed output must not be shorter than its commit, and input is skipped
+# by seeking or, for streams that cannot seek, by reading
+def test_resume_offsets(tmp_path) -> None:
+    output = str(tmp_path / "out.vcf")
+    with open_text_output(output) as out:
+        out.write("#HEADER\n")
+    with pytest.raises(ValueError):
+        open_text_output(output, 100)
+    with open_text_output(output, 2) as out:
+        out.write("X\n")
+    with open(output, 'r') as fobj:
+        assert fobj.read() == "#HX\n"
+
+    data = HEADER + b''.join(ROWS)
+    for src in (io.BytesIO(data), io.BufferedReader(Unseekable(data), buffer_size=16)):
+        skip_input(src, len(HEADER) + len(ROWS[0]))
+        assert src.readline() == ROWS[1]
+        skip_input(src, 10 * len(data))
+        assert src.read() == b''
@@ -0,0 +1,105 @@
+# File Name: test_dedup.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the deduplication of dedup.py, checking variants whose keys
+#  collide are told apart by their REF/ALT digests, that the key index keeps
+#  its keys as it grows, and the policies and merging of grouped records
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import zlib
+import numpy as np
+from typing import List
+from sumstatstools.core.dedup import ALLELE_BITS, Deduplicator, KeyIndex, text_variants
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+ORDER = {"chr1": 0, "chr2": 1}
+COLLIDING = ("ACCAATG", "TAAAACC")  # ALTs of REF A whose REF/ALT crc32 agree in their top ALLELE_BITS
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that formats a vcf record with the 8 columns written by
+# format_vcf_batch
+def record(chrom: str, pos: int, ref: str, alt: str, ident: str = '.', p: float = 0.5) -> str:
+    return f"{chrom}\t{pos}\t{ident}\t{ref}\t{alt}\t.\tPASS\tBETA=0.1;P={p}"
+
+# define a function that runs chunks of records through a deduplicator,
+# returning the records it writes
+def deduplicate(chunks: List[List[str]], **kwargs) -> List[str]:
+    out: List[str] = []
+    dedup = Deduplicator(out.append, ORDER, **kwargs)
+    for chunk in chunks:
+        dedup.add(''.join(l + '\n' for l in chunk))
+    dedup.close()
+    return ''.join(out).splitlines()
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# two variants at one position whose keys collide are both kept, and later
+# copies of each are dropped
+def test_colliding_keys_kept_apart() -> None:
+    pairs = [f"A\t{alt}".encode() for alt in COLLIDING]
+    assert len({zlib.crc32(p) >> (32 - ALLELE_BITS) for p in pairs}) == 1
+    first = [record("chr1", 100, "A", alt) for alt in COLLIDING]
+    keys = text_variants(''.join(l + '\n' for l in first), ORDER)[0]
+    assert keys[0] == keys[1]
+
+    out: List[str] = []
+    dedup = Deduplicator(out.append, ORDER)
+    dedup.add(''.join(l + '\n' for l in first))
+    later = [first[1], record("chr1", 100, "A", "G"), first[0], first[1]]
+    dedup.add(''.join(l + '\n' for l in later))
+    dedup.close()
+    assert ''.join(out).splitlines() == first + [record("chr1", 100, "A", "G")]
+    assert dedup.collisions == 1
+    assert dedup.dropped == 3
+
+# the key index finds every key added, with its digest, across several
+# doublings of its table
+def test_key_index_growth() -> None:
+    index = KeyIndex(bits=4)
+    keys = (np.arange(1, 2001, dtype=np.uint64) << np.uint64(ALLELE_BITS)) | np.uint64(7)
+    checks = np.arange(2000, dtype=np.uint32)
+    for start in range(0, 2000, 300):
+        index.add(keys[start:start+300], checks[start:start+300])
+    assert len(index) == 2000
+    assert repr(index) == "KeyIndex(2000 keys in 4096 slots)"
+    slots = index.find(keys)
+    assert (slots >= 0).all()
+    assert (index.checks(slots) == checks).all()
+    assert (index.find(keys + np.uint64(1)) == -1).all()
+
+# grouped keep-min-p keeps the record of a variant with the smallest P,
+# including across a chunk boundary
+def test_grouped_keep_min_p() -> None:
+    chunks = [[record("chr1", 100, "A", "G", p=0.3), record("chr1", 100, "A", "C", p=0.2),
+               record("chr1", 100, "A", "G", p=0.01), record("chr1", 200, "C", "T", p=0.4)],
+              [record("chr1", 200, "C", "T", p=0.04), record("chr2", 50, "G", "A")]]
+    assert deduplicate(chunks, policy='keep-min-p', grouped=True) == [
+        record("chr1", 100, "A", "C", p=0.2), record("chr1", 100, "A", "G", p=0.01),
+        record("chr1", 200, "C", "T", p=0.04), record("chr2", 50, "G", "A")]
+
+# grouped drop-all drops every record of a duplicated variant
+def test_grouped_drop_all() -> None:
+    chunks = [[record("chr1", 100, "A", "G"), record("chr1", 100, "A", "C"),
+               record("chr1", 100, "A", "G"), record("chr1", 300, "T", "C")]]
+    assert deduplicate(chunks, policy='drop-all', grouped=True) == [
+        record("chr1", 100, "A", "C"), record("chr1", 300, "T", "C")]
+
+# grouped merging joins records sharing REF at a position into one
+# multi-allelic record, with their IDs and INFO values per allele
+def test_grouped_merge_multiallelic() -> None:
+    chunks = [[record("chr1", 100, "A", "G", "rs1", 0.1), record("chr1", 100, "A", "T", "rs2", 0.2),
+               record("chr1", 100, "AC", "A", "rs3", 0.3), record("chr1", 100, "A", "G", "rs1", 0.4)]]
+    assert deduplicate(chunks, grouped=True, merge=True) == [
+        "chr1\t100\trs1;rs2\tA\tG,T\t.\tPASS\tBETA=0.1,0.1;P=0.1,0.2",
+        record("chr1", 100, "AC", "A", "rs3", 0.3)]
@@ -0,0 +1,127 @@
+# File Name: test_fasta.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the allele harmonization of fasta.py against a small
+#  wrapped, soft-masked fasta file and its .fai index, checking the outcome
+#  of matched, swapped, flipped, flipped+swapped, palindromic, mismatched,
+#  unchecked and indel rows, the oriented alleles and BETA/Z signs, and the
+#  rows dropped with drop set (--drop-unharmonized)
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import numpy as np
+from typing import Dict, List, Tuple
+from sumstatstools.core.batch import VariantBatch, interned_column, string_column
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.fasta import (FLIP_SWAPPED, FLIPPED, MATCHED, MISMATCHED, PALINDROMIC, SWAPPED,
+                                      UNCHECKED, Harmonizer, ReferenceGenome, match_reference_contigs,
+                                      snp_outcomes, allele_bytes)
+from sumstatstools.core.instrument import take_stage_counts
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+# 40 bases of sequence 1, wrapped at 10 bases per line, soft-masked on the
+# second and fourth lines with two N bases at positions 17 and 18
+SEQUENCE = "ACGTACGTACgtacgtNNacACGTTTAAGGccggaattAC"
+LINE_BASES = 10
+
+# rows of (position, REF, ALT, outcome, oriented REF, oriented ALT, sign of
+# BETA and Z after harmonizing)
+ROWS: List[Tuple[int, str, str, int, str, str, float]] = [
+    (1, "A", "G", MATCHED, "A", "G", 1.0),
+    (2, "A", "C", SWAPPED, "C", "A", -1.0),
+    (3, "C", "A", FLIPPED, "G", "T", 1.0),
+    (11, "A", "C", FLIP_SWAPPED, "G", "T", -1.0),  # soft-masked g
+    (4, "A", "T", PALINDROMIC, "A", "T", 1.0),  # ALT matches, but A/T
+    (5, "C", "G", MISMATCHED, "C", "G", 1.0),  # a C/G pair, but neither matches
+    (17, "A", "G", UNCHECKED, "A", "G", 1.0),  # N in the reference
+    (1, "A", "R", UNCHECKED, "A", "R", 1.0),  # non-ACGT allele
+    (21, "AC", "A", MATCHED, "AC", "A", 1.0),
+    (24, "A", "TT", SWAPPED, "TT", "A", -1.0),
+    (27, "CC", "C", MISMATCHED, "CC", "C", 1.0),
+    (13, "A", "<DEL>", UNCHECKED, "A", "<DEL>", 1.0),
+]
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that writes the fasta file and its .fai index, with the
+# sequence named 1 as in a simple style reference
+def write_reference(tmp_path) -> str:
+    path = str(tmp_path / "ref.fa")
+    header = ">1 test sequence\n"
+    lines = [SEQUENCE[i:i + LINE_BASES] for i in range(0, len(SEQUENCE), LINE_BASES)]
+    with open(path, 'w') as fobj:
+        fobj.write(header + '\n'.join(lines) + '\n')
+    with open(f"{path}.fai", 'w') as fobj:
+        fobj.write(f"1\t{len(SEQUENCE)}\t{len(header)}\t{LINE_BASES}\t{LINE_BASES + 1}\n")
+    return path
+
+# define a function that builds a batch of the test rows on chr1, with BETA
+# and Z set to one more than the row number
+def rows_batch() -> VariantBatch:
+    n = len(ROWS)
+    effect = np.arange(1, n + 1, dtype=np.float64)
+    return VariantBatch((Contig("chr1", len(SEQUENCE), "GRCh37"),), np.zeros(n, dtype=np.int32),
+                        np.array([r[0] for r in ROWS]), string_column([f"rs{i}" for i in range(n)]),
+                        interned_column([r[1] for r in ROWS]), interned_column([r[2] for r in ROWS]),
+                        {"BETA": effect, "Z": effect, "SE": np.ones(n)})
+
+# define a function that returns a harmonizer over the reference, matching
+# its sequence 1 to the contig chr1
+def harmonizer(tmp_path, drop: bool = False) -> Harmonizer:
+    reference = ReferenceGenome(write_reference(tmp_path))
+    names = match_reference_contigs(reference.names, {"chr1": Contig("chr1", len(SEQUENCE), "GRCh37")}, str)
+    assert names == {"chr1": "1"}
+    return Harmonizer(reference, names, drop)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# the mapped reference reads upper case bases across line breaks, with
+# positions off the end of the sequence read as N
+def test_reference_bases(tmp_path) -> None:
+    reference = ReferenceGenome(write_reference(tmp_path))
+    bases = reference.bases("1", np.array([0, 9, 10, 19, 39, 40, -1]))
+    assert bytes(bases) == b"ACGCCNN"
+
+# each row gets its outcome, checked in order from the least to the most
+# preferred so that palindromes override a match or swap, but not a
+# mismatch
+def test_outcomes(tmp_path) -> None:
+    assert harmonizer(tmp_path).outcomes(rows_batch()).tolist() == [r[3] for r in ROWS]
+    base, ref, alt = (allele_bytes(list(s)) for s in ("TGA", "AGC", "TCG"))
+    assert snp_outcomes(base, ref, alt).tolist() == [PALINDROMIC, PALINDROMIC, MISMATCHED]
+
+# harmonized rows have their alleles oriented to the reference, and the
+# swapped rows have BETA and Z negated; every outcome is counted
+def test_harmonize(tmp_path) -> None:
+    take_stage_counts()
+    batch = harmonizer(tmp_path).harmonize(rows_batch())
+    assert batch.get_refs().tolist() == [r[4] for r in ROWS]
+    assert batch.get_alts().tolist() == [r[5] for r in ROWS]
+    signs = np.array([r[6] for r in ROWS])
+    expected = signs * np.arange(1, len(ROWS) + 1)
+    assert batch.get_stats()["BETA"].tolist() == expected.tolist()
+    assert batch.get_stats()["Z"].tolist() == expected.tolist()
+    assert batch.get_stats()["SE"].tolist() == [1.0] * len(ROWS)
+    counts: Dict[Tuple[str, str], int] = take_stage_counts()
+    assert counts == {("harmonize", "matched"): 2, ("harmonize", "swapped"): 2,
+                      ("harmonize", "flipped"): 1, ("harmonize", "flipped+swapped"): 1,
+                      ("harmonize", "palindromic"): 1, ("harmonize", "mismatched"): 2,
+                      ("harmonize", "unchecked"): 3}
+
+# with drop set, as with --drop-unharmonized, palindromic and mismatched
+# rows are dropped and unchecked rows are kept
+def test_drop_unharmonized(tmp_path) -> None:
+    batch = harmonizer(tmp_path, drop=True).harmonize(rows_batch())
+    kept = [i for i, r in enumerate(ROWS) if r[3] not in (PALINDROMIC, MISMATCHED)]
+    assert batch.get_names().tolist() == [f"rs{i}" for i in kept]
+    assert batch.get_refs().tolist() == [ROWS[i][4] for i in kept]
+    assert batch.get_stats()["BETA"].tolist() == [ROWS[i][6] * (i + 1) for i in kept]
@@ -0,0 +1,63 @@
+# File Name: test_io.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the chunked tokenizer of io.py, checking a chunk with one
+#  line holding an extra field and another missing one, which together give
+#  the expected number of fields, is not split in one pass but tokenized
+#  line by line, failing on the short line
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import pytest
+from sumstatstools.core.contig import Contig
+from sumstatstools.core.io import fields_per_line, split_chunk
+from sumstatstools.core.plan import compile_column_plan
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+HEADER = ("chromosome", "position", "rsid", "ea", "oa", "beta", "se")
+COLUMNS = {"chrom": "chromosome", "pos": "position", "id": "rsid", "eff_allele": "ea",
+           "other_allele": "oa", "beta": "beta", "beta_se": "se"}
+GOOD = (b"1\t100\trs1\tA\tG\t0.1\t0.01\n", b"1\t200\trs2\tC\tT\t0.2\t0.02\n")
+RAGGED = (b"1\t100\trs1\tA\tG\t0.1\t0.01\n", b"1\t200\trs2\tC\tT\t0.2\t0.02\textra\n",
+          b"1\t300\trs3\tG\tA\t0.3\n")  # an extra field on line 2, a missing one on line 3
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# whole chunks are split in one pass, row-major
+@pytest.mark.parametrize("delim", [None, '\t'])
+def test_split_chunk(delim) -> None:
+    fields = split_chunk(GOOD, len(HEADER), delim)
+    assert fields[0::len(HEADER)] == [b"1", b"1"]
+    assert fields[6::len(HEADER)] == [b"0.01", b"0.02"]
+
+# a chunk of ragged lines whose total field count matches is not split in
+# one pass
+@pytest.mark.parametrize("delim", [None, '\t'])
+def test_split_chunk_ragged(delim) -> None:
+    data = b''.join(RAGGED)
+    sep = delim.encode() if delim is not None else None
+    fields = data.split() if sep is None else data.rstrip(b'\n').replace(b'\n', sep).split(sep)
+    assert len(fields) == len(RAGGED) * len(HEADER)
+    assert not fields_per_line(data, len(RAGGED), len(HEADER), sep)
+    assert split_chunk(RAGGED, len(HEADER), delim) is None
+
+# the column plan tokenizes a ragged chunk line by line and fails on the
+# short line rather than shifting the columns of the lines after it
+@pytest.mark.parametrize("delim", [None, '\t'])
+def test_ragged_chunk_falls_back(delim) -> None:
+    plan = compile_column_plan(HEADER, COLUMNS, {"chr1": Contig("chr1", 1000, "GRCh37")}, 'ucsc', delim)
+    n, column = plan.columns_from_lines(RAGGED)
+    assert n == 3
+    assert column(2) == ["rs1", "rs2", "rs3"]
+    with pytest.raises(IndexError):
+        column(6)
+    with pytest.raises(IndexError):
+        plan.batch_from_lines(RAGGED)
+    assert plan.batch_from_lines(GOOD).get_pos().tolist() == [100, 200]
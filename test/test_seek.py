@@ -0,0 +1,67 @@
+# File Name: test_seek.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the region reader of seek.py on a small sorted sumstats
+#  file, checking regions whose seek offsets fall before lines already read
+#  give each line once
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+from typing import List, Tuple
+from sumstatstools.core.filters import Region
+from sumstatstools.core.seek import generate_region_reader, open_at_offset, sorted_region_seeks
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns the contig id and position of a line
+def locus(line: bytes) -> Tuple[str, int]:
+    chrom, pos = line.split(b'\t')[:2]
+    return (f"chr{chrom.decode()}", int(pos))
+
+# define a function that writes a sorted file of rows every step bases on
+# chromosomes 1 to 3, returning its path and the offset of its first row
+def write_sorted(tmp_path, rows: int = 2000, step: int = 15000) -> Tuple[str, int]:
+    path = str(tmp_path / "sorted.txt")
+    header = b"chromosome\tposition\n"
+    with open(path, 'wb') as fobj:
+        fobj.write(header)
+        for chrom in (1, 2, 3):
+            fobj.writelines(f"{chrom}\t{step * (i + 1)}\n".encode() for i in range(rows))
+    return path, len(header)
+
+# define a function that returns the loci of every line read for regions
+def read_regions(path: str, start: int, regions: List[Region], chunk_size: int) -> List[Tuple[str, int]]:
+    seeks = sorted_region_seeks(path, start, regions, locus)
+    read_f = generate_region_reader(lambda offset: open_at_offset(path, offset), seeks, locus, chunk_size)
+    loci = []
+    for chunk in iter(read_f, ()):
+        loci.extend(locus(l) for l in chunk)
+    return loci
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# nearby regions on one chromosome share a seek offset within MIN_GAP bytes,
+# so the second reopens the file before lines read for the first
+def test_nearby_regions_read_once(tmp_path) -> None:
+    path, start = write_sorted(tmp_path)
+    regions = [Region("chr1", 1500000, 1800000), Region("chr1", 2100000, 2400000)]
+    loci = read_regions(path, start, regions, chunk_size=10)
+    assert len(loci) == len(set(loci))
+    inside = {l for l in loci if any(r.chrom == l[0] and r.start <= l[1] <= r.end for r in regions)}
+    assert len(inside) == 42
+
+# a region on a chromosome read past while reading the previous region is
+# not read again
+def test_passed_chromosome_read_once(tmp_path) -> None:
+    path, start = write_sorted(tmp_path)
+    regions = [Region("chr1", 1, 40000000), Region("chr1", 29000000, 29500000),
+               Region("chr2", 15000, 30000)]
+    loci = read_regions(path, start, regions, chunk_size=7)
+    assert len(loci) == len(set(loci))
+    assert {("chr1", 29010000), ("chr2", 30000)} <= set(loci)
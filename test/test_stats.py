@@ -0,0 +1,70 @@
+# File Name: test_stats.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the log space complementary error function of stats.py,
+#  checking it against math.erfc on both sides of each boundary between
+#  Cody's regions, and that the LOGP derived from a zscore stays finite and
+#  increasing where the p-value underflows, with inf and NaN zscores giving
+#  an infinite and a missing LOGP
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import math
+import numpy as np
+from sumstatstools.core.stats import (_ERF_THRESH, compute_logpvalue, compute_logpvalue_from_zscore_batch,
+                                      compute_pvalue, log_erfc)
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+BOUNDARIES = (_ERF_THRESH, 4.0)
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# for moderate x, where erfc does not underflow, log_erfc agrees with the
+# log of math.erfc, including just below, at and just above each boundary
+def test_log_erfc_matches_erfc() -> None:
+    near = [np.nextafter(b, d) for b in BOUNDARIES for d in (-np.inf, np.inf)]
+    x = np.concatenate([np.linspace(0.0, 26.0, 2601), BOUNDARIES, near,
+                        [b + d for b in BOUNDARIES for d in (-1e-3, 1e-3)]])
+    expected = np.array([math.log(math.erfc(v)) for v in x.tolist()])
+    np.testing.assert_allclose(log_erfc(x), expected, rtol=1e-13, atol=1e-15)
+    assert log_erfc(np.array([0.0]))[0] == 0.0
+
+    # the regions meet without a step at each boundary
+    for b in BOUNDARIES:
+        below, above = log_erfc(np.array([np.nextafter(b, -np.inf), np.nextafter(b, np.inf)]))
+        assert abs(above - below) < 1e-14 * max(1.0, abs(below))
+
+# LOGP of zscores from 38, around where P underflows to zero, up to 1e3 is
+# finite and increasing, agrees with the asymptotic series of the normal tail,
+# and matches the per-variant LOGP where that is still finite
+def test_logp_past_underflow() -> None:
+    z = np.concatenate([np.linspace(38.0, 100.0, 621), np.geomspace(100.0, 1e3, 200)[1:]])
+    logp = compute_logpvalue_from_zscore_batch(np.concatenate([z, -z]))
+    assert np.isfinite(logp).all()
+    assert (np.diff(logp[:len(z)]) > 0).all()
+    assert (logp[:len(z)] == logp[len(z):]).all()
+    assert compute_pvalue((39.0,))[0] == 0.0
+
+    # two sided p = 2 * phi(z) / z * (1 - 1/z^2 + 3/z^4 - ...)
+    series = 1.0 - 1.0 / z ** 2 + 3.0 / z ** 4 - 15.0 / z ** 6
+    log_p = np.log(2.0) - z * z / 2.0 - np.log(z * math.sqrt(2.0 * math.pi)) + np.log(series)
+    np.testing.assert_allclose(logp[:len(z)], -log_p / math.log(10.0), rtol=1e-12)
+
+    moderate = np.array([1.0, 5.0, 20.0, 37.0])
+    expected = [compute_logpvalue(compute_pvalue((v,)))[0] for v in moderate.tolist()]
+    np.testing.assert_allclose(compute_logpvalue_from_zscore_batch(moderate), expected, rtol=1e-12)
+
+# an infinite zscore gives an infinite LOGP and a missing zscore a missing one
+def test_logp_inf_and_nan() -> None:
+    logp = compute_logpvalue_from_zscore_batch(np.array([np.inf, -np.inf, np.nan, 0.0]))
+    assert logp[:2].tolist() == [np.inf, np.inf]
+    assert np.isnan(logp[2])
+    assert logp[3] == 0.0
+    assert np.isnan(log_erfc(np.array([np.nan]))).all()
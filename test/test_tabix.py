@@ -0,0 +1,137 @@
+# File Name: test_tabix.py
+# Created By: ZW
+# Created On: 2026-10-17
+# Purpose: tests the bgzf writer of compress.py and the index builder and
+#  reader of tabix.py, checking bgzf output decompresses to the text written
+#  (also when resumed from a commit), and that regions queried through the
+#  written .tbi index find the same records as a linear scan
+
+
+# library imports
+# -----------------------------------------------------------------------------
+
+import gzip
+import os
+from typing import List, Tuple
+from sumstatstools.core.compress import BGZF_BLOCK_SIZE, BgzfWriter, open_bgzf_at, open_input
+from sumstatstools.core.tabix import read_tabix_index
+
+
+# constants
+# -----------------------------------------------------------------------------
+
+HEADER = "##fileformat=VCFv4.2\n#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n"
+REGIONS = [("chr1", 0, 1), ("chr1", 99990, 100500), ("chr1", 2000000, 2600000),
+           ("chr1", 2120101, 2120150), ("chr1", 5990000, 7000000), ("chr2", 15000, 15001),
+           ("chr2", 40000000, 40000100), ("chr3", 0, 1000)]
+
+
+# primitive function definitions
+# -----------------------------------------------------------------------------
+
+# define a function that returns sorted vcf records on chr1 and chr2, with
+# a long deletion on chr1 overlapping the records after it, alone
+# overlapping the region chr1:2120102-2120150
+def vcf_records() -> List[str]:
+    records = []
+    for chrom, n in (("chr1", 20000), ("chr2", 8000)):
+        for i in range(n):
+            pos = 300 * (i + 1)
+            ref = "A" * 30000 if (chrom, i) == ("chr1", 7000) else "A"
+            records.append(f"{chrom}\t{pos}\trs{i}\t{ref}\tG\t.\tPASS\tBETA=0.{i % 10};P=0.5\n")
+    return records
+
+# define a function that returns whether a record overlaps the zero-based,
+# half-open interval [beg, end) of chrom
+def overlaps(record: str, chrom: str, beg: int, end: int) -> bool:
+    c, pos, _, ref = record.split('\t', 4)[:4]
+    return c == chrom and int(pos) - 1 < end and int(pos) - 1 + len(ref) > beg
+
+# define a function that writes records to bgzf output with an index, in
+# writes of a few hundred records
+def write_indexed(path: str, records: List[str], index: str = 'tbi') -> None:
+    with BgzfWriter(path, threads=2, index=index) as writer:
+        writer.write(HEADER)
+        for i in range(0, len(records), 700):
+            writer.write(''.join(records[i:i+700]))
+
+# define a function that reads the records of a region through the index,
+# from the virtual offset returned by the query up to the first record past
+# the region
+def query_records(path: str, chrom: str, beg: int, end: int) -> Tuple[List[str], int]:
+    voffset = read_tabix_index(f"{path}.tbi").query(chrom, beg, end)
+    if voffset is None: return [], 0
+    found, read = [], 0
+    with open_bgzf_at(path, voffset) as fobj:
+        for line in fobj:
+            record = line.decode()
+            c, pos = record.split('\t', 2)[:2]
+            if c != chrom or int(pos) - 1 >= end: break
+            read += 1
+            if overlaps(record, chrom, beg, end): found.append(record)
+    return found, read
+
+
+# function definitions
+# -----------------------------------------------------------------------------
+
+# bgzf output decompresses to the text written, with plain gzip and with the
+# block parallel reader, over many blocks
+def test_bgzf_round_trip(tmp_path) -> None:
+    path = str(tmp_path / "out.vcf.gz")
+    records = vcf_records()
+    write_indexed(path, records)
+    text = HEADER + ''.join(records)
+    with open(path, 'rb') as fobj:
+        assert gzip.decompress(fobj.read()).decode() == text
+    with open_input(path, threads=4) as fobj:
+        assert fobj.read().decode() == text
+    assert os.path.getsize(path) < len(text)
+    assert len(text) > 10 * BGZF_BLOCK_SIZE
+
+# regions queried through the written tbi index find the same records as a
+# linear scan, reading only from near the region
+def test_tbi_query_matches_scan(tmp_path) -> None:
+    path = str(tmp_path / "out.vcf.gz")
+    records = vcf_records()
+    write_indexed(path, records)
+    for chrom, beg, end in REGIONS:
+        expected = [r for r in records if overlaps(r, chrom, beg, end)]
+        found, read = query_records(path, chrom, beg, end)
+        assert found == expected, (chrom, beg, end)
+        assert read < 200 + len(expected)
+    assert read_tabix_index(f"{path}.tbi").names == ("chr1", "chr2")
+
+# a csi index is written in its own format, and unsorted output gets no index
+def test_csi_and_unsorted(tmp_path) -> None:
+    path = str(tmp_path / "out.vcf.gz")
+    records = vcf_records()
+    write_indexed(path, records, 'csi')
+    with open(f"{path}.csi", 'rb') as fobj:
+        assert gzip.decompress(fobj.read())[:4] == b'CSI\x01'
+
+    unsorted = str(tmp_path / "unsorted.vcf.gz")
+    write_indexed(unsorted, records[5000:] + records[:5000])
+    assert not os.path.exists(f"{unsorted}.tbi")
+
+# output resumed from a commit decompresses to the text written before the
+# commit and after it, and its index is the index of the whole text
+def test_replay_resumes_at_commit(tmp_path) -> None:
+    records = vcf_records()
+    whole = str(tmp_path / "whole.vcf.gz")
+    write_indexed(whole, records)
+
+    path = str(tmp_path / "resumed.vcf.gz")
+    writer = BgzfWriter(path, threads=2, index='tbi')
+    writer.write(HEADER + ''.join(records[:9000]))
+    offset = writer.commit()
+    writer.write(''.join(records[9000:12000]))  # written after the commit and cut off
+    writer.close()
+
+    with BgzfWriter(path, threads=2, index='tbi', resume_at=offset) as resumed:
+        assert resumed.tell() == len(HEADER + ''.join(records[:9000]))
+        resumed.write(''.join(records[9000:]))
+    with open(path, 'rb') as fobj:
+        assert gzip.decompress(fobj.read()).decode() == HEADER + ''.join(records)
+    for chrom, beg, end in REGIONS:
+        assert query_records(path, chrom, beg, end)[0] == query_records(whole, chrom, beg, end)[0]